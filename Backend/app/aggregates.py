@@ -0,0 +1,103 @@
+"""Materialized employee headcounts for ``GET /employees/stats``.
+
+The headcount per ``(gender, hire year)`` is computed once with a single
+``GROUP BY`` and then kept in memory. Writes made through the API update it
+in place when the change is fully known: rows added by a bulk import
+increment their buckets. Changes whose effect is unknown, such as an
+upsert that may have overwritten an employee's gender or hire date, mark
+the aggregate stale. Callers then choose how much staleness they accept
+before paying for a recompute.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import date
+from threading import Lock
+from typing import Callable, Iterable, Optional
+
+from .config import settings
+
+
+class HeadcountAggregate:
+    """Headcount by gender and hire year, built once and kept current."""
+
+    def __init__(
+        self, *, rebuild_interval: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self._lock = Lock()
+        self._rebuild_interval = rebuild_interval
+        self._clock = clock
+        self._counts: Optional[dict[tuple[str, int], int]] = None
+        self._built_at = 0.0
+        self._stale_since: Optional[float] = None
+        self._generation = 0
+
+    def needs_build(self, max_staleness: float) -> bool:
+        """Return whether the aggregate is missing or staler than ``max_staleness`` seconds."""
+
+        now = self._clock()
+        with self._lock:
+            return (
+                self._counts is None
+                or now - self._built_at >= self._rebuild_interval
+                or (self._stale_since is not None and now - self._stale_since >= max_staleness)
+            )
+
+    def build(self, load: Callable[[], dict[tuple[str, int], int]]) -> None:
+        """Recompute every bucket with ``load``, e.g. :func:`crud.count_by_gender_and_hire_year`."""
+
+        with self._lock:
+            generation = self._generation
+        started = self._clock()
+        counts = load()
+        with self._lock:
+            self._counts = counts
+            self._built_at = started
+            # Writes recorded while the query ran may or may not be in it.
+            self._stale_since = started if generation != self._generation else None
+
+    def add(self, employees: Iterable[tuple[str, date]]) -> None:
+        """Count newly inserted employees, given as ``(gender, hire_date)`` pairs."""
+
+        with self._lock:
+            self._generation += 1
+            if self._counts is None:
+                return
+            for gender, hire_date in employees:
+                key = (gender, hire_date.year)
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def invalidate(self) -> None:
+        """Record a write that cannot be applied incrementally."""
+
+        with self._lock:
+            self._generation += 1
+            if self._stale_since is None:
+                self._stale_since = self._clock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts or {})
+            age = self._clock() - self._built_at if self._counts is not None else 0.0
+            stale = self._stale_since is not None
+        by_gender: dict[str, int] = {}
+        for (gender, _year), headcount in counts.items():
+            by_gender[gender] = by_gender.get(gender, 0) + headcount
+        return {
+            "total": sum(counts.values()),
+            "by_gender": dict(sorted(by_gender.items())),
+            "by_hire_year": [
+                {"hire_year": year, "gender": gender, "headcount": headcount}
+                for (gender, year), headcount in sorted(
+                    counts.items(), key=lambda item: (item[0][1], item[0][0])
+                )
+                if headcount
+            ],
+            "age_seconds": round(age, 1),
+            "stale": stale,
+        }
+
+
+headcounts = HeadcountAggregate(rebuild_interval=settings.STATS_REBUILD_INTERVAL)
+"""Module-level aggregate shared by the routers and write paths."""
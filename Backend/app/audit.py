@@ -0,0 +1,373 @@
+"""Asynchronous, append-only audit trail of employee last-name changes.
+
+Records are handed to a background writer thread through a bounded queue
+and written to numbered segment files as JSON lines. The writer drains
+whatever is queued and makes it durable with a single ``fsync`` per batch
+(group commit), so writes never wait on disk in the request path.
+
+Records are queued *before* the database commit, but the commit does not
+wait for their ``fsync``: a crash can lose the last few milliseconds of
+records. A batch that fails to write is kept and retried in a fresh segment
+until it succeeds, so the queue fills up and :meth:`AuditLog.append` raises
+:class:`AuditBackpressureError` (the caller rolls its transaction back)
+rather than records being dropped. If the commit fails, an abort marker for
+that record is appended and :meth:`AuditLog.history` hides the record.
+
+Every worker process writes its own segments into the shared directory.
+Sequence numbers are only unique per writer, so a record is identified by
+``(writer, seq)``, where ``writer`` is a random id chosen when the log
+starts. Abort markers carry the same pair. :meth:`AuditLog.history` first
+reads whatever other writers have appended since the last call, so every
+worker answers from all segments. That scan runs at most once every
+``rescan_interval`` seconds and only opens segments that have grown.
+
+The in-memory index keeps the newest ``max_records_per_employee`` records of
+each employee, and at most ``max_aborted`` abort markers; older entries are
+forgotten (the segment files themselves are never trimmed).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "audit-"
+SEGMENT_SUFFIX = ".log"
+
+_STOP = object()
+_MAX_RETRY_DELAY = 1.0
+
+
+class AuditBackpressureError(RuntimeError):
+    """Raised when the audit queue stays full for longer than the enqueue timeout."""
+
+
+@dataclass(frozen=True)
+class AuditRecord:
+    """A single last-name change."""
+
+    seq: int
+    timestamp: float
+    principal: Optional[str]
+    emp_no: int
+    old: str
+    new: str
+    writer: str = ""  # empty in records written before writer ids existed
+
+
+class AuditLog:
+    """Segmented, append-only audit log with a batching writer thread."""
+
+    def __init__(
+        self,
+        directory: os.PathLike | str,
+        *,
+        segment_bytes: int = 8 * 1024 * 1024,
+        batch_size: int = 512,
+        flush_interval: float = 0.05,
+        max_queue: int = 10_000,
+        enqueue_timeout: float = 0.5,
+        rescan_interval: float = 1.0,
+        max_records_per_employee: int = 1000,
+        max_aborted: int = 100_000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.rescan_interval = rescan_interval
+        self.max_records_per_employee = max_records_per_employee
+        self.max_aborted = max_aborted
+        self._queue: "queue.Queue[object]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.writer = uuid4().hex[:12]
+        # emp_no -> [(segment number, byte offset, (writer, seq))], oldest first
+        self._index: Dict[int, List[Tuple[int, int, Tuple[str, int]]]] = {}
+        self._aborted: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self._own: set[int] = set()  # segments this log writes
+        self._tails: Dict[int, int] = {}  # other segments -> bytes indexed so far
+        self._tail_lock = threading.Lock()
+        self._scanned_at = float("-inf")
+        self._segment_no = 0
+        self._handle = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -- lifecycle ---------------------------------------------------------
+    def start(self) -> None:
+        """Rebuild the index from existing segments and start the writer."""
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._read_other_segments()
+        self._segment_no = max(self._tails, default=0)
+        # Always start a fresh segment so a torn tail left by a crash is never
+        # glued to new records.
+        self._open_segment(self._segment_no + 1)
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued records and stop the writer thread."""
+
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still retrying a failed batch; leave the handle to it.
+                logger.error("Audit writer did not finish within %.1fs", timeout)
+                return
+            self._thread = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    # -- producers ---------------------------------------------------------
+    def append(self, emp_no: int, old: str, new: str, principal: Optional[str]) -> int:
+        """Queue a change record and return its sequence number."""
+
+        with self._lock:
+            self._seq += 1
+            record = AuditRecord(
+                seq=self._seq,
+                timestamp=time.time(),
+                principal=principal,
+                emp_no=emp_no,
+                old=old,
+                new=new,
+                writer=self.writer,
+            )
+        try:
+            self._queue.put(record, timeout=self.enqueue_timeout)
+        except queue.Full as exc:
+            raise AuditBackpressureError("Audit log is backlogged") from exc
+        return record.seq
+
+    def abort(self, seq: int) -> None:
+        """Mark record ``seq`` as belonging to a transaction that did not commit."""
+
+        with self._lock:
+            self._mark_aborted((self.writer, seq))
+        try:
+            self._queue.put({"abort": seq, "writer": self.writer}, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.error("Could not persist abort marker for audit record %d", seq)
+
+    # -- readers -----------------------------------------------------------
+    def history(self, emp_no: int, limit: int = 100) -> List[AuditRecord]:
+        """Return up to ``limit`` most recent committed records for ``emp_no``."""
+
+        if time.monotonic() - self._scanned_at >= self.rescan_interval:
+            self._read_other_segments()
+        with self._lock:
+            locations = [
+                (segment_no, offset)
+                for segment_no, offset, key in self._index.get(emp_no, ())
+                if key not in self._aborted
+            ]
+        records: List[AuditRecord] = []
+        seen: set[tuple[str, int]] = set()
+        handles: Dict[int, object] = {}
+        try:
+            # Writers interleave across segments, so order by time, not location.
+            for segment_no, offset in locations:
+                handle = handles.get(segment_no)
+                if handle is None:
+                    handle = handles[segment_no] = self._segment_path(segment_no).open("rb")
+                handle.seek(offset)
+                record = AuditRecord(**json.loads(handle.readline()))
+                # A retried batch may have left a copy in a failed segment.
+                if (record.writer, record.seq) not in seen:
+                    seen.add((record.writer, record.seq))
+                    records.append(record)
+        finally:
+            for handle in handles.values():
+                handle.close()
+        records.sort(key=lambda record: (record.timestamp, record.seq), reverse=True)
+        return records[:limit]
+
+    def _read_other_segments(self) -> None:
+        """Index complete lines that other writers appended since the last call."""
+
+        with self._tail_lock:
+            self._scanned_at = time.monotonic()
+            for segment_no, path in self._segments():
+                if segment_no in self._own:
+                    continue
+                start = self._tails.get(segment_no, 0)
+                try:
+                    if path.stat().st_size <= start:
+                        continue
+                    with path.open("rb") as handle:
+                        handle.seek(start)
+                        data = handle.read()
+                except FileNotFoundError:
+                    continue
+                # A line without its newline is still being written; retry it later.
+                complete = data[: data.rfind(b"\n") + 1]
+                offset = start
+                with self._lock:
+                    for line in complete.splitlines(keepends=True):
+                        self._index_line(segment_no, offset, line)
+                        offset += len(line)
+                self._tails[segment_no] = offset
+
+    # -- writer ------------------------------------------------------------
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item is _STOP for item in batch):
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            self._write_until_done(batch)
+
+    def _write_until_done(self, batch: list) -> None:
+        """Write ``batch``, retrying with backoff until it is on disk."""
+
+        failures = 0
+        while True:
+            try:
+                # After a failure the current segment may end in part of the
+                # batch; start a new one so no record is glued to a torn line.
+                self._write_batch(batch, fresh_segment=failures > 0)
+                return
+            except OSError:
+                failures += 1
+                logger.exception(
+                    "Failed to write %d audit record(s) (attempt %d); retrying",
+                    len(batch),
+                    failures,
+                )
+                time.sleep(min(self.flush_interval * 2 ** failures, _MAX_RETRY_DELAY))
+
+    def _write_batch(self, batch: list, *, fresh_segment: bool = False) -> None:
+        if not batch:
+            return
+        if fresh_segment:
+            self._open_segment(self._segment_no + 1)
+        written: list[tuple[int, int, bytes]] = []
+        for item in batch:
+            payload = asdict(item) if isinstance(item, AuditRecord) else item
+            line = json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n"
+            position = self._handle.tell()
+            if position and position + len(line) > self.segment_bytes:
+                self._sync()
+                self._open_segment(self._segment_no + 1)
+                position = 0
+            self._handle.write(line)
+            written.append((self._segment_no, position, line))
+        self._sync()
+        # Index only after fsync so readers never see a half-written line.
+        with self._lock:
+            for segment_no, offset, line in written:
+                self._index_line(segment_no, offset, line)
+
+    def _sync(self) -> None:
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def _index_line(self, segment_no: int, offset: int, line: bytes) -> None:
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            return  # torn write at the end of a segment after a crash
+        if "abort" in payload:
+            self._mark_aborted((payload.get("writer", ""), payload["abort"]))
+            return
+        key = (payload.get("writer", ""), payload["seq"])
+        locations = self._index.setdefault(payload["emp_no"], [])
+        locations.append((segment_no, offset, key))
+        if len(locations) > self.max_records_per_employee:
+            # Markers of forgotten records are not needed any more.
+            for _, _, dropped in locations[: -self.max_records_per_employee]:
+                self._aborted.pop(dropped, None)
+            del locations[: -self.max_records_per_employee]
+        self._seq = max(self._seq, payload["seq"])
+
+    def _mark_aborted(self, key: Tuple[str, int]) -> None:
+        self._aborted[key] = None
+        while len(self._aborted) > self.max_aborted:
+            self._aborted.popitem(last=False)
+
+    def _segments(self) -> list[tuple[int, Path]]:
+        segments = []
+        for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"):
+            number = path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+            if number.isdigit():
+                segments.append((int(number), path))
+        return sorted(segments)
+
+    def _segment_path(self, segment_no: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{segment_no:06d}{SEGMENT_SUFFIX}"
+
+    def _open_segment(self, segment_no: int) -> None:
+        if self._handle is not None:
+            self._handle.close()
+        # Exclusive create: other worker processes sharing the directory skip
+        # to the next free number instead of interleaving writes in one file.
+        while True:
+            try:
+                self._handle = self._segment_path(segment_no).open("xb")
+                break
+            except FileExistsError:
+                segment_no += 1
+        self._segment_no = segment_no
+        self._own.add(segment_no)
+
+
+_audit_log: Optional[AuditLog] = None
+
+
+def get_audit_log() -> Optional[AuditLog]:
+    """Return the running audit log, or ``None`` when auditing is disabled."""
+
+    return _audit_log
+
+
+def start_audit_log() -> Optional[AuditLog]:
+    """Start the process-wide audit log if ``AUDIT_ENABLED`` is set."""
+
+    global _audit_log
+    if settings.AUDIT_ENABLED and _audit_log is None:
+        log = AuditLog(
+            settings.AUDIT_LOG_DIR,
+            segment_bytes=settings.AUDIT_SEGMENT_BYTES,
+            flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+            max_queue=settings.AUDIT_QUEUE_SIZE,
+            enqueue_timeout=settings.AUDIT_ENQUEUE_TIMEOUT,
+            rescan_interval=settings.AUDIT_RESCAN_INTERVAL,
+            max_records_per_employee=settings.AUDIT_INDEX_PER_EMPLOYEE,
+        )
+        log.start()
+        _audit_log = log
+    return _audit_log
+
+
+def stop_audit_log() -> None:
+    global _audit_log
+    if _audit_log is not None:
+        _audit_log.close()
+        _audit_log = None
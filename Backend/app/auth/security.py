@@ -1,8 +1,21 @@
-"""HTTP Basic authentication utilities with role-aware access control."""
+"""HTTP Basic authentication utilities with role-aware access control.
+
+Credentials come from ``SECRETS_FILE``, in one of two formats written by
+``auth/hash_secrets.py``:
+
+- JSON (``.json``): read, validated and held in memory on first use. Fine
+  for small teams.
+- SQLite (``.db``, ``.sqlite``, ``.sqlite3``): one user is looked up per
+  request through the primary-key index, so large directories cost neither
+  startup time nor resident memory, and edits apply without a reload.
+"""
 
 from __future__ import annotations
 
 import json
+import logging
+import sqlite3
+import threading
 from contextvars import ContextVar
 from dataclasses import dataclass
 from enum import Enum
@@ -10,12 +23,14 @@ from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 
-import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 from ..config import settings
+from ..rate_limit import charge_authenticated_user, retry_after
+
 
+logger = logging.getLogger(__name__)
 
 security = HTTPBasic()
 
@@ -120,7 +135,74 @@ def _load_secrets(path: str) -> Dict[str, UserSecret]:
     return cleaned
 
 
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def _is_sqlite_store(path: str) -> bool:
+    return path.lower().endswith(SQLITE_SUFFIXES)
+
+
+class SqliteSecretStore:
+    """Read-only view of a SQLite credentials file, one user per lookup."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if not Path(path).is_file():
+            raise SecretsLoadError(f"Secrets file not found: {path}")
+        self._uri = Path(path).resolve().as_uri() + "?mode=ro"
+        self._local = threading.local()  # sqlite3 connections are per thread
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM meta WHERE key = 'algorithm'"
+            ).fetchone()
+        except sqlite3.Error as exc:
+            raise SecretsLoadError(f"Secrets file is not a credentials database: {path}") from exc
+        if row is None or row[0] != "bcrypt":
+            raise SecretsLoadError("Only bcrypt secrets are supported")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            try:
+                connection = sqlite3.connect(self._uri, uri=True)
+            except sqlite3.Error as exc:
+                raise SecretsLoadError(f"Cannot open secrets file: {self.path}") from exc
+            self._local.connection = connection
+        return connection
+
+    def get(self, username: str) -> Optional[UserSecret]:
+        try:
+            row = self._connection().execute(
+                "SELECT hash, access FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        except sqlite3.Error as exc:
+            raise SecretsLoadError(f"Cannot read secrets file: {self.path}") from exc
+        if row is None:
+            return None
+        hashed_password, access_value = row
+        try:
+            return hashed_password, AccessLevel(str(access_value).lower())
+        except ValueError as exc:
+            raise SecretsLoadError(
+                f"User '{username}' has unsupported access level '{access_value}'"
+            ) from exc
+
+
+@lru_cache()
+def _open_secret_store(path: str) -> SqliteSecretStore:
+    return SqliteSecretStore(path)
+
+
+def _lookup_secret(username: str) -> Optional[UserSecret]:
+    path = settings.SECRETS_FILE
+    if _is_sqlite_store(path):
+        return _open_secret_store(path).get(username)
+    return _load_secrets(path).get(username)
+
+
 def _verify_password(hashed_password: str, plain_password: str) -> bool:
+    import bcrypt  # deferred: only needed once a request is authenticated
+
     try:
         return bcrypt.checkpw(
             plain_password.encode("utf-8"), hashed_password.encode("utf-8")
@@ -142,14 +224,13 @@ def get_active_principal() -> Optional[Principal]:
 
 def _authenticate(credentials: HTTPBasicCredentials) -> Principal:
     try:
-        secrets = _load_secrets(settings.SECRETS_FILE)
+        secret = _lookup_secret(credentials.username)
     except SecretsLoadError as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication backend unavailable",
         ) from exc
 
-    secret = secrets.get(credentials.username)
     if secret is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -165,6 +246,14 @@ def _authenticate(credentials: HTTPBasicCredentials) -> Principal:
             headers={"WWW-Authenticate": "Basic"},
         )
 
+    wait = charge_authenticated_user(credentials.username)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": retry_after(wait)},
+        )
+
     principal = Principal(username=credentials.username, access=access_level)
     _set_current_principal(principal)
     return principal
@@ -187,7 +276,27 @@ async def get_current_principal(
     return _authenticate(credentials)
 
 
+def warm_up_secrets() -> bool:
+    """Load the configured secrets file ahead of the first request.
+
+    A SQLite store is only opened and checked, not read. Returns ``False``
+    when the file cannot be loaded; requests will then keep reporting the
+    authentication backend as unavailable until it is fixed.
+    """
+
+    try:
+        if _is_sqlite_store(settings.SECRETS_FILE):
+            _open_secret_store(settings.SECRETS_FILE)
+        else:
+            _load_secrets(settings.SECRETS_FILE)
+    except SecretsLoadError:
+        logger.warning("Could not preload secrets from %s", settings.SECRETS_FILE, exc_info=True)
+        return False
+    return True
+
+
 def reload_secrets_cache() -> None:
     """Clear the cached secrets so that subsequent calls reload the file."""
 
     _load_secrets.cache_clear()
+    _open_secret_store.cache_clear()
@@ -0,0 +1,149 @@
+"""Circuit breaker that fails database work fast while the database is down.
+
+The breaker starts *closed*. Connection failures (failed connects and
+disconnects detected by SQLAlchemy) are counted. After ``failure_threshold``
+of them in a row it *opens*. While it is open, :meth:`CircuitBreaker.allow`
+returns ``False`` right away, so requests get ``503`` instead of each
+waiting for a connect timeout.
+
+While open, a background thread runs ``probe`` every ``probe_interval``
+seconds; the breaker reports *half_open* while a probe runs. The first
+probe that succeeds closes the breaker. So do successful connection
+checkouts, which in-flight work may still make. Requests never act as
+probes.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Trip after consecutive failures and recover through background probes."""
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int,
+        probe_interval: float,
+        probe: Callable[[], Any],
+        name: str = "database",
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.name = name
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Return whether new work may use the protected resource."""
+
+        if self.state == CLOSED:  # plain attribute read: no lock on the hot path
+            return True
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._close()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if (
+                self.state == CLOSED
+                and self.failure_threshold > 0
+                and self.failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "open_seconds": (
+                    round(time.monotonic() - self.opened_at, 1)
+                    if self.opened_at is not None else None
+                ),
+            }
+
+    def reset(self) -> None:
+        """Close the breaker and stop probing (used at shutdown and in tests)."""
+
+        self._stop.set()
+        prober = self._prober
+        if prober is not None and prober is not threading.current_thread():
+            prober.join(timeout=5)
+        with self._lock:
+            self._close()
+            self.failures = 0
+            self.trips = 0
+            self.rejected = 0
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(
+            "%s circuit opened after %d consecutive failures", self.name, self.failures
+        )
+        if self._prober is None:
+            self._stop.clear()
+            self._prober = threading.Thread(
+                target=self._probe_loop, name=f"{self.name}-breaker-probe", daemon=True
+            )
+            self._prober.start()
+
+    def _close(self) -> None:
+        if self.state != CLOSED:
+            logger.info("%s circuit closed", self.name)
+        self.state = CLOSED
+        self.opened_at = None
+
+    def _probe_loop(self) -> None:
+        while True:
+            stopped = self._stop.wait(self.probe_interval)
+            with self._lock:
+                # The thread is forgotten under the same lock that ends it,
+                # so _open() never relies on a prober that is about to exit.
+                if stopped or self.state == CLOSED:
+                    self._prober = None
+                    return
+                self.state = HALF_OPEN
+            try:
+                self.probe()
+            except Exception as exc:  # noqa: BLE001 - any failure keeps it open
+                logger.warning("%s probe failed: %s", self.name, exc)
+                with self._lock:
+                    if self.state == HALF_OPEN:
+                        self.state = OPEN
+                continue
+            with self._lock:
+                self.failures = 0
+                self._close()
+                self._prober = None
+                return
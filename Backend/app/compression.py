@@ -0,0 +1,334 @@
+"""Negotiated response compression and pre-compressed static files."""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import mimetypes
+import os
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # Brotli is optional; gzip is always available.
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+STATIC_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+UNCOMPRESSED_MEDIA_TYPES = {"text/event-stream"}
+"""Media types that are never compressed: each server-sent event must reach the
+client as soon as it is written, not when the compressor has enough input."""
+
+_CONDITIONAL_HEADERS = (b"if-none-match", b"if-match")
+
+
+def supported_encodings() -> tuple[str, ...]:
+    """Return the encodings this process can produce, best first."""
+
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(
+    accept_encoding: str, available: Iterable[str] | None = None
+) -> Optional[str]:
+    """Pick the preferred encoding from an ``Accept-Encoding`` header value.
+
+    Candidates are tried in server preference order; a coding the client
+    rejects with ``q=0`` is skipped and ``*`` matches anything not listed.
+    """
+
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best: Optional[str] = None
+    best_quality = 0.0
+    for encoding in available if available is not None else supported_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _suffix_etag(etag: str, encoding: str) -> str:
+    """Return ``etag`` tagged with ``encoding``: ``"abc"`` -> ``"abc-gzip"``."""
+
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def _strip_etag_suffixes(value: str) -> tuple[str, bool]:
+    """Remove encoding suffixes from the tags of a conditional header value.
+
+    Returns the rewritten value and whether any tag carried a suffix.
+    """
+
+    tags = []
+    stripped = False
+    for tag in value.split(","):
+        tag = tag.strip()
+        for encoding in STATIC_SUFFIXES:
+            suffix = f'-{encoding}"'
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)] + '"'
+                stripped = True
+                break
+        tags.append(tag)
+    return ", ".join(tags), stripped
+
+
+class _Compressor:
+    """Incremental compressor that can flush after every chunk."""
+
+    def __init__(self, encoding: str, *, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, *, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Compress responses with gzip or brotli according to ``Accept-Encoding``.
+
+    Single-message bodies smaller than ``minimum_size`` are sent unchanged.
+    Streaming bodies are compressed chunk by chunk and flushed after each
+    chunk, so clients keep receiving data as soon as it is produced.
+    Responses that already carry a ``Content-Encoding``, and server-sent event
+    streams, are passed through.
+
+    A compressed body is a different representation from the identity one,
+    so its ``ETag`` gets an encoding suffix (``"abc"`` becomes ``"abc-gzip"``).
+    The suffix is stripped from ``If-None-Match`` and ``If-Match`` before the
+    request reaches the app, so routes keep comparing their own tags, and a
+    ``304`` answering a suffixed tag repeats it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        headers = []
+        suffixed = False
+        for name, value in scope["headers"]:
+            if name in _CONDITIONAL_HEADERS:
+                text, stripped = _strip_etag_suffixes(value.decode("latin-1"))
+                value = text.encode("latin-1")
+                suffixed = suffixed or stripped
+            headers.append((name, value))
+        if suffixed:
+            scope = dict(scope, headers=headers)
+        responder = _CompressionResponder(self, encoding, send, suffixed=suffixed)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(
+        self,
+        middleware: CompressionMiddleware,
+        encoding: str,
+        send: Send,
+        *,
+        suffixed: bool = False,
+    ) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.suffixed = suffixed
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            self.passthrough = (
+                "content-encoding" in headers or media_type in UNCOMPRESSED_MEDIA_TYPES
+            )
+            if message["status"] == 304 and self.suffixed and "etag" in headers:
+                # The client validated the compressed representation.
+                mutable = MutableHeaders(raw=message["headers"])
+                mutable["ETag"] = _suffix_etag(mutable["ETag"], self.encoding)
+            return
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        if self.passthrough:
+            await self._flush_start()
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self._flush_start()
+                await self.downstream(message)
+                return
+            self.compressor = _Compressor(
+                self.encoding,
+                gzip_level=self.middleware.gzip_level,
+                brotli_quality=self.middleware.brotli_quality,
+            )
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = _suffix_etag(headers["ETag"], self.encoding)
+            compressed = self.compressor.compress(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(compressed))
+            await self._flush_start()
+            await self.downstream(
+                {"type": "http.response.body", "body": compressed, "more_body": more_body}
+            )
+            return
+
+        compressed = self.compressor.compress(body, final=not more_body)
+        await self.downstream(
+            {"type": "http.response.body", "body": compressed, "more_body": more_body}
+        )
+
+    async def _flush_start(self) -> None:
+        if self.start_message is not None:
+            await self.downstream(self.start_message)
+            self.start_message = None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """``StaticFiles`` that serves ``.br``/``.gz`` siblings when the client accepts them.
+
+    The sibling files are produced ahead of time by :func:`precompress_directory`;
+    nothing is compressed while handling a request.
+    """
+
+    def file_response(
+        self,
+        full_path: os.PathLike | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        available = [
+            encoding
+            for encoding, suffix in STATIC_SUFFIXES.items()
+            if os.path.isfile(f"{full_path}{suffix}")
+        ]
+        encoding = negotiate_encoding(
+            request_headers.get("accept-encoding", ""), available
+        ) if available else None
+        if encoding is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            if available:
+                response.headers.add_vary_header("Accept-Encoding")
+            return response
+
+        variant = f"{full_path}{STATIC_SUFFIXES[encoding]}"
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        response = FileResponse(
+            variant,
+            status_code=status_code,
+            stat_result=os.stat(variant),
+            media_type=media_type,
+            headers={"Content-Encoding": encoding},
+        )
+        response.headers.add_vary_header("Accept-Encoding")
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def precompress_directory(directory: os.PathLike | str, *, minimum_size: int = 500) -> int:
+    """Write ``.gz`` (and ``.br`` when available) siblings for files in ``directory``.
+
+    Variants that are newer than their source are left alone, so running this
+    on every startup only costs a directory walk. Returns the number of
+    variant files written.
+    """
+
+    written = 0
+    for path in sorted(Path(directory).rglob("*")):
+        if not path.is_file() or path.suffix in STATIC_SUFFIXES.values():
+            continue
+        source_stat = path.stat()
+        if source_stat.st_size < minimum_size:
+            continue
+        for encoding in supported_encodings():
+            variant = path.with_name(path.name + STATIC_SUFFIXES[encoding])
+            if variant.exists() and variant.stat().st_mtime >= source_stat.st_mtime:
+                continue
+            data = path.read_bytes()
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=11)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) >= len(data):
+                variant.unlink(missing_ok=True)
+                continue
+            tmp_path = variant.with_name(variant.name + ".tmp")
+            tmp_path.write_bytes(compressed)
+            os.replace(tmp_path, variant)
+            written += 1
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-compress static assets.")
+    parser.add_argument("directory", nargs="?", default="static")
+    parser.add_argument("--minimum-size", type=int, default=500)
+    args = parser.parse_args()
+    written = precompress_directory(args.directory, minimum_size=args.minimum_size)
+    print(f"Wrote {written} compressed variant(s) in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,28 @@
 from pydantic import BaseModel
 import os
-from dotenv import load_dotenv
+from pathlib import Path
 
-load_dotenv()
+
+def _load_dotenv() -> None:
+    # Look for .env the same way python-dotenv does (walking up from this
+    # package), but only import python-dotenv when there is a file to load.
+    for directory in Path(__file__).resolve().parents:
+        candidate = directory / ".env"
+        if candidate.is_file():
+            from dotenv import load_dotenv
+
+            load_dotenv(candidate)
+            return
+
+
+_load_dotenv()
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
 
 
 class Settings(BaseModel):
@@ -11,8 +31,90 @@ class Settings(BaseModel):
     DB_HOST: str = os.getenv("DB_HOST", "127.0.0.1")
     DB_PORT: str = os.getenv("DB_PORT", "3307")
     DB_NAME: str = os.getenv("DB_NAME", "employees")
+    # Full SQLAlchemy URL; overrides the DB_* settings above when set.
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # "<first emp_no>=<url>", semicolon separated: spread employees over
+    # several databases by emp_no range (see app/sharding.py).
+    SHARDS: str = os.getenv("SHARDS", "")
+    # Deepest list offset served with SHARDS; every shard reads offset + limit rows.
+    SHARD_MAX_OFFSET: int = int(os.getenv("SHARD_MAX_OFFSET", "10000"))
     CORS_ORIGINS: list[str] = [os.getenv("CORS_ORIGIN", "*")]
     SECRETS_FILE: str = os.getenv("SECRETS_FILE", "secrets/secrets.json")
+    SESSION_TTL: float = float(os.getenv("SESSION_TTL", "43200"))  # 0: sessions never expire
+    # "memory" (per process) or "sqlite" (shared by every worker on the host)
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory")
+    SESSION_STORE_FILE: str = os.getenv("SESSION_STORE_FILE", "state/sessions.db")
+    # Where sessions are saved for warm restarts, e.g. "state/sessions.bin";
+    # empty (the default) disables. The file holds live session ids.
+    SESSION_SNAPSHOT_FILE: str = os.getenv("SESSION_SNAPSHOT_FILE", "")
+    SESSION_SNAPSHOT_INTERVAL: float = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", "30"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_PREWARM: int = int(os.getenv("DB_POOL_PREWARM", "1"))
+    DB_MAX_INFLIGHT: int = int(
+        os.getenv("DB_MAX_INFLIGHT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW))
+    )
+    DB_ADMISSION_TIMEOUT: float = float(os.getenv("DB_ADMISSION_TIMEOUT", "0.1"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Consecutive connection failures that open the circuit breaker; 0 disables.
+    DB_BREAKER_THRESHOLD: int = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+    DB_BREAKER_PROBE_INTERVAL: float = float(os.getenv("DB_BREAKER_PROBE_INTERVAL", "2"))
+    # Seconds a request may spend before its database work is cut off with 504.
+    REQUEST_DEADLINE: float = float(os.getenv("REQUEST_DEADLINE", "10"))  # 0 disables
+    # "<path prefix>=<seconds>", comma separated; 0 means no deadline
+    REQUEST_DEADLINE_RULES: str = os.getenv(
+        "REQUEST_DEADLINE_RULES",
+        "/employees/changes=0,/employees/import=0,/admin/profile=0",
+    )
+    # Upper bound for budgets asked for with the X-Request-Timeout header.
+    REQUEST_DEADLINE_MAX: float = float(os.getenv("REQUEST_DEADLINE_MAX", "30"))
+    RATE_LIMIT_ENABLED: bool = _env_flag("RATE_LIMIT_ENABLED", True)
+    # "<path prefix>=<tokens per second>:<burst>", comma separated
+    RATE_LIMIT_RULES: str = os.getenv(
+        "RATE_LIMIT_RULES", "/sessions/start=0.5:10,/employees=20:40,/batch=2:10"
+    )
+    # "memory" (per process) or "registry" (the session store; shared by
+    # every worker when SESSION_STORE=sqlite)
+    RATE_LIMIT_STORE: str = os.getenv("RATE_LIMIT_STORE", "memory")
+    SINGLEFLIGHT_MAX_KEYS: int = int(os.getenv("SINGLEFLIGHT_MAX_KEYS", "1024"))
+    AUDIT_ENABLED: bool = _env_flag("AUDIT_ENABLED", True)
+    AUDIT_LOG_DIR: str = os.getenv("AUDIT_LOG_DIR", "audit")
+    AUDIT_SEGMENT_BYTES: int = int(os.getenv("AUDIT_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+    AUDIT_FLUSH_INTERVAL: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.05"))
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_ENQUEUE_TIMEOUT: float = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.5"))
+    # seconds between scans for records appended by other workers
+    AUDIT_RESCAN_INTERVAL: float = float(os.getenv("AUDIT_RESCAN_INTERVAL", "1.0"))
+    # newest records per employee kept in the in-memory history index
+    AUDIT_INDEX_PER_EMPLOYEE: int = int(os.getenv("AUDIT_INDEX_PER_EMPLOYEE", "1000"))
+    IDEMPOTENCY_ENABLED: bool = _env_flag("IDEMPOTENCY_ENABLED", True)
+    IDEMPOTENCY_TTL: float = float(os.getenv("IDEMPOTENCY_TTL", "600"))
+    IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    IDEMPOTENCY_MAX_REQUEST_BODY: int = int(os.getenv("IDEMPOTENCY_MAX_REQUEST_BODY", "1048576"))
+    ADMIN_USERS: list[str] = [
+        name.strip() for name in os.getenv("ADMIN_USERS", "admin").split(",") if name.strip()
+    ]
+    PROFILER_ENABLED: bool = _env_flag("PROFILER_ENABLED", False)
+    PROFILER_MAX_SECONDS: float = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+    LOOP_LAG_THRESHOLD: float = float(os.getenv("LOOP_LAG_THRESHOLD", "0.2"))  # 0 disables
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+    EVENTS_HISTORY: int = int(os.getenv("EVENTS_HISTORY", "1024"))
+    EVENTS_SUBSCRIBER_BUFFER: int = int(os.getenv("EVENTS_SUBSCRIBER_BUFFER", "256"))
+    EVENTS_MAX_SUBSCRIBERS: int = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "1000"))
+    EVENTS_HEARTBEAT: float = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+    SNAPSHOT_ENABLED: bool = _env_flag("SNAPSHOT_ENABLED", False)
+    SNAPSHOT_REFRESH: float = float(os.getenv("SNAPSHOT_REFRESH", "300"))  # 0 disables
+    # Seconds /employees/stats may serve headcounts known to miss some writes.
+    STATS_MAX_STALENESS: float = float(os.getenv("STATS_MAX_STALENESS", "60"))
+    # Full recompute interval, which picks up writes made outside the API.
+    STATS_REBUILD_INTERVAL: float = float(os.getenv("STATS_REBUILD_INTERVAL", "3600"))
+    COUNT_CACHE_TTL: float = float(os.getenv("COUNT_CACHE_TTL", "60"))
+    COUNT_ESTIMATE_REFRESH: float = float(os.getenv("COUNT_ESTIMATE_REFRESH", "300"))
+    # Seconds list pages may be reused here and by downstream caches; 0 turns caching off.
+    PAGE_CACHE_MAX_AGE: float = float(os.getenv("PAGE_CACHE_MAX_AGE", "5"))
+    PAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1024"))
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+    PRECOMPRESS_STATIC: bool = _env_flag("PRECOMPRESS_STATIC", True)
 
 
 def _ensure_path_is_absolute(path: str) -> str:
@@ -24,3 +126,7 @@ def _ensure_path_is_absolute(path: str) -> str:
 
 settings = Settings()
 settings.SECRETS_FILE = _ensure_path_is_absolute(settings.SECRETS_FILE)
+settings.AUDIT_LOG_DIR = _ensure_path_is_absolute(settings.AUDIT_LOG_DIR)
+settings.SESSION_STORE_FILE = _ensure_path_is_absolute(settings.SESSION_STORE_FILE)
+if settings.SESSION_SNAPSHOT_FILE:
+    settings.SESSION_SNAPSHOT_FILE = _ensure_path_is_absolute(settings.SESSION_SNAPSHOT_FILE)
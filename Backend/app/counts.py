@@ -0,0 +1,105 @@
+"""Cached total counts for paginated employee listings."""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Hashable, Optional
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class TotalCount:
+    """A row count and whether it was computed exactly."""
+
+    value: int
+    exact: bool
+
+
+class CountCache:
+    """Keep a periodically refreshed estimate plus TTL-bound exact counts.
+
+    The estimate covers the whole table and is refreshed at most once per
+    ``estimate_refresh`` seconds. Exact counts are keyed by the caller (usually
+    the active filters), expire after ``ttl`` seconds and are dropped by
+    :meth:`invalidate` whenever a write path changes the table.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        estimate_refresh: float,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._lock = Lock()
+        self._ttl = ttl
+        self._estimate_refresh = estimate_refresh
+        self._max_entries = max_entries
+        self._clock = clock
+        self._estimate: Optional[tuple[TotalCount, float]] = None
+        self._exact: OrderedDict[Hashable, tuple[TotalCount, float]] = OrderedDict()
+        self._generation = 0
+
+    def estimate(self, loader: Callable[[], int]) -> TotalCount:
+        """Return the table-wide estimate, calling ``loader`` when it is stale."""
+
+        now = self._clock()
+        with self._lock:
+            if self._estimate is not None and self._estimate[1] > now:
+                return self._estimate[0]
+        total = TotalCount(value=loader(), exact=False)
+        with self._lock:
+            self._estimate = (total, now + self._estimate_refresh)
+        return total
+
+    def cached_exact(self, key: Hashable) -> Optional[TotalCount]:
+        """Return the exact count for ``key`` if one is cached and fresh."""
+
+        now = self._clock()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            return entry[0]
+
+    def exact(self, key: Hashable, loader: Callable[[], int]) -> TotalCount:
+        """Return the exact count for ``key``, computing it with ``loader`` on a miss."""
+
+        cached = self.cached_exact(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            generation = self._generation
+        total = TotalCount(value=loader(), exact=True)
+        with self._lock:
+            if generation != self._generation:
+                # A write landed while counting; do not cache a stale value.
+                return total
+            self._exact[key] = (total, self._clock() + self._ttl)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self._max_entries:
+                self._exact.popitem(last=False)
+        return total
+
+    def invalidate(self) -> None:
+        """Forget all exact counts after a write."""
+
+        with self._lock:
+            self._generation += 1
+            self._exact.clear()
+
+
+count_cache = CountCache(
+    ttl=settings.COUNT_CACHE_TTL,
+    estimate_refresh=settings.COUNT_ESTIMATE_REFRESH,
+)
+"""Module-level singleton shared by the routers and write paths."""
@@ -1,29 +1,467 @@
-from sqlalchemy import select
+import hashlib
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import Integer, bindparam, extract, func, select, text, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
+from . import audit, events
+from .auth import get_active_principal
+from .counts import count_cache
+from .page_cache import list_pages
 from .models import Employee
 
 
-def get_employees(session: Session, *, limit: int = 10, offset: int = 0):
-    stmt = (
-        select(Employee.emp_no, Employee.first_name, Employee.last_name)
-        .order_by(Employee.emp_no)
-        .offset(offset)
-        .limit(limit)
+PRIMARY_KEY_INDEX = "PRIMARY"
+
+SORT_KEYS = ("emp_no", "hire_date", "last_name")
+"""Columns the employee listing may be ordered by (prefix with ``-`` for DESC)."""
+
+COLUMNS = ("emp_no", "birth_date", "first_name", "last_name", "gender", "hire_date")
+LIST_COLUMNS = ("emp_no", "first_name", "last_name")
+"""Columns the employee listing selects unless ``fields=`` asks for others."""
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised when a filter/sort combination has no supporting index."""
+
+
+@dataclass(frozen=True)
+class EmployeeFilters:
+    """Optional filters accepted by :func:`get_employees`."""
+
+    gender: Optional[str] = None
+    hire_date_from: Optional[date] = None
+    hire_date_to: Optional[date] = None
+    last_name_prefix: Optional[str] = None
+
+    @property
+    def equality_columns(self) -> frozenset[str]:
+        return frozenset({"gender"} if self.gender is not None else ())
+
+    @property
+    def range_columns(self) -> frozenset[str]:
+        columns = set()
+        if self.hire_date_from is not None or self.hire_date_to is not None:
+            columns.add("hire_date")
+        if self.last_name_prefix:
+            columns.add("last_name")
+        return frozenset(columns)
+
+
+@lru_cache(maxsize=1)
+def _declared_indexes() -> list[tuple[str, tuple[str, ...]]]:
+    indexes = [(PRIMARY_KEY_INDEX, tuple(c.name for c in Employee.__table__.primary_key))]
+    for index in sorted(Employee.__table__.indexes, key=lambda ix: ix.name):
+        indexes.append((index.name, tuple(c.name for c in index.columns)))
+    return indexes
+
+
+def _parse_sort(sort: str) -> tuple[str, bool]:
+    descending = sort.startswith("-")
+    column = sort[1:] if descending else sort
+    if column not in SORT_KEYS:
+        raise UnsupportedQueryError(
+            f"Unsupported sort key '{sort}'. Use one of: "
+            + ", ".join(f"{key}, -{key}" for key in SORT_KEYS)
+        )
+    return column, descending
+
+
+def plan_employee_query(filters: EmployeeFilters, sort: str = "emp_no") -> str:
+    """Return the name of the index that serves ``filters`` ordered by ``sort``.
+
+    An index qualifies when its leading columns are exactly the equality
+    filters, the next column is the sort column, any range filter is on that
+    same column, and ``emp_no`` follows as the tie-breaker. Such a scan returns
+    rows already in page order, so the database never has to sort the table.
+    """
+
+    sort_column, _ = _parse_sort(sort)
+    equality = filters.equality_columns
+    ranges = filters.range_columns
+    if len(ranges) > 1 or (ranges and sort_column not in ranges):
+        raise UnsupportedQueryError(
+            "Range filters must be on the sort column; "
+            f"got filters on {', '.join(sorted(ranges))} with sort '{sort}'"
+        )
+
+    expected_tail = ("emp_no",) if sort_column == "emp_no" else (sort_column, "emp_no")
+    for name, columns in _declared_indexes():
+        head, tail = columns[: len(equality)], columns[len(equality):]
+        if set(head) == equality and tail == expected_tail:
+            return name
+    raise UnsupportedQueryError(
+        f"No index supports filtering on {', '.join(sorted(equality | ranges)) or 'nothing'} "
+        f"with sort '{sort}'"
+    )
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+# Statements are built once per filter shape and sort and reused with bound
+# parameters, so each request skips constructing the SQL expression and
+# always hits SQLAlchemy's compiled cache (and any driver statement cache
+# keyed on the SQL text).
+_FilterShape = tuple[bool, bool, bool, bool]
+
+
+def _filter_shape(filters: EmployeeFilters) -> _FilterShape:
+    return (
+        filters.gender is not None,
+        filters.hire_date_from is not None,
+        filters.hire_date_to is not None,
+        bool(filters.last_name_prefix),
     )
-    return session.execute(stmt).all()
+
+
+def _filter_params(filters: EmployeeFilters) -> dict:
+    params = {}
+    if filters.gender is not None:
+        params["gender"] = filters.gender
+    if filters.hire_date_from is not None:
+        params["hire_date_from"] = filters.hire_date_from
+    if filters.hire_date_to is not None:
+        params["hire_date_to"] = filters.hire_date_to
+    if filters.last_name_prefix:
+        params["last_name_from"] = filters.last_name_prefix
+        params["last_name_to"] = _prefix_upper_bound(filters.last_name_prefix)
+    return params
+
+
+def _filter_conditions(shape: _FilterShape) -> list:
+    has_gender, has_hired_from, has_hired_to, has_prefix = shape
+    conditions = []
+    if has_gender:
+        conditions.append(Employee.gender == bindparam("gender"))
+    if has_hired_from:
+        conditions.append(Employee.hire_date >= bindparam("hire_date_from"))
+    if has_hired_to:
+        conditions.append(Employee.hire_date <= bindparam("hire_date_to"))
+    if has_prefix:
+        # A half-open range stays sargable on every backend, unlike LIKE.
+        conditions.append(Employee.last_name >= bindparam("last_name_from"))
+        conditions.append(Employee.last_name < bindparam("last_name_to"))
+    return conditions
+
+
+@lru_cache(maxsize=1024)  # 16 filter shapes x 6 sort keys x column sets in use
+def _page_statement(shape: _FilterShape, sort: str, columns: tuple[str, ...] = LIST_COLUMNS):
+    sort_column, descending = _parse_sort(sort)
+    order_columns = [Employee.emp_no]
+    if sort_column != "emp_no":
+        order_columns.insert(0, getattr(Employee, sort_column))
+    if descending:
+        order_columns = [column.desc() for column in order_columns]
+    return (
+        select(*(getattr(Employee, column) for column in columns))
+        .where(*_filter_conditions(shape))
+        .order_by(*order_columns)
+        .offset(bindparam("offset", type_=Integer))
+        .limit(bindparam("limit", type_=Integer))
+    )
+
+
+@lru_cache(maxsize=None)
+def _count_statement(shape: _FilterShape):
+    return select(func.count()).select_from(Employee).where(*_filter_conditions(shape))
+
+
+def get_employees(
+    session: Session,
+    *,
+    limit: int = 10,
+    offset: int = 0,
+    filters: Optional[EmployeeFilters] = None,
+    sort: str = "emp_no",
+    columns: tuple[str, ...] = LIST_COLUMNS,
+):
+    """Return one page of employees as rows holding only ``columns``."""
+
+    filters = filters or EmployeeFilters()
+    plan_employee_query(filters, sort)
+    params = _filter_params(filters)
+    params["limit"] = limit
+    params["offset"] = offset
+    return session.execute(_page_statement(_filter_shape(filters), sort, columns), params).all()
+
+
+def count_employees(session: Session, filters: Optional[EmployeeFilters] = None) -> int:
+    """Return the exact number of employees matching ``filters``."""
+
+    filters = filters or EmployeeFilters()
+    return session.execute(
+        _count_statement(_filter_shape(filters)), _filter_params(filters)
+    ).scalar_one()
+
+
+_HIRE_YEAR = extract("year", Employee.hire_date)
+# Grouped by (gender, year) so MySQL can read ix_employees_gender_hire_date
+# alone instead of the table rows.
+_HEADCOUNT_STATEMENT = (
+    select(Employee.gender, _HIRE_YEAR, func.count())
+    .group_by(Employee.gender, _HIRE_YEAR)
+)
+
+
+def count_by_gender_and_hire_year(session: Session) -> dict[tuple[str, int], int]:
+    """Return the number of employees per ``(gender, hire year)``."""
+
+    return {
+        (gender, int(year)): count
+        for gender, year, count in session.execute(_HEADCOUNT_STATEMENT)
+    }
+
+
+_MYSQL_ROW_ESTIMATE = text(
+    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name"
+)
+
+
+def estimate_employee_count(session: Session) -> int:
+    """Return an approximate row count for the whole ``employees`` table.
+
+    MySQL/MariaDB answer from table statistics without touching the rows.
+    Other dialects have no cheap equivalent and fall back to ``COUNT(*)``.
+    """
+
+    if session.get_bind().dialect.name == "mysql":
+        estimate = session.execute(
+            _MYSQL_ROW_ESTIMATE, {"table_name": Employee.__tablename__}
+        ).scalar_one_or_none()
+        if estimate is not None:
+            return int(estimate)
+    return count_employees(session)
+
+
+def get_total_count(
+    session: Session,
+    filters: Optional[EmployeeFilters] = None,
+    *,
+    exact: bool = False,
+):
+    """Return a cached :class:`~app.counts.TotalCount` or ``None``.
+
+    Exact counts are computed only when ``exact`` is requested. Otherwise the
+    table-wide estimate is used for unfiltered listings and filtered listings
+    reuse an exact count only if one is already cached.
+    """
+
+    filters = filters or EmployeeFilters()
+    if exact:
+        return count_cache.exact(filters, lambda: count_employees(session, filters))
+    if filters == EmployeeFilters():
+        return count_cache.estimate(lambda: estimate_employee_count(session))
+    return count_cache.cached_exact(filters)
 
 
 def get_employee(session: Session, emp_no: int) -> Employee | None:
     return session.get(Employee, emp_no)
 
 
-def update_employee_last_name(session: Session, emp_no: int, last_name: str) -> Employee | None:
-    employee = session.get(Employee, emp_no)
-    if employee is None:
-        return None
-    employee.last_name = last_name
-    session.add(employee)
-    session.commit()
+@lru_cache(maxsize=None)  # bounded: one per column set
+def _employee_statement(columns: tuple[str, ...]):
+    return select(*(getattr(Employee, column) for column in columns)).where(
+        Employee.emp_no == bindparam("emp_no")
+    )
+
+
+def get_employee_columns(session: Session, emp_no: int, columns: tuple[str, ...]):
+    """Return a row holding only ``columns`` of employee ``emp_no``, or ``None``."""
+
+    return session.execute(_employee_statement(columns), {"emp_no": emp_no}).first()
+
+
+VERSIONED_COLUMNS = ("birth_date", "first_name", "last_name", "gender", "hire_date")
+"""Columns covered by :func:`employee_version`."""
+
+
+class VersionConflictError(RuntimeError):
+    """Raised when an employee changed since the version the caller last saw."""
+
+    def __init__(self, current: Employee) -> None:
+        super().__init__(f"Employee {current.emp_no} was modified concurrently")
+        self.current = current
+
+
+def employee_version(employee: Employee) -> str:
+    """Return a short content hash identifying the current state of ``employee``.
+
+    The ``employees`` table has no version column, so the hash of its
+    mutable columns serves as one; it changes whenever any of them does.
+    """
+
+    digest = hashlib.blake2b(digest_size=8)
+    for column in VERSIONED_COLUMNS:
+        digest.update(str(getattr(employee, column)).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+EMPLOYEE_FIELDS = (*COLUMNS, "version")
+"""Fields a client may ask for with ``fields=``; ``version`` is derived."""
+
+
+class UnknownFieldError(ValueError):
+    """Raised when ``fields=`` names something an employee does not have."""
+
+
+def parse_fields(spec: str) -> tuple[str, ...]:
+    """Parse a comma-separated field list into canonical order.
+
+    Equivalent requests share one cached statement and response schema.
+    """
+
+    requested = {name.strip() for name in spec.split(",") if name.strip()}
+    unknown = requested.difference(EMPLOYEE_FIELDS)
+    if unknown:
+        raise UnknownFieldError(
+            f"Unknown field(s) {', '.join(sorted(unknown))}; "
+            f"choose from {', '.join(EMPLOYEE_FIELDS)}"
+        )
+    if not requested:
+        raise UnknownFieldError("fields must name at least one field")
+    return tuple(name for name in EMPLOYEE_FIELDS if name in requested)
+
+
+def field_columns(fields: tuple[str, ...]) -> tuple[str, ...]:
+    """Return the columns to select to produce ``fields``."""
+
+    needed = set(fields)
+    if "version" in needed:
+        needed.update(VERSIONED_COLUMNS)
+    return tuple(column for column in COLUMNS if column in needed)
+
+
+# Compare-and-set: matches only while every versioned column still holds
+# the value that was read.
+_UPDATE_LAST_NAME_IF_UNCHANGED = (
+    update(Employee)
+    .where(
+        Employee.emp_no == bindparam("match_emp_no"),
+        *(getattr(Employee, column) == bindparam(f"match_{column}") for column in VERSIONED_COLUMNS),
+    )
+    .values(last_name=bindparam("new_last_name"))
+    .execution_options(synchronize_session=False)
+)
+
+
+def update_employee_last_name(
+    session: Session,
+    emp_no: int,
+    last_name: str,
+    *,
+    expected_version: Optional[str] = None,
+    max_attempts: int = 3,
+    commit: bool = True,
+) -> Employee | None:
+    """Set the last name of ``emp_no`` without locking the row.
+
+    The UPDATE only matches if every versioned column still holds the value
+    that was read (compare-and-set), so a concurrent edit is never silently
+    overwritten. With ``expected_version`` a mismatch raises
+    :class:`VersionConflictError` straight away; without it the read and the
+    conditional update are retried up to ``max_attempts`` times.
+
+    With ``commit=False`` the update joins the session's transaction and
+    the caller ends it with :func:`commit_changes` or
+    :func:`rollback_changes`. It is not retried then, since a retry would
+    roll back the caller's other work.
+    """
+
+    for _attempt in range(max_attempts if commit else 1):
+        employee = session.get(Employee, emp_no, populate_existing=True)
+        if employee is None:
+            return None
+        if expected_version is not None and employee_version(employee) != expected_version:
+            raise VersionConflictError(employee)
+        observed = {column: getattr(employee, column) for column in VERSIONED_COLUMNS}
+        params = {f"match_{column}": value for column, value in observed.items()}
+        params["match_emp_no"] = emp_no
+        params["new_last_name"] = last_name
+        result = session.execute(_UPDATE_LAST_NAME_IF_UNCHANGED, params)
+        if result.rowcount == 1:
+            break
+        if commit:
+            session.rollback()
+    else:
+        current = session.get(Employee, emp_no, populate_existing=True)
+        if current is None:
+            return None
+        raise VersionConflictError(current)
+    previous = observed["last_name"]
+
+    # The audit record is queued before the commit (on AuditBackpressureError
+    # the update is rolled back) and marked aborted if the commit fails. The
+    # commit does not wait for it to reach disk.
+    principal = get_active_principal()
+    username = principal.username if principal else None
+    events.record_change(
+        session, emp_no=emp_no, field="last_name", old=previous, new=last_name,
+        principal=username,
+    )
+    audit_log = audit.get_audit_log()
+    audit_seq = None
+    if audit_log is not None:
+        try:
+            audit_seq = audit_log.append(emp_no, previous, last_name, username)
+        except audit.AuditBackpressureError:
+            rollback_changes(session)
+            raise
+    if not commit:
+        if audit_seq is not None:
+            session.info.setdefault(PENDING_AUDIT_KEY, []).append(audit_seq)
+        # Reads later in the transaction see the new name without a reload.
+        set_committed_value(employee, "last_name", last_name)
+        return employee
+    try:
+        session.commit()
+    except Exception:
+        if audit_seq is not None:
+            audit_log.abort(audit_seq)
+        raise
+    count_cache.invalidate()
+    list_pages.bump()
     session.refresh(employee)
     return employee
+
+
+PENDING_AUDIT_KEY = "pending_audit_seqs"
+"""``Session.info`` key of audit records written ahead of a deferred commit."""
+
+
+def commit_changes(session: Session) -> None:
+    """Commit updates made with ``commit=False``.
+
+    If the commit fails, their audit records are marked aborted.
+    """
+
+    seqs = session.info.pop(PENDING_AUDIT_KEY, [])
+    try:
+        session.commit()
+    except Exception:
+        _abort_audit(seqs)
+        raise
+    count_cache.invalidate()
+    list_pages.bump()
+
+
+def rollback_changes(session: Session) -> None:
+    """Roll back updates made with ``commit=False`` and abort their audit records."""
+
+    seqs = session.info.pop(PENDING_AUDIT_KEY, [])
+    session.rollback()
+    _abort_audit(seqs)
+
+
+def _abort_audit(seqs: list[int]) -> None:
+    audit_log = audit.get_audit_log()
+    if audit_log is not None:
+        for seq in seqs:
+            audit_log.abort(seq)
@@ -1,27 +1,223 @@
-from sqlalchemy import create_engine
-from typing import Any
+import logging
+import math
+from threading import Lock
+from typing import Any, Optional
 
 from fastapi import HTTPException, status
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase, Session as SASession, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql import Executable
 
+from . import deadlines
+from .circuit import CircuitBreaker
 from .auth import get_active_principal
 from .config import settings
 
 from sqlalchemy import Select
 from sqlalchemy.sql.elements import TextClause
 
-DATABASE_URL = (
-    f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASS}"
-    f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
-)
+logger = logging.getLogger(__name__)
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-    future=True,
-)
+
+def get_database_url() -> str:
+    if settings.DATABASE_URL:
+        return settings.DATABASE_URL
+    return (
+        f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASS}"
+        f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+    )
+
+
+class StatementCacheStats:
+    """Count how often executed statements were found in SQLAlchemy's compiled cache."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def record(self, outcome: CacheStats) -> None:
+        with self._lock:
+            if outcome is CacheStats.CACHE_HIT:
+                self.hits += 1
+            elif outcome is CacheStats.CACHE_MISS:
+                self.misses += 1
+            else:
+                self.uncached += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.uncached = 0
+
+    def snapshot(self, engine: Optional[Engine] = None) -> dict[str, Any]:
+        with self._lock:
+            looked_up = self.hits + self.misses
+            result: dict[str, Any] = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncached": self.uncached,
+                "hit_ratio": round(self.hits / looked_up, 4) if looked_up else None,
+            }
+        cache = getattr(engine, "_compiled_cache", None) if engine is not None else None
+        if cache is not None:
+            result["entries"] = len(cache)
+            result["capacity"] = cache.capacity
+        return result
+
+
+statement_cache_stats = StatementCacheStats()
+"""Compiled-cache outcomes of every statement run on the shared engine."""
+
+
+def _record_cache_outcome(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+    statement_cache_stats.record(context.cache_hit)
+
+
+# MySQL error 3024 and MariaDB error 1969: query execution was
+# interrupted, maximum statement execution time exceeded.
+_MYSQL_QUERY_TIMEOUTS = frozenset({3024, 1969})
+# SQLite calls the progress handler every this many virtual machine
+# instructions; about every few hundred microseconds.
+_SQLITE_PROGRESS_STEPS = 10_000
+
+
+class DeadlineQueuePool(QueuePool):
+    """``QueuePool`` whose checkout wait never outlasts the request deadline."""
+
+    @property
+    def _timeout(self) -> float:  # read by QueuePool._do_get on every checkout
+        return deadlines.bound(self._configured_timeout)
+
+    @_timeout.setter
+    def _timeout(self, value: float) -> None:
+        self._configured_timeout = value
+
+    def _do_get(self):
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if deadlines.expired():
+                raise deadlines.DeadlineExceeded(
+                    "Request deadline exceeded waiting for a database connection"
+                ) from None
+            raise
+
+
+def _apply_mysql_deadline(conn, _cursor, statement, parameters, _context, _executemany):
+    deadlines.check()
+    left = deadlines.remaining()
+    if left is not None and statement.startswith("SELECT"):
+        # Only SELECTs are bounded here; writes are bounded by the checks
+        # before each statement and by lock wait timeouts.
+        if conn.dialect.is_mariadb:
+            # MariaDB parses but ignores the MAX_EXECUTION_TIME hint.
+            statement = f"SET STATEMENT max_statement_time={max(0.001, left):.3f} FOR {statement}"
+        else:
+            hint = f"SELECT /*+ MAX_EXECUTION_TIME({max(1, int(left * 1000))}) */"
+            statement = hint + statement[len("SELECT"):]
+    return statement, parameters
+
+
+def _check_deadline(_conn, _cursor, _statement, _parameters, _context, _executemany) -> None:
+    deadlines.check()
+
+
+def _install_sqlite_interrupt(dbapi_connection, _connection_record, _connection_proxy) -> None:
+    # A non-zero return aborts the running statement with "interrupted".
+    dbapi_connection.set_progress_handler(deadlines.expired, _SQLITE_PROGRESS_STEPS)
+
+
+def _translate_deadline_error(context) -> Optional[BaseException]:
+    error = context.original_exception
+    timed_out = deadlines.expired() or (
+        getattr(error, "args", None) and error.args[0] in _MYSQL_QUERY_TIMEOUTS
+    )
+    if timed_out and deadlines.remaining() is not None:
+        return deadlines.DeadlineExceeded("Request deadline exceeded during a database query")
+    return None
+
+
+def _install_deadlines(engine: Engine) -> None:
+    """Apply the current request deadline to every statement run on ``engine``."""
+
+    if engine.dialect.name == "mysql":
+        event.listen(engine, "before_cursor_execute", _apply_mysql_deadline, retval=True)
+    else:
+        event.listen(engine, "before_cursor_execute", _check_deadline)
+    if engine.dialect.name == "sqlite":
+        # On checkout rather than connect, so pooled and static connections
+        # opened before this ran are covered too.
+        event.listen(engine, "checkout", _install_sqlite_interrupt)
+    event.listen(engine, "handle_error", _translate_deadline_error, retval=True)
+
+
+def probe_engine(engine: Engine) -> None:
+    """Run ``SELECT 1`` on a fresh checkout from ``engine``; raises if unreachable."""
+
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+
+
+def _probe_database() -> None:
+    probe_engine(get_engine())
+
+
+def new_breaker(probe, name: str = "database") -> CircuitBreaker:
+    """Create a breaker with the configured threshold and probe interval."""
+
+    return CircuitBreaker(
+        failure_threshold=settings.DB_BREAKER_THRESHOLD,
+        probe_interval=settings.DB_BREAKER_PROBE_INTERVAL,
+        probe=probe,
+        name=name,
+    )
+
+
+db_breaker = new_breaker(_probe_database)
+"""Fails database work fast after repeated connection failures on the shared engine.
+
+With ``SHARDS`` each shard has a breaker of its own (see :mod:`app.sharding`).
+"""
+
+
+def check_breaker(breaker: CircuitBreaker) -> None:
+    """Raise ``503`` while ``breaker`` is open."""
+
+    if not breaker.allow():
+        # The database has been unreachable; fail now rather than wait for
+        # a connect timeout. A background probe closes the breaker.
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is unavailable, please retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(breaker.probe_interval)))},
+        )
+
+
+def install_breaker(engine: Engine, breaker: CircuitBreaker) -> None:
+    """Count ``engine``'s connection failures and successful checkouts on ``breaker``."""
+
+    def record_connection_error(context) -> None:
+        # Only failures to reach the database count: a failed connect has no
+        # Connection yet, and a dropped one is flagged as a disconnect.
+        if context.is_disconnect or context.connection is None:
+            breaker.record_failure()
+
+    def record_checkout(_dbapi_connection, _connection_record, _connection_proxy) -> None:
+        breaker.record_success()
+
+    event.listen(engine, "handle_error", record_connection_error)
+    event.listen(engine, "checkout", record_checkout)
+
+
+# The engine (and with it the MySQL dialect and driver) is created by the
+# application lifespan instead of at import time, so importing the app, the
+# test suite and forked workers stay cheap and never open connections early.
+_engine: Optional[Engine] = None
+_engine_lock = Lock()
 
 
 class AccessControlledSession(SASession):
@@ -111,7 +307,6 @@ class AccessControlledSession(SASession):
         return super().bulk_update_mappings(mapper, mappings)
 
 SessionLocal = sessionmaker(
-    bind=engine,
     autoflush=False,
     autocommit=False,
     future=True,
@@ -121,3 +316,114 @@ SessionLocal = sessionmaker(
 
 class Base(DeclarativeBase):
     pass
+
+
+def init_engine(url: Optional[str] = None, **engine_kwargs: Any) -> Engine:
+    """Create the shared engine and bind :data:`SessionLocal` to it.
+
+    Calling this again after :func:`dispose_engine` builds a fresh engine.
+    """
+
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_database_engine(
+                url or get_database_url(), breaker=db_breaker, **engine_kwargs
+            )
+            SessionLocal.configure(bind=_engine)
+        return _engine
+
+
+def create_database_engine(
+    database_url: str, *, breaker: Optional[CircuitBreaker] = None, **engine_kwargs: Any
+) -> Engine:
+    """Create an engine with the API's pool settings and deadlines.
+
+    With ``breaker``, the engine's connection failures trip it.
+    """
+
+    options: dict[str, Any] = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "future": True,
+    }
+    if database_url.startswith("sqlite"):
+        # Sessions run in the threadpool; wait on SQLite's write lock
+        # instead of failing immediately.
+        options["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    else:
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+        options["poolclass"] = DeadlineQueuePool
+        options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    options.update(engine_kwargs)
+    engine = create_engine(database_url, **options)
+    event.listen(engine, "after_cursor_execute", _record_cache_outcome)
+    _install_deadlines(engine)
+    if breaker is not None:
+        install_breaker(engine, breaker)
+    return engine
+
+
+def get_engine() -> Engine:
+    """Return the shared engine, creating it on first use."""
+
+    engine = _engine
+    return engine if engine is not None else init_engine()
+
+
+def prewarm_pool(connections: int, engine: Optional[Engine] = None) -> int:
+    """Open ``connections`` pooled connections up front and return them to the pool.
+
+    Returns the number of connections that were opened successfully. Failures
+    are logged rather than raised so a briefly unavailable database does not
+    keep the worker from starting. ``engine`` defaults to the shared one.
+    """
+
+    engine = engine or get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    except Exception:  # noqa: BLE001 - any driver error just stops the warmup
+        logger.warning(
+            "Pool prewarm stopped after %d of %d connections", len(opened), connections,
+            exc_info=True,
+        )
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+def pool_status(engine: Optional[Engine] = None) -> Optional[dict[str, Any]]:
+    """Describe a pool from in-process counters, or ``None`` before startup.
+
+    ``engine`` defaults to the shared one.
+    """
+
+    engine = engine or _engine
+    if engine is None:
+        return None
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    return {
+        "class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": pool._max_overflow,
+    }
+
+
+def dispose_engine() -> None:
+    """Close every pooled connection and forget the engine."""
+
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+    db_breaker.reset()
@@ -0,0 +1,130 @@
+"""Per-request deadlines carried to the database.
+
+:class:`DeadlineMiddleware` gives every request a time budget:
+``REQUEST_DEADLINE`` seconds by default, overridden per path prefix by
+``REQUEST_DEADLINE_RULES``. A client can ask for a different budget with an
+``X-Request-Timeout`` header, capped at ``REQUEST_DEADLINE_MAX``. A budget
+of ``0`` means no deadline, which long-lived routes such as the change
+stream and bulk import use.
+
+The deadline is stored in a :class:`~contextvars.ContextVar`, so it follows
+the request into dependencies and threadpool calls. :mod:`app.db` turns the
+remaining time into a statement timeout and a bound on the pool checkout
+wait. When the deadline passes, database work raises
+:class:`DeadlineExceeded`, which the application answers with ``504``.
+"""
+
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+HEADER = "X-Request-Timeout"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work would continue past the current request's deadline."""
+
+
+@dataclass(frozen=True)
+class DeadlineRule:
+    prefix: str
+    seconds: float
+
+
+def parse_rules(spec: str) -> list[DeadlineRule]:
+    """Parse ``"/prefix=seconds,..."`` into rules, longest prefix first."""
+
+    rules = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, seconds = item.partition("=")
+        rules.append(DeadlineRule(prefix=prefix.strip(), seconds=float(seconds)))
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or ``None`` without one."""
+
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def bound(timeout: float) -> float:
+    """Shorten ``timeout`` so it ends no later than the current deadline."""
+
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
+
+
+def check() -> None:
+    """Raise :class:`DeadlineExceeded` if the current deadline has passed."""
+
+    if expired():
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def set_deadline(seconds: Optional[float]):
+    """Start a deadline ``seconds`` from now; returns a token for :func:`reset_deadline`."""
+
+    return _deadline.set(None if not seconds else time.monotonic() + seconds)
+
+
+def reset_deadline(token) -> None:
+    _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """Give each HTTP request its deadline before any other work runs."""
+
+    def __init__(
+        self, app: ASGIApp, *, default: float, rules: list[DeadlineRule], maximum: float
+    ) -> None:
+        self.app = app
+        self.default = default
+        self.rules = rules
+        self.maximum = maximum
+
+    def budget(self, path: str, requested: Optional[str]) -> float:
+        seconds = next(
+            (rule.seconds for rule in self.rules if path.startswith(rule.prefix)), self.default
+        )
+        if requested is not None:
+            try:
+                value = float(requested)
+            except ValueError:
+                value = 0.0
+            if value > 0:  # unusable values keep the route's budget
+                seconds = value
+        return min(seconds, self.maximum) if seconds > 0 else 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.budget(scope["path"], Headers(scope=scope).get(HEADER))
+        token = set_deadline(seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+
+async def deadline_exceeded_handler(_request: Request, exc: DeadlineExceeded) -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": str(exc) or "Request deadline exceeded"})
@@ -1,18 +1,122 @@
-from typing import Generator
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Generator, Iterator, Optional
 
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session as SASession
 
+from . import deadlines, sharding
 from .auth import Principal, get_current_principal
-from .db import SessionLocal
+from .config import settings
+from .db import SessionLocal, check_breaker, db_breaker, get_engine
+from .rate_limit import db_admission
 from .session_manager import session_registry
 
 
+SessionOpener = Callable[..., ContextManager[SASession]]
+"""``open_session(emp_no=None)``: a context manager yielding an admitted session."""
+
+
+def _check_breaker(emp_no: Optional[int] = None) -> None:
+    """Fail fast while the database the work will use is unreachable.
+
+    With sharding that is the shard owning ``emp_no``, or every shard.
+    """
+
+    shards = sharding.get_shards()
+    if shards is None:
+        check_breaker(db_breaker)
+    elif emp_no is not None:
+        check_breaker(shards.breaker_for(emp_no))
+    else:
+        for breaker in shards.breakers:
+            check_breaker(breaker)
+
+
+def _admit() -> None:
+    if not db_admission.acquire(deadlines.bound(db_admission.wait_timeout)):
+        deadlines.check()
+        # Shed load instead of queueing on the connection pool.
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
 def get_db(_: Principal = Depends(get_current_principal)) -> Generator:
-    db = SessionLocal()
+    sharded = sharding.get_shards() is not None
+    if not sharded:
+        _check_breaker()
+    _admit()
     try:
+        # With SHARDS there is no shared engine: the session is unbound, and
+        # work picks a shard through get_employee_db or the session opener.
+        db = SessionLocal() if sharded else SessionLocal(bind=get_engine())
+        try:
+            yield db
+        finally:
+            db.close()
+    finally:
+        db_admission.release()
+
+
+def get_session_factory() -> Callable[[], SASession]:
+    """Return the factory behind :func:`get_session_opener` (overridden in tests)."""
+
+    return lambda: SessionLocal(bind=get_engine())
+
+
+def get_session_opener(
+    _: Principal = Depends(get_current_principal),
+    factory: Callable[[], SASession] = Depends(get_session_factory),
+) -> SessionOpener:
+    """Return an opener of sessions owned by the work itself, not by the request.
+
+    A read shared through single flight may outlive the request that
+    started it, because that request can be cancelled while others still
+    wait for the result. The request-scoped :func:`get_db` session would be
+    closed under it then. Each opened session takes its own admission slot
+    and is closed by the work that opened it. With sharding, ``emp_no``
+    picks the shard. The breaker is checked when a session is opened, so
+    requests answered from a cache never fail because the database is down.
+    """
+
+    @contextmanager
+    def open_session(emp_no: Optional[int] = None) -> Iterator[SASession]:
+        _check_breaker(emp_no)
+        _admit()
+        try:
+            shards = sharding.get_shards()
+            session = (
+                factory() if shards is None or emp_no is None else shards.session_for(emp_no)
+            )
+            try:
+                yield session
+            finally:
+                session.close()
+        finally:
+            db_admission.release()
+
+    return open_session
+
+
+def get_employee_db(emp_no: int, db: SASession = Depends(get_db)) -> Generator:
+    """Yield a session for the database that holds employee ``emp_no``.
+
+    Without sharding this is the :func:`get_db` session. With sharding only
+    the owning shard's breaker is consulted.
+    """
+
+    shards = sharding.get_shards()
+    if shards is None:
         yield db
+        return
+    _check_breaker(emp_no)
+    session = shards.session_for(emp_no)
+    try:
+        yield session
     finally:
-        db.close()
+        session.close()
 
 
 async def require_active_session(
@@ -32,3 +136,14 @@ async def require_active_session(
             detail="Session is not active. Please log in again.",
         )
     return principal
+
+
+async def require_admin(principal: Principal = Depends(require_active_session)) -> Principal:
+    """Allow only write-capable users listed in ``ADMIN_USERS``."""
+
+    if not principal.access.can_write or principal.username not in settings.ADMIN_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"User '{principal.username}' is not an administrator.",
+        )
+    return principal
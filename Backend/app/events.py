@@ -0,0 +1,293 @@
+"""In-process change feed for employee updates.
+
+Write paths call :func:`record_change` on their SQLAlchemy session. The
+changes are published to :data:`change_hub` only after the transaction
+commits and are discarded on rollback, so subscribers never see an edit
+that did not happen.
+
+The hub numbers every change, keeps the most recent ones for replay and
+fans them out to subscribers, each with its own bounded buffer. A subscriber
+that falls behind is cut off instead of slowing the writers down. It then
+reconnects with the last event id it saw and is replayed the changes it
+missed. The feed is per process: with several workers, a subscriber only
+sees changes committed through its own worker. Event ids are
+``<epoch>-<seq>``, where the epoch is random per hub, so an id issued by
+another worker or before a restart is recognised as a gap rather than
+matched against this hub's unrelated sequence numbers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+from typing import AsyncIterator, Callable, Deque, Optional
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PENDING_CHANGES_KEY = "pending_changes"
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """A committed change to one employee field."""
+
+    seq: int
+    timestamp: float
+    emp_no: int
+    field: str
+    old: Optional[str]
+    new: Optional[str]
+    principal: Optional[str]
+    epoch: str = ""
+
+    @property
+    def id(self) -> str:
+        """Event id, unique across workers and restarts."""
+
+        return f"{self.epoch}-{self.seq}"
+
+
+def parse_event_id(value: str) -> Optional[tuple[str, int]]:
+    """Split an ``<epoch>-<seq>`` event id; ``None`` when malformed."""
+
+    epoch, separator, seq = value.strip().rpartition("-")
+    if not separator or not epoch or not seq.isdigit():
+        return None
+    return epoch, int(seq)
+
+
+class SubscriberLimitError(RuntimeError):
+    """Raised when the hub already serves ``max_subscribers`` streams."""
+
+
+class Subscription:
+    """One subscriber's view of the feed; consumed on its event loop."""
+
+    def __init__(
+        self,
+        emp_nos: Optional[frozenset[int]],
+        backlog: list[ChangeEvent],
+        *,
+        missed: bool,
+        start_seq: int,
+        start_id: str,
+        buffer_size: int,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        self.emp_nos = emp_nos
+        self.missed = missed
+        """``True`` when changes after the requested sequence are no longer retained."""
+        self.start_seq = start_seq
+        """Last sequence published before the subscription; live changes follow it."""
+        self.start_id = start_id
+        """Event id for ``start_seq``, sent with a ``reset``."""
+        self.lagged = False
+        self._backlog: Deque[ChangeEvent] = deque(backlog)
+        self._queue: asyncio.Queue[ChangeEvent] = asyncio.Queue(buffer_size)
+        self._loop = loop
+
+    def matches(self, change: ChangeEvent) -> bool:
+        return self.emp_nos is None or change.emp_no in self.emp_nos
+
+    def _deliver(self, changes: list[ChangeEvent]) -> None:
+        # Runs on the subscriber's loop via call_soon_threadsafe.
+        for change in changes:
+            if self.lagged:
+                return
+            try:
+                self._queue.put_nowait(change)
+            except asyncio.QueueFull:
+                # Keep what is buffered; the stream ends once it is drained.
+                self.lagged = True
+
+    async def events(self, heartbeat: float) -> AsyncIterator[Optional[ChangeEvent]]:
+        """Yield changes in order, or ``None`` after ``heartbeat`` idle seconds.
+
+        Ends when the subscriber has lagged and its buffer is drained.
+        """
+
+        while self._backlog:
+            yield self._backlog.popleft()
+        while True:
+            if self.lagged and self._queue.empty():
+                return
+            try:
+                yield await asyncio.wait_for(self._queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class ChangeHub:
+    """Fan committed changes out to subscribers, keeping ``history`` for replay."""
+
+    def __init__(
+        self,
+        *,
+        history: int = 1024,
+        buffer_size: int = 256,
+        max_subscribers: int = 1000,
+        epoch: Optional[str] = None,
+    ) -> None:
+        self.epoch = epoch or uuid4().hex[:12]
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = Lock()
+        self._seq = 0
+        self._history: Deque[ChangeEvent] = deque(maxlen=history)
+        self._subscribers: set[Subscription] = set()
+        self._listeners: list[Callable[[list[ChangeEvent]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, changes: list[dict]) -> list[ChangeEvent]:
+        """Number ``changes`` and hand them to every matching subscriber.
+
+        Safe to call from any thread; never blocks on slow subscribers.
+        """
+
+        published = []
+        with self._lock:
+            now = time.time()
+            for change in changes:
+                self._seq += 1
+                published.append(ChangeEvent(seq=self._seq, timestamp=now, epoch=self.epoch, **change))
+            self._history.extend(published)
+            for listener in self._listeners:
+                try:
+                    listener(published)
+                except Exception:
+                    logger.exception("Change listener %r failed", listener)
+            # Scheduled under the lock so every subscriber gets changes in
+            # sequence order even when several threads publish at once.
+            for subscriber in list(self._subscribers):
+                matching = [change for change in published if subscriber.matches(change)]
+                if not matching:
+                    continue
+                try:
+                    subscriber._loop.call_soon_threadsafe(subscriber._deliver, matching)
+                except RuntimeError:  # the subscriber's loop is gone
+                    self._subscribers.discard(subscriber)
+        return published
+
+    def subscribe(
+        self,
+        emp_nos: Optional[frozenset[int]] = None,
+        *,
+        after: Optional[str] = None,
+    ) -> Subscription:
+        """Register a subscriber, replaying retained changes after event id ``after``.
+
+        An id from another epoch (another worker, or before a restart) or a
+        malformed one is a gap: the subscription is marked ``missed``. Must be
+        called from the event loop that will consume the subscription.
+        """
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise SubscriberLimitError("Too many change feed subscribers")
+            backlog: list[ChangeEvent] = []
+            missed = False
+            if after is not None:
+                parsed = parse_event_id(after)
+                oldest = self._history[0].seq if self._history else self._seq + 1
+                missed = (
+                    parsed is None
+                    or parsed[0] != self.epoch
+                    or not oldest - 1 <= parsed[1] <= self._seq
+                )
+                if not missed:
+                    backlog = [
+                        change
+                        for change in self._history
+                        if change.seq > parsed[1]
+                        and (emp_nos is None or change.emp_no in emp_nos)
+                    ]
+            subscription = Subscription(
+                emp_nos,
+                backlog,
+                missed=missed,
+                start_seq=self._seq,
+                start_id=self.event_id(self._seq),
+                buffer_size=self.buffer_size,
+                loop=loop,
+            )
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def add_listener(self, listener: Callable[[list[ChangeEvent]], None]) -> None:
+        """Call ``listener`` synchronously with every published batch.
+
+        Listeners run in the publishing thread, under the hub's lock and in
+        sequence order. They must be quick and must not publish.
+        """
+
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[list[ChangeEvent]], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+def record_change(
+    session: Session,
+    *,
+    emp_no: int,
+    field: str,
+    old: Optional[str],
+    new: Optional[str],
+    principal: Optional[str] = None,
+) -> None:
+    """Queue a change on ``session`` to be published when it commits."""
+
+    session.info.setdefault(PENDING_CHANGES_KEY, []).append(
+        {"emp_no": emp_no, "field": field, "old": old, "new": new, "principal": principal}
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_changes(session: Session) -> None:
+    changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if not changes:
+        return
+    try:
+        change_hub.publish(changes)
+    except Exception:  # the commit already happened; never fail it here
+        logger.exception("Failed to publish %d change(s)", len(changes))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_changes(session: Session, _previous_transaction) -> None:
+    session.info.pop(PENDING_CHANGES_KEY, None)
+
+
+change_hub = ChangeHub(
+    history=settings.EVENTS_HISTORY,
+    buffer_size=settings.EVENTS_SUBSCRIBER_BUFFER,
+    max_subscribers=settings.EVENTS_MAX_SUBSCRIBERS,
+)
+"""Process-wide hub behind ``GET /employees/changes``."""
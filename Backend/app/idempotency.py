@@ -0,0 +1,334 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+A client that retries a write with the same ``Idempotency-Key`` header gets
+the stored response of the first attempt. The handler, and with it the
+password check, the database write and the session registry, does not run
+again. A duplicate that arrives while the first attempt is still running
+waits for it instead of racing it. Keys are scoped to the caller's
+credentials, and reusing a key for a different request is rejected with
+``422``.
+
+Responses are kept per worker process for ``IDEMPOTENCY_TTL`` seconds.
+Server errors (``5xx``) and ``429`` are not stored, so those retries run again.
+
+The request body is read before the handler runs, and before the caller is
+authenticated. So bodies over ``IDEMPOTENCY_MAX_REQUEST_BODY`` bytes are
+refused with ``413``. Streaming routes (``skip_paths``, such as the bulk
+import) are passed through untouched, so their bodies are never buffered.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when a key is presented again with a different request."""
+
+
+class RequestTooLargeError(ValueError):
+    """Raised when a request body exceeds the size the middleware will buffer."""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    response: Optional[StoredResponse] = None
+    waiters: list = field(default_factory=list)
+
+
+class IdempotencyStore:
+    """Bounded TTL map of idempotency keys to in-flight or finished responses.
+
+    In-flight entries are never evicted or expired, so their waiters are
+    always woken by :meth:`complete`.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def acquire(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Return the stored response for ``key``, or ``None`` if the caller now owns it.
+
+        An owner must call :meth:`complete` when done. Waits while another
+        request owns ``key``.
+        """
+
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._expire(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._entries[key] = _Entry(fingerprint, expires_at=math.inf)
+                    self._evict()
+                    return None
+                if entry.fingerprint != fingerprint:
+                    raise IdempotencyKeyReusedError(key)
+                if entry.response is not None:
+                    return entry.response
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                entry.waiters.append((loop, waiter))
+            # Woken when the owner finishes. If it stored nothing, the next
+            # pass makes this request the owner.
+            await waiter
+
+    def complete(self, key: str, response: Optional[StoredResponse]) -> None:
+        """Store ``response`` for ``key`` (or forget the key) and wake any waiters."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if response is None:
+                del self._entries[key]
+            else:
+                entry.response = response
+                entry.expires_at = self._clock() + self.ttl
+                self._entries.move_to_end(key)
+            waiters, entry.waiters = entry.waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = OrderedDict(
+                (key, entry) for key, entry in self._entries.items() if entry.response is None
+            )
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                return
+            del self._entries[key]
+
+    def _evict(self) -> None:
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [key for key, entry in self._entries.items() if entry.response is not None]:
+            del self._entries[key]
+            if len(self._entries) <= self.max_entries:
+                return
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _is_storable(status: int) -> bool:
+    return status < 500 and status != 429
+
+
+class IdempotencyMiddleware:
+    """Answer retried writes carrying an ``Idempotency-Key`` from :class:`IdempotencyStore`."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        store: IdempotencyStore,
+        methods: tuple[str, ...] = ("POST", "PUT", "PATCH", "DELETE"),
+        max_body: int = 64 * 1024,
+        max_request_body: int = 1024 * 1024,
+        skip_paths: tuple[str, ...] = (),
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.methods = methods
+        self.max_body = max_body
+        self.max_request_body = max_request_body
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or scope["path"].startswith(self.skip_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+            return
+
+        too_large = (
+            f"Requests with an Idempotency-Key are limited to {self.max_request_body} bytes"
+        )
+        declared = headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > self.max_request_body:
+            await _send_error(send, 413, too_large)
+            return
+        try:
+            body = await _read_body(receive, self.max_request_body)
+        except RequestTooLargeError:
+            await _send_error(send, 413, too_large)
+            return
+        # Scoped to the exact credentials presented, which are not verified
+        # here, so a replay never reaches anyone who could not have made the
+        # original request.
+        store_key = _digest(
+            headers.get("authorization", ""), headers.get("x-session-id", ""), key
+        )
+        fingerprint = _digest(
+            scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), body
+        )
+        try:
+            stored = await self.store.acquire(store_key, fingerprint)
+        except IdempotencyKeyReusedError:
+            await _send_error(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        if stored is not None:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": stored.status,
+                    "headers": [*stored.headers, (b"idempotent-replayed", b"true")],
+                }
+            )
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        recorder = _ResponseRecorder(send, self.max_body)
+        response: Optional[StoredResponse] = None
+        try:
+            await self.app(scope, _replay_body(body, receive), recorder.send)
+            response = recorder.result()
+        finally:
+            self.store.complete(store_key, response)
+
+
+class _ResponseRecorder:
+    def __init__(self, send: Send, max_body: int) -> None:
+        self.downstream = send
+        self.max_body = max_body
+        self.status: Optional[int] = None
+        self.headers: list[tuple[bytes, bytes]] = []
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.complete = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = list(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            self.size += len(chunk)
+            if self.size <= self.max_body:
+                self.chunks.append(chunk)
+            self.complete = not message.get("more_body", False)
+        await self.downstream(message)
+
+    def result(self) -> Optional[StoredResponse]:
+        if (
+            self.status is None
+            or not self.complete
+            or self.size > self.max_body
+            or not _is_storable(self.status)
+        ):
+            return None
+        return StoredResponse(self.status, self.headers, b"".join(self.chunks))
+
+
+async def _read_body(receive: Receive, limit: int) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:  # stop reading; the rest is never buffered
+            raise RequestTooLargeError(size)
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+def _digest(*parts: str | bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+async def _send_error(send: Send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.IDEMPOTENCY_TTL, max_entries=settings.IDEMPOTENCY_MAX_ENTRIES
+)
+"""Per-worker store used by the middleware installed in ``main.py``."""
@@ -0,0 +1,319 @@
+"""Streaming bulk import of employees from CSV or NDJSON.
+
+Rows are read lazily and validated in chunks against
+:class:`~app.schemas.EmployeeImportRow`. Each chunk is written with one
+batched ``INSERT`` in its own transaction. Memory use depends on the chunk
+size, not the file size, so multi-million-row files stream through with a
+flat footprint. A database error stops the import. Chunks committed before
+the error are kept, and ``last_committed_line`` tells you where to resume.
+
+``upsert`` mode overwrites employees that already exist, using
+``ON DUPLICATE KEY UPDATE`` on MySQL and ``ON CONFLICT DO UPDATE`` on SQLite.
+Imported rows are not written to the audit log or the change feed. The
+headcounts behind ``/employees/stats`` are updated as chunks commit.
+
+Usage (from the ``Backend`` directory)::
+
+    python -m app.importer employees.csv --mode upsert
+"""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from . import aggregates, counts, page_cache, snapshot
+from .db import SessionLocal, dispose_engine, init_engine
+from .models import Employee
+from .schemas import EmployeeImportRow
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+MODES = ("insert", "upsert")
+COLUMNS = tuple(EmployeeImportRow.model_fields)
+# Caps the rows held in memory and the length of each write transaction.
+MAX_CHUNK_SIZE = 5000
+
+_Record = tuple[int, Optional[dict], Optional[str]]  # (line, record, parse error)
+
+_chunk_adapter = TypeAdapter(list[EmployeeImportRow])
+
+
+class EmployeeImportError(ValueError):
+    """Raised when the input or options cannot be imported at all."""
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    written: int = 0
+    rejected: int = 0
+    chunks: int = 0
+    last_committed_line: int = 0
+    errors: list[RowError] = field(default_factory=list)
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def iter_lines(chunks: Iterable[bytes], encoding: str = "utf-8-sig") -> Iterator[str]:
+    """Split a stream of byte chunks into text lines, keeping line endings."""
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        while (end := pending.find("\n", start)) != -1:
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _csv_records(lines: Iterable[str]) -> Iterator[_Record]:
+    reader = csv.DictReader(lines)
+    missing = set(COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise EmployeeImportError(f"CSV header is missing columns: {', '.join(sorted(missing))}")
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def _ndjson_records(lines: Iterable[str]) -> Iterator[_Record]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def _validate(chunk: list[_Record]) -> tuple[list[dict[str, Any]], list[RowError]]:
+    errors = [RowError(line, message) for line, _, message in chunk if message is not None]
+    records = [record for _, record, message in chunk if message is None]
+    try:
+        # Fast path: the whole chunk in one validator call.
+        return [row.model_dump() for row in _chunk_adapter.validate_python(records)], errors
+    except ValidationError:
+        pass
+    rows = []
+    for line, record, message in chunk:
+        if message is not None:
+            continue
+        try:
+            rows.append(EmployeeImportRow.model_validate(record).model_dump())
+        except ValidationError as exc:
+            errors.append(RowError(line, _describe(exc)))
+    errors.sort(key=lambda error: error.line)
+    return rows, errors
+
+
+@lru_cache(maxsize=None)
+def _write_statement(dialect: str, mode: str):
+    """Return the statement each chunk is executed with, built once per dialect and mode.
+
+    Chunks run as one ``executemany``. The SQLite driver loops over the rows
+    in C. PyMySQL rewrites ``INSERT ... VALUES`` (optionally followed by
+    ``ON DUPLICATE KEY UPDATE``) into multi-row statements of up to
+    ``max_stmt_length`` bytes. The statement compiles once instead of once
+    per chunk.
+    """
+
+    table = Employee.__table__
+    if mode == "insert":
+        return insert(table)
+    updated = [column for column in COLUMNS if column != "emp_no"]
+    if dialect == "mysql":
+        # SQLAlchemy renders the MySQL 8.0.20+ row alias ("AS new"), which
+        # PyMySQL cannot batch. VALUES() is deprecated there but still
+        # supported, and it keeps the upsert a multi-row statement.
+        return text(
+            f"INSERT INTO {table.name} ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join(':' + column for column in COLUMNS)}) "
+            "ON DUPLICATE KEY UPDATE "
+            + ", ".join(f"{column} = VALUES({column})" for column in updated)
+        )
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.emp_no],
+            set_={column: stmt.excluded[column] for column in updated},
+        )
+    raise EmployeeImportError(f"Upsert is not supported on {dialect}")
+
+
+def import_employees(
+    session: Session,
+    lines: Iterable[str],
+    *,
+    fmt: str = "csv",
+    mode: str = "insert",
+    chunk_size: int = 1000,
+    max_errors: int = 100,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Import employees from ``lines`` and return what happened.
+
+    Invalid rows are skipped and counted, and the first ``max_errors`` of
+    them are described in the report. ``progress`` is called after every
+    committed chunk.
+    """
+
+    if fmt not in FORMATS:
+        raise EmployeeImportError(f"Unsupported format {fmt!r}; expected one of {FORMATS}")
+    if mode not in MODES:
+        raise EmployeeImportError(f"Unsupported mode {mode!r}; expected one of {MODES}")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise EmployeeImportError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+    statement = _write_statement(session.get_bind().dialect.name, mode)
+    records = _csv_records(lines) if fmt == "csv" else _ndjson_records(lines)
+
+    report = ImportReport()
+    started = time.perf_counter()
+    try:
+        while chunk := list(islice(records, chunk_size)):
+            report.rows += len(chunk)
+            rows, errors = _validate(chunk)
+            report.rejected += len(errors)
+            report.errors.extend(errors[:max(0, max_errors - len(report.errors))])
+            if mode == "upsert":
+                # The last occurrence of a repeated emp_no wins, as it would
+                # if the rows had been written one at a time.
+                rows = list({row["emp_no"]: row for row in rows}.values())
+            if rows:
+                try:
+                    session.execute(statement, rows)
+                    session.commit()
+                except DBAPIError as exc:
+                    session.rollback()
+                    report.error = (
+                        f"Lines {chunk[0][0]}-{chunk[-1][0]} were not imported: {exc.orig}"
+                    )
+                    break
+                report.written += len(rows)
+                page_cache.list_pages.bump()
+                if mode == "insert":
+                    aggregates.headcounts.add((row["gender"], row["hire_date"]) for row in rows)
+                else:  # an upsert may have moved an existing employee between buckets
+                    aggregates.headcounts.invalidate()
+            report.chunks += 1
+            report.last_committed_line = chunk[-1][0]
+            if progress is not None:
+                progress(report)
+    finally:
+        report.seconds = round(time.perf_counter() - started, 3)
+        if report.written:
+            counts.count_cache.invalidate()
+    if report.written and snapshot.get_snapshot() is not None:
+        snapshot.reload_snapshot(session)
+        page_cache.list_pages.bump()  # pages rendered from the old snapshot
+    return report
+
+
+def log_progress(report: ImportReport) -> None:
+    """Progress callback that logs every hundredth chunk."""
+
+    if report.chunks % 100 == 0:
+        logger.info(
+            "Import progress: %d rows read, %d written, %d rejected",
+            report.rows, report.written, report.rejected,
+        )
+
+
+def _open_lines(path: str) -> io.TextIOBase:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def _guess_format(path: str) -> str:
+    name = path.removesuffix(".gz")
+    return "ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import employees from CSV or NDJSON")
+    parser.add_argument("path", help="Input file (.csv, .ndjson/.jsonl, optionally .gz) or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension")
+    parser.add_argument("--mode", choices=MODES, default="insert")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--max-errors", type=int, default=100, help="Row errors to report")
+    parser.add_argument("--database-url", help="Default: the API's configured database")
+    parser.add_argument("--quiet", action="store_true", help="No progress output")
+    args = parser.parse_args(argv)
+
+    def show_progress(report: ImportReport) -> None:
+        rate = report.rows / max(time.perf_counter() - started, 1e-9)
+        print(
+            f"\r{report.rows:,} rows read, {report.written:,} written, "
+            f"{report.rejected:,} rejected ({rate:,.0f} rows/s)",
+            end="", file=sys.stderr, flush=True,
+        )
+
+    init_engine(args.database_url)
+    started = time.perf_counter()
+    try:
+        with SessionLocal() as session, _open_lines(args.path) as lines:
+            report = import_employees(
+                session,
+                lines,
+                fmt=args.format or _guess_format(args.path),
+                mode=args.mode,
+                chunk_size=args.chunk_size,
+                max_errors=args.max_errors,
+                progress=None if args.quiet else show_progress,
+            )
+    except (EmployeeImportError, OSError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    finally:
+        dispose_engine()
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(json.dumps(asdict(report), indent=2))
+    return 1 if report.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,20 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, Date
+from sqlalchemy import String, Integer, Date, Index
 from .db import Base
 
 
 class Employee(Base):
     __tablename__ = "employees"
+    # Secondary indexes backing the filter/sort combinations accepted by
+    # ``crud.get_employees``. ``emp_no`` trails every index so that ties are
+    # broken in index order and paging never needs an extra sort step.
+    __table_args__ = (
+        Index("ix_employees_gender", "gender", "emp_no"),
+        Index("ix_employees_hire_date", "hire_date", "emp_no"),
+        Index("ix_employees_gender_hire_date", "gender", "hire_date", "emp_no"),
+        Index("ix_employees_last_name", "last_name", "emp_no"),
+        Index("ix_employees_gender_last_name", "gender", "last_name", "emp_no"),
+    )
 
     emp_no: Mapped[int] = mapped_column(Integer, primary_key=True)
     birth_date: Mapped[Date] = mapped_column(Date, nullable=False)
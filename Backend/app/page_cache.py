@@ -0,0 +1,110 @@
+"""Rendered employee list pages, keyed by a table version.
+
+:attr:`PageCache.version` is a counter that every write path in
+:mod:`app.crud` and :mod:`app.importer` bumps after it commits. Rendered
+pages are cached under the version they were read at, so a write makes
+every older page unreachable at once. Writes made by other processes do not
+bump this counter, so pages also expire after ``max_age`` seconds, the
+same lifetime the responses advertise to downstream caches.
+
+Each page carries a digest of its bytes for the ``ETag``. The digest comes
+from the content, not the version, so every worker gives the same page the
+same tag.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Hashable, Optional
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: bytes
+    digest: str
+    expires_at: float
+
+
+class PageCache:
+    """Bounded LRU of rendered pages that is emptied whenever the table version moves."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        max_age: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._lock = Lock()
+        self._max_entries = max_entries
+        self.max_age = max_age
+        self._clock = clock
+        self._version = 0
+        self._pages: OrderedDict[Hashable, CachedPage] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> int:
+        """Record a committed write; returns the new version."""
+
+        with self._lock:
+            self._version += 1
+            self._pages.clear()
+            return self._version
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        now = self._clock()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None and page.expires_at <= now:
+                del self._pages[key]
+                page = None
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: Hashable, version: int, body: bytes) -> CachedPage:
+        """Wrap ``body``, rendered from data read at ``version``, and cache it if still current."""
+
+        page = CachedPage(
+            body=body,
+            digest=hashlib.blake2b(body, digest_size=8).hexdigest(),
+            expires_at=self._clock() + self.max_age,
+        )
+        with self._lock:
+            # A write that landed while rendering makes the page stale already.
+            if version == self._version and self.max_age > 0 and self._max_entries > 0:
+                self._pages[key] = page
+                self._pages.move_to_end(key)
+                while len(self._pages) > self._max_entries:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._version,
+                "entries": len(self._pages),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+list_pages = PageCache(
+    max_entries=settings.PAGE_CACHE_MAX_ENTRIES,
+    max_age=settings.PAGE_CACHE_MAX_AGE,
+)
+"""Module-level singleton shared by the employee listing and write paths."""
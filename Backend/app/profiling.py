@@ -0,0 +1,190 @@
+"""Low-overhead diagnostics for a running worker.
+
+:class:`StackSampler` periodically snapshots the Python stack of every
+thread and aggregates them into collapsed stacks ("frame;frame;frame
+count" lines). Those can be fed directly to ``flamegraph.pl``, speedscope
+or similar tools. Nothing is instrumented, so the overhead stays
+proportional to the sampling rate.
+
+:class:`LoopLagMonitor` notices when the event loop stops turning. A
+heartbeat task measures how late its wake-ups are, and a watchdog thread
+logs the stack the loop thread is stuck in while the stall is still
+happening. The log names the blocking callback, not just the delay.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_BACKEND_DIR = str(Path(__file__).resolve().parents[1]) + os.sep
+
+# Leaf frames of threads that are parked rather than doing work.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "Condition.wait"),
+    ("selectors.py", "select"),
+    ("selectors.py", "EpollSelector.select"),
+    ("selectors.py", "KqueueSelector.select"),
+    ("queue.py", "get"),
+    ("queue.py", "Queue.get"),
+}
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = filename[len(_BACKEND_DIR):]
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{name} ({filename})"
+
+
+def _stack(frame: Optional[FrameType]) -> list[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return (os.path.basename(code.co_filename), name) in _IDLE_LEAVES
+
+
+class StackSampler:
+    """Sample every thread's stack at ``interval`` seconds into collapsed stacks."""
+
+    def __init__(self, *, interval: float = 0.005, include_idle: bool = False) -> None:
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples = 0
+        self.stacks: Counter[str] = Counter()
+
+    def sample_once(self, skip_thread: Optional[int] = None) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip_thread:
+                continue
+            if not self.include_idle and _is_idle(frame):
+                continue
+            thread_name = names.get(thread_id, "thread")
+            self.stacks[";".join([thread_name, *_stack(frame)])] += 1
+        self.samples += 1
+
+    def run(self, duration: float) -> "StackSampler":
+        """Sample the calling process for ``duration`` seconds (blocking)."""
+
+        me = threading.get_ident()
+        deadline = time.monotonic() + duration
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            self.sample_once(skip_thread=me)
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.monotonic()  # fell behind; don't burst to catch up
+        return self
+
+    def collapsed(self) -> str:
+        """Return the samples in collapsed-stack format, heaviest first."""
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class LoopLagMonitor:
+    """Measure event loop lag and log what blocks the loop for over ``threshold`` seconds."""
+
+    def __init__(self, *, threshold: float = 0.2, interval: float = 0.1) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start monitoring the running event loop."""
+
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-lag-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - self._beat - self.interval
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > self.threshold:
+                self.stalls += 1
+                logger.warning("Event loop lagged %.0f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled <= self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # one stack per stall
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            logger.warning(
+                "Event loop blocked for over %.0f ms in:\n  %s",
+                stalled * 1000,
+                "\n  ".join(_stack(frame)[-15:]),
+            )
+
+
+sampling_lock = threading.Lock()
+"""Held while a profile is being taken, so only one runs per worker."""
+
+loop_monitor = LoopLagMonitor(
+    threshold=settings.LOOP_LAG_THRESHOLD, interval=settings.LOOP_LAG_INTERVAL
+)
+"""Started by the application lifespan when ``LOOP_LAG_THRESHOLD`` is positive."""
@@ -0,0 +1,275 @@
+"""Per-client rate limiting and per-worker database admission control."""
+
+from __future__ import annotations
+
+import json
+import math
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Optional, Protocol
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket refilled at ``rate`` tokens per second up to ``burst``."""
+
+    rate: float
+    burst: int
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """A rate limit applied to every request whose path starts with ``prefix``."""
+
+    prefix: str
+    limit: RateLimit
+
+
+BucketState = tuple[float, float]  # (tokens, last refill timestamp)
+
+
+def take_token(
+    state: Optional[BucketState], limit: RateLimit, now: float
+) -> tuple[BucketState, float]:
+    """Refill ``state`` up to ``now`` and try to take one token.
+
+    Returns the new state and ``0.0`` when the token was granted, otherwise
+    the number of seconds until one becomes available.
+    """
+
+    if state is None:
+        tokens, updated = float(limit.burst), now
+    else:
+        tokens, updated = state
+        tokens = min(float(limit.burst), tokens + (now - updated) * limit.rate)
+    if tokens >= 1.0:
+        return (tokens - 1.0, now), 0.0
+    wait = (1.0 - tokens) / limit.rate if limit.rate > 0 else math.inf
+    return (tokens, now), wait
+
+
+class BucketStore(Protocol):
+    """Storage backend for token buckets."""
+
+    def consume(self, key: str, limit: RateLimit, now: float) -> float:
+        """Take a token from ``key``; return 0 or the seconds to wait."""
+
+    def reset(self) -> None:
+        """Forget every bucket."""
+
+
+class InMemoryBucketStore:
+    """Process-local buckets, evicting the least recently used beyond ``max_keys``.
+
+    An evicted bucket is recreated full, which is what an idle bucket would
+    have refilled to anyway.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self._lock = Lock()
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[str, BucketState] = OrderedDict()
+
+    def consume(self, key: str, limit: RateLimit, now: float) -> float:
+        with self._lock:
+            state, wait = take_token(self._buckets.get(key), limit, now)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SessionRegistryBucketStore:
+    """Keep buckets in the session registry's shared state store.
+
+    Limiter state then lives, and is replaced, together with the registry
+    that tracks the same users' sessions. With ``SqliteSessionRegistry``
+    every worker on the host draws from the same buckets; their timestamps
+    come from ``time.monotonic``, which all processes on a host share.
+    """
+
+    namespace = "rate_limit"
+
+    def __init__(self, registry_getter: Callable[[], object]) -> None:
+        self._registry_getter = registry_getter
+
+    def consume(self, key: str, limit: RateLimit, now: float) -> float:
+        registry = self._registry_getter()
+        return registry.update_shared(
+            f"{self.namespace}:{key}", lambda state: take_token(state, limit, now)
+        )
+
+    def reset(self) -> None:
+        self._registry_getter().clear_shared(f"{self.namespace}:")
+
+
+def parse_rules(spec: str) -> list[RateLimitRule]:
+    """Parse ``"/prefix=rate:burst,..."`` into rules, longest prefix first."""
+
+    rules = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, values = item.partition("=")
+        rate, _, burst = values.partition(":")
+        rules.append(
+            RateLimitRule(prefix=prefix.strip(), limit=RateLimit(float(rate), int(burst)))
+        )
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+def retry_after(wait: float) -> str:
+    """Format ``wait`` seconds as a ``Retry-After`` header value."""
+
+    return str(max(1, math.ceil(min(wait, 3600))))
+
+
+class RateLimiter:
+    """Apply per-route token buckets keyed by client IP and authenticated user."""
+
+    def __init__(
+        self,
+        rules: list[RateLimitRule],
+        store: BucketStore,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rules = rules
+        self.store = store
+        self._clock = clock
+
+    def rule_for(self, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return None
+
+    def check(self, path: str, client_ip: Optional[str]) -> float:
+        """Charge the client IP; return ``0`` or the seconds to retry after."""
+
+        return self._consume(path, f"ip:{client_ip}" if client_ip else None)
+
+    def check_user(self, path: str, username: str) -> float:
+        """Charge an authenticated user; return ``0`` or the seconds to retry after.
+
+        Only called once the password has been verified, so a client cannot
+        drain someone else's bucket by sending their username.
+        """
+
+        return self._consume(path, f"user:{username}")
+
+    def _consume(self, path: str, key: Optional[str]) -> float:
+        rule = self.rule_for(path)
+        if rule is None or key is None:
+            return 0.0
+        return self.store.consume(f"{rule.prefix}|{key}", rule.limit, self._clock())
+
+    def reset(self) -> None:
+        self.store.reset()
+
+
+@dataclass
+class _UserCharge:
+    limiter: RateLimiter
+    path: str
+    charged: bool = False
+
+
+_user_charge: ContextVar[Optional[_UserCharge]] = ContextVar("rate_limit_user_charge", default=None)
+
+
+def charge_authenticated_user(username: str) -> float:
+    """Charge ``username``'s bucket for the current request, at most once.
+
+    Called by authentication after the password checks out. Returns ``0``,
+    or the seconds to retry after when the user is over their limit.
+    """
+
+    charge = _user_charge.get()
+    if charge is None or charge.charged:
+        return 0.0
+    charge.charged = True
+    return charge.limiter.check_user(charge.path, username)
+
+
+class RateLimitMiddleware:
+    """Shed requests over their per-IP limit with ``429`` before any auth work.
+
+    The per-user limit is applied by authentication, through
+    ``charge_authenticated_user``, once the caller's identity is verified.
+    """
+
+    def __init__(self, app: ASGIApp, *, limiter: RateLimiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        wait = self.limiter.check(scope["path"], client[0] if client else None)
+        if wait <= 0:
+            token = _user_charge.set(_UserCharge(self.limiter, scope["path"]))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _user_charge.reset(token)
+            return
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii")),
+                    (b"retry-after", retry_after(wait).encode("ascii")),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionController:
+    """Cap the number of requests holding a database session in this worker."""
+
+    def __init__(self, max_inflight: int, wait_timeout: float) -> None:
+        self.max_inflight = max_inflight
+        self.wait_timeout = wait_timeout
+        self._semaphore = BoundedSemaphore(max_inflight)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        wait = self.wait_timeout if timeout is None else timeout
+        return self._semaphore.acquire(timeout=max(0.0, wait))
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+def _build_store() -> BucketStore:
+    if settings.RATE_LIMIT_STORE == "registry":
+        from . import session_manager
+
+        return SessionRegistryBucketStore(lambda: session_manager.session_registry)
+    return InMemoryBucketStore()
+
+
+rate_limiter = RateLimiter(parse_rules(settings.RATE_LIMIT_RULES), _build_store())
+"""Module-level limiter installed by ``main.py``."""
+
+db_admission = AdmissionController(settings.DB_MAX_INFLIGHT, settings.DB_ADMISSION_TIMEOUT)
+"""Bounds concurrent database work per worker; used by ``deps.get_db``."""
@@ -1,5 +1,5 @@
 """Router package exports."""
 
-from . import employees, sessions  # noqa: F401
+from . import admin, batch, employees, health, sessions  # noqa: F401
 
-__all__ = ["employees", "sessions"]
+__all__ = ["admin", "batch", "employees", "health", "sessions"]
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from ..auth import Principal
+from ..config import settings
+from ..db import get_engine, statement_cache_stats
+from ..deps import require_admin
+from .. import page_cache, sharding
+from ..profiling import StackSampler, sampling_lock
+from ..snapshot import get_snapshot
+
+router = APIRouter()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    idle: bool = Query(False, description="Include threads that are only waiting"),
+    _principal: Principal = Depends(require_admin),
+):
+    """Sample this worker's stacks for ``seconds`` and return collapsed stacks.
+
+    The output feeds straight into ``flamegraph.pl`` or speedscope. Only the
+    worker that handles the request is profiled.
+    """
+
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILER_MAX_SECONDS:g}",
+        )
+    if not sampling_lock.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being taken in this worker",
+        )
+    try:
+        sampler = StackSampler(interval=interval_ms / 1000, include_idle=idle)
+        await run_in_threadpool(sampler.run, seconds)
+    finally:
+        sampling_lock.release()
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={
+            "X-Profile-Samples": str(sampler.samples),
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+        },
+    )
+
+
+@router.get("/statement-cache")
+async def statement_cache(_principal: Principal = Depends(require_admin)):
+    """Report SQLAlchemy compiled-cache hits and misses for this worker."""
+
+    shards = sharding.get_shards()
+    # Each shard engine has its own cache of the same statements; report one.
+    return statement_cache_stats.snapshot(get_engine() if shards is None else shards.engines[0])
+
+
+@router.get("/page-cache")
+async def page_cache_stats(_principal: Principal = Depends(require_admin)):
+    """Report the table version and list-page cache hits for this worker."""
+
+    return page_cache.list_pages.stats()
+
+
+@router.get("/snapshot")
+async def snapshot_stats(_principal: Principal = Depends(require_admin)):
+    """Report size and age of this worker's in-memory employee snapshot."""
+
+    employee_snapshot = get_snapshot()
+    if employee_snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Employee snapshot is disabled (set SNAPSHOT_ENABLED=1)",
+        )
+    return employee_snapshot.stats()
@@ -0,0 +1,145 @@
+"""Run several employee operations in one request.
+
+``POST /batch`` takes an ordered list of operations. They all run on one
+database session in one worker thread, so the caller is authenticated once,
+its session is checked once and one connection is used. The operations use
+the same session class as the single-item routes, so read-only users get
+``403`` for updates here too.
+
+Each operation gets its own status and body, as the matching route would
+return them. Normally each update commits on its own, and a failed
+operation does not stop the ones after it. With ``"atomic": true`` the
+updates share one transaction. It commits only if every operation
+succeeds. Otherwise it is rolled back and later operations are answered
+with ``424`` without running. Reads in an atomic batch see the batch's own
+earlier updates.
+"""
+
+from typing import Any, Callable
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from .. import crud, sharding
+from ..auth import Principal
+from ..deps import get_db, require_active_session
+from ..schemas import (
+    BatchGetEmployee,
+    BatchListEmployees,
+    BatchRequest,
+    BatchResponse,
+    BatchResult,
+    BatchUpdateLastName,
+)
+from .employees import _employee_out, _parse_fields, _project, update_last_name
+
+router = APIRouter()
+
+
+def _get_employee(db: Session, operation: BatchGetEmployee, commit: bool) -> Any:
+    selected = _parse_fields(operation.fields)
+    if selected is None:
+        employee = crud.get_employee(db, operation.emp_no)
+        result = None if employee is None else _employee_out(employee).model_dump()
+    else:
+        row = crud.get_employee_columns(db, operation.emp_no, crud.field_columns(selected))
+        result = None if row is None else _project(row, selected)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Employee {operation.emp_no} not found",
+        )
+    return result
+
+
+def _list_employees(db: Session, operation: BatchListEmployees, commit: bool) -> Any:
+    selected = _parse_fields(operation.fields)
+    filters = crud.EmployeeFilters(
+        gender=operation.gender,
+        hire_date_from=operation.hire_date_from,
+        hire_date_to=operation.hire_date_to,
+        last_name_prefix=operation.last_name_prefix,
+    )
+    try:
+        crud.plan_employee_query(filters, operation.sort)
+    except crud.UnsupportedQueryError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    rows = crud.get_employees(
+        db,
+        limit=operation.limit,
+        offset=operation.offset,
+        filters=filters,
+        sort=operation.sort,
+        columns=crud.LIST_COLUMNS if selected is None else crud.field_columns(selected),
+    )
+    if selected is None:
+        return [
+            {"emp_no": r.emp_no, "first_name": r.first_name, "last_name": r.last_name}
+            for r in rows
+        ]
+    return [_project(row, selected) for row in rows]
+
+
+def _update_last_name(db: Session, operation: BatchUpdateLastName, commit: bool) -> Any:
+    return update_last_name(
+        db, operation.emp_no, operation.last_name, operation.if_match, commit=commit
+    ).model_dump()
+
+
+_OPERATIONS: dict[str, Callable[[Session, Any, bool], Any]] = {
+    "get_employee": _get_employee,
+    "list_employees": _list_employees,
+    "update_last_name": _update_last_name,
+}
+
+
+def run_batch(db: Session, batch: BatchRequest) -> BatchResponse:
+    results: list[BatchResult] = []
+    failed = False
+    wrote = False
+    try:
+        for operation in batch.operations:
+            if failed:
+                results.append(
+                    BatchResult(
+                        status=status.HTTP_424_FAILED_DEPENDENCY,
+                        body={"detail": "Not run: an earlier operation in the atomic batch failed"},
+                    )
+                )
+                continue
+            try:
+                body = _OPERATIONS[operation.op](db, operation, not batch.atomic)
+            except HTTPException as exc:
+                results.append(BatchResult(status=exc.status_code, body={"detail": exc.detail}))
+                if batch.atomic:
+                    crud.rollback_changes(db)
+                    failed = True
+                continue
+            results.append(BatchResult(status=status.HTTP_200_OK, body=body))
+            wrote = wrote or operation.op == "update_last_name"
+        if batch.atomic and wrote and not failed:
+            crud.commit_changes(db)
+    finally:
+        if db.info.get(crud.PENDING_AUDIT_KEY):  # interrupted, e.g. by the deadline
+            crud.rollback_changes(db)
+    return BatchResponse(committed=not failed, results=results)
+
+
+@router.post("", response_model=BatchResponse)  # /batch
+async def batch(
+    payload: BatchRequest,
+    db: Session = Depends(get_db),
+    _principal: Principal = Depends(require_active_session),
+):
+    """Run up to ``MAX_BATCH_OPERATIONS`` employee operations in order.
+
+    ``committed`` is ``false`` only when an atomic batch was rolled back.
+    """
+
+    if sharding.get_shards() is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batches are not available with SHARDS",
+        )
+    return await run_in_threadpool(run_batch, db, payload)
@@ -1,59 +1,476 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import json
+from dataclasses import asdict
+from datetime import date
+from functools import partial
+from typing import AsyncIterator, Literal, Optional
+
+import anyio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 
-from ..auth import Principal, get_current_user
-from ..deps import get_db, require_active_session
-from .. import crud
+from ..auth import Principal, get_current_principal
+from ..deps import (
+    SessionOpener,
+    get_db,
+    get_employee_db,
+    get_session_opener,
+    require_active_session,
+    require_admin,
+)
+from .. import aggregates, audit, crud, events, importer, page_cache, sharding, snapshot
+from ..config import settings
 from ..schemas import (
+    AuditRecordOut,
     EmployeeLastNameUpdate,
+    EmployeeListItem,
     EmployeeOut,
+    EmployeeStatsOut,
+    ImportReportOut,
+    employee_fields_adapter,
 )
+from ..singleflight import employee_reads
 
 
 router = APIRouter()
 
+MAX_WATCHED_EMPLOYEES = 100
+
+_EMPLOYEE_LIST_ADAPTER = TypeAdapter(list[EmployeeListItem])
+
+FIELDS_DESCRIPTION = (
+    "Comma-separated fields to return instead of the defaults: "
+    + ", ".join(crud.EMPLOYEE_FIELDS)
+)
+
 
-@router.get("", response_model=list[EmployeeOut])  # /employees
-@router.get("/", response_model=list[EmployeeOut])  # /employees/
+@router.get("", response_model=list[EmployeeListItem])  # /employees
+@router.get("/", response_model=list[EmployeeListItem])  # /employees/
 async def list_employees(
+    request: Request,
+    response: Response,
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    gender: Optional[str] = Query(None, pattern="^[MF]$"),
+    hire_date_from: Optional[date] = Query(None),
+    hire_date_to: Optional[date] = Query(None),
+    last_name_prefix: Optional[str] = Query(None, min_length=1, max_length=16),
+    sort: str = Query("emp_no", description="emp_no, hire_date or last_name; prefix '-' for descending"),
+    include_total: bool = Query(False, description="Add an X-Total-Count header"),
+    total_mode: Literal["estimate", "exact"] = Query("estimate"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    open_session: SessionOpener = Depends(get_session_opener),
+    principal: Principal = Depends(get_current_principal),
+):
+    selected = _parse_fields(fields)
+    columns = crud.LIST_COLUMNS if selected is None else crud.field_columns(selected)
+    filters = crud.EmployeeFilters(
+        gender=gender,
+        hire_date_from=hire_date_from,
+        hire_date_to=hire_date_to,
+        last_name_prefix=last_name_prefix,
+    )
+    shards = sharding.get_shards()
+    try:
+        crud.plan_employee_query(filters, sort)
+        if shards is not None:
+            shards.check_offset(offset)
+    except crud.UnsupportedQueryError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+
+    # The access level is part of the keys so results never cross
+    # authorization scopes.
+    key = ("list", principal.access, limit, offset, filters, sort, columns)
+    pages = page_cache.list_pages
+    version = pages.version  # read first: a write after this keeps the page out
+    page = pages.get((key, selected))
+    if page is None:
+        # Versioned flight: requests after a write never join a query that
+        # started before it.
+        body = await _render_page(
+            open_session, (*key, version), limit=limit, offset=offset, filters=filters, sort=sort,
+            columns=columns, selected=selected,
+        )
+        page = pages.put((key, selected), version, body)
+    etag = page.digest
+    if include_total:
+        get_total = (
+            partial(_in_session, open_session, crud.get_total_count)
+            if shards is None else shards.get_total_count
+        )
+        total = await run_in_threadpool(get_total, filters, exact=total_mode == "exact")
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total.value)
+            response.headers["X-Total-Count-Exact"] = "true" if total.exact else "false"
+            etag = f"{etag}-{total.value}{'e' if total.exact else ''}"
+    # Weak: compression changes the bytes but not the meaning. Public lets
+    # shared caches (a CDN or reverse proxy) store this authenticated
+    # response; Vary: Authorization keeps one copy per credential there.
+    response.headers["ETag"] = f'W/"{etag}"'
+    response.headers["Vary"] = "Authorization"
+    response.headers["Cache-Control"] = (
+        f"public, s-maxage={pages.max_age:g}, max-age={pages.max_age:g}"
+        if pages.max_age > 0 else "no-cache"
+    )
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return Response(page.body, media_type="application/json", headers=dict(response.headers))
+
+
+async def _render_page(
+    open_session: SessionOpener,
+    key: tuple,
+    *,
+    limit: int,
+    offset: int,
+    filters: crud.EmployeeFilters,
+    sort: str,
+    columns: tuple[str, ...],
+    selected: Optional[tuple[str, ...]],
+) -> bytes:
+    employee_snapshot = snapshot.get_snapshot()
+    shards = sharding.get_shards()
+    if employee_snapshot is not None:
+        # Served from memory in microseconds; no thread hop or query needed.
+        rows = employee_snapshot.page(limit=limit, offset=offset, filters=filters, sort=sort)
+    else:
+        # Identical concurrent page requests share one query.
+        load_page = (
+            partial(_in_session, open_session, crud.get_employees)
+            if shards is None else shards.get_employees
+        )
+        rows = await employee_reads.do(
+            key,
+            lambda: run_in_threadpool(
+                load_page, limit=limit, offset=offset, filters=filters, sort=sort, columns=columns,
+            ),
+        )
+    if selected is None:
+        return _EMPLOYEE_LIST_ADAPTER.dump_json(
+            _EMPLOYEE_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+        )
+    return employee_fields_adapter(selected).dump_json([_project(row, selected) for row in rows])
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of ``If-None-Match`` against ``etag`` (an unquoted tag)."""
+
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    if fields is None:
+        return None
+    try:
+        return crud.parse_fields(fields)
+    except crud.UnknownFieldError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+
+
+def _project(row, fields: tuple[str, ...]) -> dict:
+    return {
+        name: crud.employee_version(row) if name == "version" else getattr(row, name)
+        for name in fields
+    }
+
+
+def _fields_response(content, fields: tuple[str, ...], response: Response) -> Response:
+    # Serialized with a schema of just these fields instead of the route's
+    # response_model, so the cost follows the request.
+    adapter = employee_fields_adapter(fields, many=isinstance(content, list))
+    return Response(
+        adapter.dump_json(content), media_type="application/json", headers=dict(response.headers)
+    )
+
+
+def _employee_out(employee) -> EmployeeOut:
+    out = EmployeeOut.model_validate(employee)
+    out.version = crud.employee_version(employee)
+    return out
+
+
+def _in_session(open_session: SessionOpener, call, *args, emp_no: Optional[int] = None, **kwargs):
+    """Run ``call(session, ...)`` in a session of its own (see :func:`get_session_opener`)."""
+
+    with open_session(emp_no) as session:
+        return call(session, *args, **kwargs)
+
+
+def _load_employee(db: Session, emp_no: int) -> Optional[EmployeeOut]:
+    employee = crud.get_employee(db, emp_no)
+    return None if employee is None else _employee_out(employee)
+
+
+def _parse_if_match(value: Optional[str]) -> Optional[str]:
+    if value is None or value.strip() == "*":
+        return None
+    return value.strip().removeprefix("W/").strip('"')
+
+
+@router.get("/changes", response_class=StreamingResponse)
+async def stream_employee_changes(
+    emp_no: Optional[list[int]] = Query(None, description="Employees to watch; omit for all"),
+    since: Optional[str] = Query(None, max_length=64, description="Resume after this event id"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    _principal: Principal = Depends(require_active_session),
+):
+    """Stream committed employee changes as server-sent events.
+
+    Each ``change`` event carries an ``<epoch>-<seq>`` id, so a reconnecting
+    client (``Last-Event-ID`` or ``since``) is replayed what it missed. A
+    ``reset`` event means those changes are not available here, because they
+    are no longer retained or the id came from another worker or process, and
+    the client should reload its data.
+    """
+
+    if emp_no is not None and len(emp_no) > MAX_WATCHED_EMPLOYEES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_WATCHED_EMPLOYEES} employees can be watched per stream",
+        )
+    after = last_event_id if last_event_id is not None else since
+    try:
+        subscription = events.change_hub.subscribe(
+            frozenset(emp_no) if emp_no else None, after=after
+        )
+    except events.SubscriberLimitError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+            headers={"Retry-After": "5"},
+        ) from exc
+    return StreamingResponse(
+        _change_stream(subscription, settings.EVENTS_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _change_stream(
+    subscription: events.Subscription, heartbeat: float
+) -> AsyncIterator[str]:
+    try:
+        yield "retry: 2000\n\n"
+        if subscription.missed:
+            data = json.dumps({"id": subscription.start_id, "seq": subscription.start_seq})
+            yield f"id: {subscription.start_id}\nevent: reset\ndata: {data}\n\n"
+        async for change in subscription.events(heartbeat):
+            if change is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield format_change_event(change)
+    finally:
+        events.change_hub.unsubscribe(subscription)
+
+
+def format_change_event(change: events.ChangeEvent) -> str:
+    """Render ``change`` as one server-sent event."""
+
+    data = json.dumps(asdict(change), separators=(",", ":"))
+    return f"id: {change.id}\nevent: change\ndata: {data}\n\n"
+
+
+@router.post("/import", response_model=ImportReportOut)
+async def import_employees(
+    request: Request,
+    fmt: Optional[Literal["csv", "ndjson"]] = Query(
+        None, alias="format", description="Defaults from the Content-Type header"
+    ),
+    mode: Literal["insert", "upsert"] = Query("insert"),
+    chunk_size: int = Query(1000, ge=1, le=importer.MAX_CHUNK_SIZE),
     db: Session = Depends(get_db),
-    _: str = Depends(get_current_user),
+    _principal: Principal = Depends(require_admin),
+):
+    """Stream a CSV or NDJSON body of employees into the database.
+
+    The body is never held in memory as a whole. Invalid rows are skipped and
+    reported. If a chunk fails to write, the response is ``409`` with the
+    report of what was committed.
+    """
+
+    if sharding.get_shards() is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Bulk import is not available with SHARDS; run "
+            "'python -m app.importer --database-url <shard url>' per shard",
+        )
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    try:
+        report = await run_in_threadpool(
+            importer.import_employees,
+            db,
+            importer.iter_lines(_pull_from_worker_thread(request.stream())),
+            fmt=fmt,
+            mode=mode,
+            chunk_size=chunk_size,
+            progress=importer.log_progress,
+        )
+    except importer.EmployeeImportError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    out = ImportReportOut.model_validate(report)
+    if report.error is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=out.model_dump())
+    return out
+
+
+def _pull_from_worker_thread(stream: AsyncIterator[bytes]):
+    """Iterate ``stream`` from a threadpool thread by hopping back to the event loop."""
+
+    async def next_chunk() -> Optional[bytes]:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while (chunk := anyio.from_thread.run(next_chunk)) is not None:
+        yield chunk
+
+
+@router.get("/stats", response_model=EmployeeStatsOut)
+async def employee_stats(
+    max_staleness: float = Query(
+        settings.STATS_MAX_STALENESS,
+        ge=0,
+        description="Seconds of known-missing writes to accept before recomputing",
+    ),
+    refresh: bool = Query(False, description="Recompute from the table first"),
+    open_session: SessionOpener = Depends(get_session_opener),
+    _principal: Principal = Depends(get_current_principal),
 ):
-    rows = crud.get_employees(db, limit=limit, offset=offset)
-    return [
-        {"emp_no": r.emp_no, "first_name": r.first_name, "last_name": r.last_name}
-        for r in rows
-    ]
+    """Headcount by gender and hire year, served from a materialized aggregate."""
+
+    headcounts = aggregates.headcounts
+    if refresh or headcounts.needs_build(max_staleness):
+        shards = sharding.get_shards()
+        load = (
+            partial(_in_session, open_session, crud.count_by_gender_and_hire_year)
+            if shards is None else shards.count_by_gender_and_hire_year
+        )
+        # Concurrent recomputes share one GROUP BY.
+        await employee_reads.do(
+            ("stats", refresh), lambda: run_in_threadpool(headcounts.build, load)
+        )
+    return headcounts.stats()
 
 
 @router.get("/{emp_no}", response_model=EmployeeOut)
 async def get_employee(
     emp_no: int,
-    db: Session = Depends(get_db),
-    _principal: Principal = Depends(require_active_session),
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    open_session: SessionOpener = Depends(get_session_opener),
+    principal: Principal = Depends(require_active_session),
 ):
-    employee = crud.get_employee(db, emp_no)
+    selected = _parse_fields(fields)
+    employee_snapshot = snapshot.get_snapshot()
+    # Bumped after every local commit, so a read that starts after a write
+    # never joins a flight that started before it and returns the old row.
+    version = page_cache.list_pages.version
+    if selected is not None:
+        columns = crud.field_columns(selected)
+        if employee_snapshot is not None:
+            row = employee_snapshot.get(emp_no)
+        else:
+            row = await employee_reads.do(
+                ("get", principal.access, emp_no, columns, version),
+                lambda: run_in_threadpool(
+                    _in_session, open_session, crud.get_employee_columns, emp_no, columns,
+                    emp_no=emp_no,
+                ),
+            )
+        employee = None if row is None else _project(row, selected)
+    elif employee_snapshot is not None:
+        row = employee_snapshot.get(emp_no)
+        employee = None if row is None else _employee_out(row)
+    else:
+        employee = await employee_reads.do(
+            ("get", principal.access, emp_no, version),
+            lambda: run_in_threadpool(
+                _in_session, open_session, _load_employee, emp_no, emp_no=emp_no
+            ),
+        )
     if employee is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee {emp_no} not found",
         )
-    return EmployeeOut.model_validate(employee)
+    if selected is None:
+        response.headers["ETag"] = f'"{employee.version}"'
+        return employee
+    if "version" in selected:
+        response.headers["ETag"] = f'"{employee["version"]}"'
+    return _fields_response(employee, selected, response)
 
 
 @router.put("/{emp_no}/last-name", response_model=EmployeeOut)
 async def update_employee_last_name(
     emp_no: int,
     payload: EmployeeLastNameUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(
+        None, description="Version (ETag) the update is based on; 409 if it is stale"
+    ),
+    db: Session = Depends(get_employee_db),
     _principal: Principal = Depends(require_active_session),
 ):
-    employee = crud.update_employee_last_name(db, emp_no, payload.last_name)
+    out = update_last_name(db, emp_no, payload.last_name, if_match)
+    response.headers["ETag"] = f'"{out.version}"'
+    return out
+
+
+def update_last_name(
+    db: Session, emp_no: int, last_name: str, if_match: Optional[str], *, commit: bool = True
+) -> EmployeeOut:
+    """Run :func:`crud.update_employee_last_name`, mapping its failures to HTTP errors."""
+
+    try:
+        employee = crud.update_employee_last_name(
+            db, emp_no, last_name, expected_version=_parse_if_match(if_match), commit=commit
+        )
+    except crud.VersionConflictError as exc:
+        version = crud.employee_version(exc.current)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": f"Employee {emp_no} was changed by someone else; reload and retry",
+                "current": _employee_out(exc.current).model_dump(),
+            },
+            headers={"ETag": f'"{version}"'},
+        ) from exc
+    except audit.AuditBackpressureError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Audit log is backlogged, please retry shortly",
+            headers={"Retry-After": "1"},
+        ) from exc
     if employee is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Employee {emp_no} not found",
         )
-    return EmployeeOut.model_validate(employee)
+    return _employee_out(employee)
+
+
+@router.get("/{emp_no}/history", response_model=list[AuditRecordOut])
+async def get_employee_history(
+    emp_no: int,
+    limit: int = Query(50, ge=1, le=500),
+    _principal: Principal = Depends(require_active_session),
+):
+    audit_log = audit.get_audit_log()
+    if audit_log is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Audit log is disabled",
+        )
+    return await run_in_threadpool(audit_log.history, emp_no, limit)
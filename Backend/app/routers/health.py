@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Response, status
+
+from .. import sharding
+from ..circuit import CLOSED
+from ..db import db_breaker, pool_status
+
+router = APIRouter()
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """Readiness for load balancers, from in-process state only.
+
+    Ready means the engine has started and the database circuit breaker is
+    closed; with ``SHARDS``, that every shard's breaker is closed. Probes
+    never run a query, so frequent health checks add no database load.
+    """
+
+    shards = sharding.get_shards()
+    if shards is None:
+        pool = pool_status()
+        breaker = db_breaker.stats()
+        is_ready = pool is not None and breaker["state"] == CLOSED
+        body = {"breaker": breaker, "pool": pool}
+    else:
+        body = {
+            "shards": {
+                shard.name: {"breaker": breaker.stats(), "pool": pool_status(engine)}
+                for shard, engine, breaker in zip(shards.shards, shards.engines, shards.breakers)
+            }
+        }
+        is_ready = all(item["breaker"]["state"] == CLOSED for item in body["shards"].values())
+    if not is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if is_ready else "unavailable", **body}
@@ -1,7 +1,14 @@
-from pydantic import BaseModel, Field
+from datetime import date
+from functools import lru_cache
+from typing import Annotated, Any, Literal, Union
 
+from pydantic import BaseModel, Field, TypeAdapter
+from typing_extensions import TypedDict
+
+
+class EmployeeListItem(BaseModel):
+    """One row of an employee list; no ``version``, which lists do not compute."""
 
-class EmployeeOut(BaseModel):
     emp_no: int
     first_name: str
     last_name: str
@@ -10,10 +17,151 @@ class EmployeeOut(BaseModel):
         from_attributes = True
 
 
+class EmployeeOut(EmployeeListItem):
+    version: str | None = None
+
+
+_EMPLOYEE_FIELD_TYPES = {
+    "emp_no": int,
+    "birth_date": date,
+    "first_name": str,
+    "last_name": str,
+    "gender": str,
+    "hire_date": date,
+    "version": str,
+}
+
+
+@lru_cache(maxsize=None)  # bounded: one per subset of the fields above
+def _employee_fields_schema(fields: tuple[str, ...]) -> type:
+    return TypedDict(
+        "EmployeeFields_" + "_".join(fields),
+        {name: _EMPLOYEE_FIELD_TYPES[name] for name in fields},
+    )
+
+
+@lru_cache(maxsize=None)
+def employee_fields_adapter(fields: tuple[str, ...], many: bool = True) -> TypeAdapter:
+    """Return a cached JSON serializer for employees limited to ``fields``.
+
+    Items are plain dicts, so serializing costs only the fields asked for.
+    """
+
+    schema = _employee_fields_schema(fields)
+    return TypeAdapter(list[schema] if many else schema)
+
+
 class EmployeeLastNameUpdate(BaseModel):
     last_name: str = Field(..., min_length=1, max_length=16)
 
 
+class EmployeeImportRow(BaseModel):
+    emp_no: int = Field(..., gt=0)
+    birth_date: date
+    first_name: str = Field(..., min_length=1, max_length=14)
+    last_name: str = Field(..., min_length=1, max_length=16)
+    gender: Literal["M", "F"]
+    hire_date: date
+
+
+class ImportRowError(BaseModel):
+    line: int
+    message: str
+
+    class Config:
+        from_attributes = True
+
+
+class ImportReportOut(BaseModel):
+    rows: int
+    written: int
+    rejected: int
+    chunks: int
+    last_committed_line: int
+    errors: list[ImportRowError]
+    error: str | None = None
+    seconds: float
+
+    class Config:
+        from_attributes = True
+
+
+class HeadcountBucket(BaseModel):
+    hire_year: int
+    gender: str
+    headcount: int
+
+
+class EmployeeStatsOut(BaseModel):
+    total: int
+    by_gender: dict[str, int]
+    by_hire_year: list[HeadcountBucket]
+    age_seconds: float
+    stale: bool
+
+
+MAX_BATCH_OPERATIONS = 100
+
+
+class BatchGetEmployee(BaseModel):
+    op: Literal["get_employee"]
+    emp_no: int
+    fields: str | None = None
+
+
+class BatchListEmployees(BaseModel):
+    op: Literal["list_employees"]
+    limit: int = Field(10, ge=1, le=100)
+    offset: int = Field(0, ge=0)
+    gender: Literal["M", "F"] | None = None
+    hire_date_from: date | None = None
+    hire_date_to: date | None = None
+    last_name_prefix: str | None = Field(None, min_length=1, max_length=16)
+    sort: str = "emp_no"
+    fields: str | None = None
+
+
+class BatchUpdateLastName(BaseModel):
+    op: Literal["update_last_name"]
+    emp_no: int
+    last_name: str = Field(..., min_length=1, max_length=16)
+    if_match: str | None = None
+
+
+BatchOperation = Annotated[
+    Union[BatchGetEmployee, BatchListEmployees, BatchUpdateLastName],
+    Field(discriminator="op"),
+]
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(..., min_length=1, max_length=MAX_BATCH_OPERATIONS)
+    atomic: bool = False
+
+
+class BatchResult(BaseModel):
+    status: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: list[BatchResult]
+
+
+class AuditRecordOut(BaseModel):
+    seq: int
+    writer: str
+    timestamp: float
+    principal: str | None
+    emp_no: int
+    old: str
+    new: str
+
+    class Config:
+        from_attributes = True
+
+
 class SessionStartResponse(BaseModel):
     username: str
     session_id: str
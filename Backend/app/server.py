@@ -0,0 +1,379 @@
+"""Pre-forking production launcher for the Employees API.
+
+The master process imports the application once, freezes the garbage
+collector so the imported objects stay shared copy-on-write, and then forks
+``workers`` uvicorn servers. The master opens one ``SO_REUSEPORT`` socket per
+worker slot so the kernel balances connections across workers (or a single
+shared socket where the option is unavailable). Each worker keeps only its
+own slot's socket. Sockets stay open in the master, so when a worker exits
+after roughly ``max_requests`` requests its replacement keeps accepting from
+the same queue and no connection is lost. A slot whose replacement is held
+back (see below) has its socket closed meanwhile, so the kernel stops sending
+new connections to a queue nobody accepts from.
+``SIGTERM``/``SIGINT`` stop the master from respawning and ask every worker
+to drain in-flight requests; the app lifespan then disposes of the engine.
+
+Usage (from the ``Backend`` directory)::
+
+    python -m app.server --host 0.0.0.0 --port 8000 --workers 4
+
+A worker that fails within ``MIN_UPTIME`` seconds of starting (a crash, or an
+app that never finished starting up) is respawned after a delay that doubles
+with each quick failure (up to ``MAX_RESPAWN_DELAY``), so a crash at startup
+does not turn into a fork loop. Workers recycled after ``max_requests`` exit
+cleanly and are replaced at once.
+
+Sessions must be visible to every worker, so more than one worker requires
+``SESSION_STORE=sqlite``; the launcher refuses to start otherwise.
+
+Platforms without ``os.fork`` (Windows) fall back to uvicorn's own
+multi-process mode, which imports the app separately in every worker.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger("app.server")
+
+DEFAULT_APP = "main:app"
+
+MIN_UPTIME = 5.0
+"""Workers exiting sooner than this after starting are respawned with a delay."""
+MAX_RESPAWN_DELAY = 30.0
+
+
+def default_workers() -> int:
+    """Return the default worker count: one per available CPU."""
+
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def sessions_are_shared() -> bool:
+    """Return whether a session started on one worker is valid on the others."""
+
+    from .session_manager import session_registry
+
+    return session_registry.shared
+
+
+def respawn_delay(quick_exits: int) -> float:
+    """Seconds to wait before respawning after ``quick_exits`` quick exits in a row."""
+
+    return 0.0 if quick_exits <= 0 else min(MAX_RESPAWN_DELAY, 0.5 * 2 ** (quick_exits - 1))
+
+
+def supports_reuse_port() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def create_listen_socket(
+    host: str, port: int, *, reuse_port: bool, backlog: int = 2048
+) -> socket.socket:
+    """Create a bound, listening, non-blocking TCP socket."""
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Fork, watch and recycle uvicorn worker processes."""
+
+    def __init__(
+        self,
+        app_path: str = DEFAULT_APP,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: Optional[int] = None,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        graceful_timeout: int = 30,
+        reuse_port: Optional[bool] = None,
+        log_level: str = "info",
+    ) -> None:
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.workers = workers or default_workers()
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.reuse_port = supports_reuse_port() if reuse_port is None else reuse_port
+        self.log_level = log_level
+        self._children: dict[int, int] = {}
+        self._started: dict[int, float] = {}  # slot -> monotonic start time
+        self._quick_exits: dict[int, int] = {}
+        self._sockets: list[Optional[socket.socket]] = []
+        self._stopping = False
+
+    # -- master ------------------------------------------------------------
+    def preload(self):
+        """Import the application before forking and freeze the heap."""
+
+        from uvicorn.importer import import_from_string
+
+        app = import_from_string(self.app_path)
+        gc.collect()
+        # Objects that exist now are never touched by the collector again,
+        # so forked workers do not dirty (and copy) those shared pages.
+        gc.freeze()
+        return app
+
+    def run(self) -> int:
+        app = self.preload()
+        socket_count = self.workers if self.reuse_port else 1
+        self._sockets = [None] * socket_count
+        for slot in range(socket_count):
+            self._slot_socket(slot)
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logger.info(
+            "Starting %d worker(s) on %s:%d (reuse_port=%s, max_requests=%s)",
+            self.workers, self.host, self.port, self.reuse_port, self.max_requests or "off",
+        )
+        for slot in range(self.workers):
+            self._spawn(slot, app)
+
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self._children.pop(pid, None)
+            if slot is None:
+                continue
+            if self._stopping:
+                continue
+            failed = status != 0
+            if failed and time.monotonic() - self._started.get(slot, 0.0) < MIN_UPTIME:
+                self._quick_exits[slot] = self._quick_exits.get(slot, 0) + 1
+            else:
+                self._quick_exits[slot] = 0
+            delay = respawn_delay(self._quick_exits[slot])
+            logger.info(
+                "Worker %d exited (status %d); starting a replacement in %.1fs", pid, status, delay
+            )
+            if delay > 0:
+                self._release_slot(slot)
+            self._sleep(delay)
+            if not self._stopping:
+                self._spawn(slot, app)
+        for slot in range(len(self._sockets)):
+            self._release_slot(slot)
+        return 0
+
+    def _slot_socket(self, slot: int) -> socket.socket:
+        """Return the listening socket of ``slot``, reopening it if it was released."""
+
+        index = slot % len(self._sockets)
+        sock = self._sockets[index]
+        if sock is None:
+            sock = self._sockets[index] = create_listen_socket(
+                self.host, self.port, reuse_port=self.reuse_port
+            )
+        return sock
+
+    def _release_slot(self, slot: int) -> None:
+        """Close the socket of a slot that has no worker to accept from it.
+
+        The shared socket (without ``SO_REUSEPORT``) is still served by the
+        other workers, so it is only closed once every worker has stopped.
+        """
+
+        if len(self._sockets) == 1 and self._children:
+            return
+        index = slot % len(self._sockets)
+        sock, self._sockets[index] = self._sockets[index], None
+        if sock is not None:
+            sock.close()
+
+    def _request_stop(self, signum: int, _frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("Received %s; draining workers", signal.Signals(signum).name)
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = self.graceful_timeout + 5
+        signal.signal(signal.SIGALRM, self._kill_stragglers)
+        signal.alarm(deadline)
+
+    def _kill_stragglers(self, _signum: int, _frame) -> None:
+        for pid in list(self._children):
+            logger.warning("Worker %d did not stop in time; killing it", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _sleep(self, seconds: float) -> None:
+        # Short naps so a stop request is noticed promptly.
+        until = time.monotonic() + seconds
+        while not self._stopping and (left := until - time.monotonic()) > 0:
+            time.sleep(min(left, 0.1))
+
+    def _spawn(self, slot: int, app) -> None:
+        sock = self._slot_socket(slot)
+        self._started[slot] = time.monotonic()
+        pid = os.fork()
+        if pid:
+            self._children[pid] = slot
+            return
+        # Per-slot state (such as the session snapshot) survives recycling.
+        os.environ["WORKER_SLOT"] = str(slot)
+        # Other slots' sockets must close with the master alone, not linger
+        # open in this child.
+        for other in self._sockets:
+            if other is not None and other is not sock:
+                other.close()
+        try:
+            started = self._run_worker(app, sock)
+        except BaseException:  # noqa: BLE001 - never let a child return into the master loop
+            logger.exception("Worker crashed")
+            os._exit(1)
+        os._exit(0 if started else 3)
+
+    # -- worker ------------------------------------------------------------
+    def _worker_limit(self) -> Optional[int]:
+        if self.max_requests <= 0:
+            return None
+        # Jitter keeps workers from all recycling at the same moment.
+        return self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+
+    def _run_worker(self, app, sock: socket.socket) -> bool:
+        """Serve on ``sock`` until stopped; returns whether startup completed."""
+
+        import uvicorn
+
+        random.seed()  # forked children would otherwise share one RNG state
+        # uvicorn restores these handlers after its graceful shutdown and
+        # re-raises the signal; a no-op handler lets the child exit cleanly.
+        signal.signal(signal.SIGTERM, lambda *_: None)
+        signal.signal(signal.SIGINT, lambda *_: None)
+        config = uvicorn.Config(
+            app,
+            lifespan="on",
+            log_level=self.log_level,
+            limit_max_requests=self._worker_limit(),
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        server = uvicorn.Server(config)
+        server.run(sockets=[sock])
+        return server.started
+
+
+def serve(
+    app_path: str = DEFAULT_APP,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: Optional[int] = None,
+    max_requests: int = 0,
+    max_requests_jitter: int = 0,
+    graceful_timeout: int = 30,
+    reuse_port: Optional[bool] = None,
+    log_level: str = "info",
+    fallback: Optional[Callable[..., None]] = None,
+) -> int:
+    """Run the API with ``workers`` processes and return an exit code."""
+
+    if (workers or default_workers()) > 1 and not sessions_are_shared():
+        logger.error(
+            "More than one worker needs SESSION_STORE=sqlite: in-memory sessions are per "
+            "process, so a session started on one worker would be rejected by the others"
+        )
+        return 2
+    if not hasattr(os, "fork"):
+        import uvicorn
+
+        runner = fallback or uvicorn.run
+        runner(
+            app_path,
+            host=host,
+            port=port,
+            workers=workers or default_workers(),
+            limit_max_requests=max_requests or None,
+            timeout_graceful_shutdown=graceful_timeout,
+            log_level=log_level,
+        )
+        return 0
+    return Supervisor(
+        app_path,
+        host=host,
+        port=port,
+        workers=workers,
+        max_requests=max_requests,
+        max_requests_jitter=max_requests_jitter,
+        graceful_timeout=graceful_timeout,
+        reuse_port=reuse_port,
+        log_level=log_level,
+    ).run()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with multiple workers")
+    parser.add_argument("--app", default=DEFAULT_APP, help="Import string of the ASGI app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=0,
+        help="Recycle a worker after this many requests (0 disables)",
+    )
+    parser.add_argument("--max-requests-jitter", type=int, default=0)
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=30,
+        help="Seconds a worker may spend draining in-flight requests on shutdown",
+    )
+    parser.add_argument(
+        "--no-reuse-port", action="store_true",
+        help="Share one inherited socket instead of per-worker SO_REUSEPORT sockets",
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(message)s")
+    return serve(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        reuse_port=False if args.no_reuse_port else None,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
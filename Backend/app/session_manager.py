@@ -1,26 +1,89 @@
-"""In-memory tracking of active user sessions."""
+"""In-memory tracking of active user sessions.
+
+Sessions expire ``SESSION_TTL`` seconds after they start. To survive
+deploys and worker restarts, the registry can be saved to a small binary
+file (opt-in, with ``SESSION_SNAPSHOT_FILE``) every
+``SESSION_SNAPSHOT_INTERVAL`` seconds and once more at shutdown, then
+restored at startup. Restoring skips expired sessions. Each save copies
+the sessions under the lock, then encodes and writes them outside it.
+The file is written to a temporary name and renamed into place, so a
+crash never leaves a torn snapshot. Auxiliary shared state (rate limiter
+buckets) is not saved.
+
+The file holds live session ids, so it is created readable by its owner
+only. Under ``app.server`` each worker slot uses its own file, and a
+recycled worker picks up the sessions of the one it replaces.
+
+The in-memory registry is private to one process. With more than one
+worker, set ``SESSION_STORE=sqlite`` so every worker shares the sessions
+in ``SESSION_STORE_FILE`` (:class:`SqliteSessionRegistry`); snapshots are
+then unnecessary.
+"""
 
 from __future__ import annotations
 
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
+from pathlib import Path
 from threading import Lock
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from uuid import uuid4
 
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# File layout: header, then one record per session followed by the UTF-8
+# username. A zero expiry means the session never expires.
+SNAPSHOT_MAGIC = b"SREG"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sBI")  # magic, version, record count
+_RECORD = struct.Struct("<16sdH")  # session id bytes, expires_at, username length
+
+
+class SnapshotFormatError(ValueError):
+    """Raised when a session snapshot file cannot be decoded."""
+
 
 @dataclass
 class SessionInfo:
     """Simple container storing the server-side session identifier."""
 
     session_id: str
+    expires_at: Optional[float] = None
+    """Wall-clock expiry (``time.time()``); ``None`` never expires."""
 
 
 class SessionRegistry:
     """Store the most recent session identifier per username."""
 
-    def __init__(self) -> None:
+    shared = False
+    """Whether sessions are visible to every worker process."""
+
+    def __init__(
+        self,
+        max_shared_entries: int = 100_000,
+        *,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
         self._lock = Lock()
+        self._ttl = ttl
+        self._clock = clock
         self._sessions: Dict[str, SessionInfo] = {}
+        self._generation = 0  # bumped by every session change
+        self._saved_generation = -1
+        # Auxiliary per-key state (e.g. rate limiter buckets) that should live
+        # in the same store as the sessions; least recently used keys are evicted.
+        self._shared: "OrderedDict[str, Any]" = OrderedDict()
+        self._max_shared_entries = max_shared_entries
 
     def start_session(self, username: str) -> tuple[str, bool]:
         """Create a new session ID for ``username``.
@@ -30,9 +93,11 @@ class SessionRegistry:
         """
 
         session_id = uuid4().hex
+        expires_at = self._clock() + self._ttl if self._ttl else None
         with self._lock:
-            replaced = username in self._sessions
-            self._sessions[username] = SessionInfo(session_id=session_id)
+            replaced = self._live(username) is not None
+            self._sessions[username] = SessionInfo(session_id=session_id, expires_at=expires_at)
+            self._generation += 1
         return session_id, replaced
 
     def end_session(self, username: str) -> bool:
@@ -42,19 +107,319 @@ class SessionRegistry:
         """
 
         with self._lock:
-            return self._sessions.pop(username, None) is not None
+            live = self._live(username) is not None
+            if self._sessions.pop(username, None) is not None:
+                self._generation += 1
+            return live
 
     def validate(self, username: str, session_id: str) -> bool:
         """Check whether ``session_id`` matches the stored value for the user."""
 
         with self._lock:
-            info = self._sessions.get(username)
+            info = self._live(username)
             return bool(info and info.session_id == session_id)
 
     def get(self, username: str) -> Optional[SessionInfo]:
         with self._lock:
-            return self._sessions.get(username)
+            return self._live(username)
+
+    def _live(self, username: str) -> Optional[SessionInfo]:
+        # Called with the lock held; expired sessions are dropped lazily.
+        info = self._sessions.get(username)
+        if info is not None and info.expires_at is not None and info.expires_at <= self._clock():
+            del self._sessions[username]
+            self._generation += 1
+            return None
+        return info
+
+    def save(self, path: Path, *, force: bool = False) -> Optional[int]:
+        """Write unexpired sessions to ``path`` atomically.
+
+        Returns the number of sessions written, or ``None`` when nothing
+        changed since the last save and ``force`` is not set.
+        """
+
+        with self._lock:
+            if not force and self._generation == self._saved_generation:
+                return None
+            generation = self._generation
+            sessions = list(self._sessions.items())
+        now = self._clock()
+        body = bytearray()
+        count = 0
+        for username, info in sessions:
+            if info.expires_at is not None and info.expires_at <= now:
+                continue
+            name = username.encode("utf-8")
+            body += _RECORD.pack(bytes.fromhex(info.session_id), info.expires_at or 0.0, len(name))
+            body += name
+            count += 1
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, count))
+            handle.write(body)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, path)
+        with self._lock:
+            self._saved_generation = generation
+        return count
+
+    def restore(self, path: Path) -> int:
+        """Load unexpired sessions saved by :meth:`save`; returns how many were restored.
+
+        Sessions started since this process came up are kept.
+        """
+
+        data = path.read_bytes()
+        try:
+            magic, version, count = _HEADER.unpack_from(data)
+        except struct.error as exc:
+            raise SnapshotFormatError(f"{path} is not a session snapshot") from exc
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise SnapshotFormatError(f"{path} is not a version {SNAPSHOT_VERSION} session snapshot")
+        now = self._clock()
+        restored = {}
+        offset = _HEADER.size
+        try:
+            for _ in range(count):
+                session_id, expires_at, length = _RECORD.unpack_from(data, offset)
+                offset += _RECORD.size
+                if offset + length > len(data):
+                    raise struct.error("username runs past the end of the file")
+                username = data[offset:offset + length].decode("utf-8")
+                offset += length
+                if expires_at and expires_at <= now:
+                    continue
+                restored[username] = SessionInfo(session_id.hex(), expires_at or None)
+        except (struct.error, UnicodeDecodeError) as exc:
+            raise SnapshotFormatError(f"{path} is truncated or corrupt") from exc
+        with self._lock:
+            for username, info in restored.items():
+                self._sessions.setdefault(username, info)
+            self._saved_generation = self._generation
+        return len(restored)
+
+    def update_shared(self, key: str, update: Callable[[Any], Tuple[Any, Any]]) -> Any:
+        """Atomically replace the shared value stored under ``key``.
+
+        ``update`` receives the current value (``None`` if absent) and returns
+        a tuple ``(new_value, result)``; ``result`` is returned to the caller.
+        """
+
+        with self._lock:
+            new_value, result = update(self._shared.get(key))
+            self._shared[key] = new_value
+            self._shared.move_to_end(key)
+            while len(self._shared) > self._max_shared_entries:
+                self._shared.popitem(last=False)
+            return result
+
+    def clear_shared(self, prefix: str = "") -> None:
+        """Drop shared values whose key starts with ``prefix``."""
+
+        with self._lock:
+            for key in [key for key in self._shared if key.startswith(prefix)]:
+                del self._shared[key]
+
+
+class SqliteSessionRegistry(SessionRegistry):
+    """Registry whose sessions live in a SQLite file shared by every worker process.
+
+    A session started on one worker is valid on all of them, and sessions
+    survive restarts without snapshots. Auxiliary shared state (rate limiter
+    buckets) lives in the same file, so every worker enforces the same
+    limits; its values must be JSON-serializable, and tuples come back as
+    lists.
+    """
+
+    shared = True
 
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " username TEXT PRIMARY KEY, session_id TEXT NOT NULL, expires_at REAL"
+        ") WITHOUT ROWID;"
+        "CREATE TABLE IF NOT EXISTS shared_state ("
+        " key TEXT PRIMARY KEY, value TEXT NOT NULL, touched INTEGER NOT NULL"
+        ") WITHOUT ROWID;"
+        "CREATE INDEX IF NOT EXISTS shared_state_touched ON shared_state (touched)"
+    )
+    _PRUNE_EVERY = 1000  # updates between trims of shared_state to max_shared_entries
 
-session_registry = SessionRegistry()
+    def __init__(self, path: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections are per thread
+        self._updates = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Keyed by pid as well: a connection must never cross a fork.
+        cached = getattr(self._local, "connection", None)
+        if cached is not None and cached[0] == os.getpid():
+            return cached[1]
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(self._SCHEMA)
+        os.chmod(self.path, 0o600)  # holds live session ids
+        self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def _read(self, connection: sqlite3.Connection, username: str) -> Optional[SessionInfo]:
+        row = connection.execute(
+            "SELECT session_id, expires_at FROM sessions WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= self._clock()):
+            return None
+        return SessionInfo(session_id=row[0], expires_at=row[1])
+
+    def start_session(self, username: str) -> tuple[str, bool]:
+        session_id = uuid4().hex
+        expires_at = self._clock() + self._ttl if self._ttl else None
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            replaced = self._read(connection, username) is not None
+            connection.execute("DELETE FROM sessions WHERE expires_at <= ?", (self._clock(),))
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (username, session_id, expires_at) VALUES (?, ?, ?)",
+                (username, session_id, expires_at),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return session_id, replaced
+
+    def end_session(self, username: str) -> bool:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            live = self._read(connection, username) is not None
+            connection.execute("DELETE FROM sessions WHERE username = ?", (username,))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return live
+
+    def validate(self, username: str, session_id: str) -> bool:
+        info = self._read(self._connection(), username)
+        return bool(info and info.session_id == session_id)
+
+    def get(self, username: str) -> Optional[SessionInfo]:
+        return self._read(self._connection(), username)
+
+    def update_shared(self, key: str, update: Callable[[Any], Tuple[Any, Any]]) -> Any:
+        # Read, update and write back in one write transaction, so workers
+        # never interleave on the same key.
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM shared_state WHERE key = ?", (key,)
+            ).fetchone()
+            new_value, result = update(None if row is None else json.loads(row[0]))
+            connection.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, touched) VALUES (?, ?, "
+                "(SELECT coalesce(max(touched), 0) + 1 FROM shared_state))",
+                (key, json.dumps(new_value)),
+            )
+            with self._lock:
+                self._updates += 1
+                prune = self._updates % self._PRUNE_EVERY == 0
+            if prune:
+                # Least recently updated keys go first, as in memory.
+                connection.execute(
+                    "DELETE FROM shared_state WHERE touched <= (SELECT touched FROM shared_state"
+                    " ORDER BY touched DESC LIMIT 1 OFFSET ?)",
+                    (self._max_shared_entries,),
+                )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def clear_shared(self, prefix: str = "") -> None:
+        self._connection().execute(
+            "DELETE FROM shared_state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        )
+
+    def save(self, path: Path, *, force: bool = False) -> Optional[int]:
+        return None  # already durable
+
+    def restore(self, path: Path) -> int:
+        return 0
+
+
+def _build_registry() -> SessionRegistry:
+    ttl = settings.SESSION_TTL or None
+    if settings.SESSION_STORE == "sqlite":
+        return SqliteSessionRegistry(settings.SESSION_STORE_FILE, ttl=ttl)
+    return SessionRegistry(ttl=ttl)
+
+
+session_registry = _build_registry()
 """Module-level singleton used by the API routers."""
+
+
+_saver: Optional[threading.Thread] = None
+_stop_saving = threading.Event()
+_snapshot_path: Optional[Path] = None
+
+
+def snapshot_path(path: str) -> Path:
+    """Return this worker's snapshot file: ``path``, suffixed by the worker slot if any."""
+
+    snapshot = Path(path)
+    slot = os.environ.get("WORKER_SLOT")
+    return snapshot.with_name(f"{snapshot.stem}-{slot}{snapshot.suffix}") if slot else snapshot
+
+
+def start_session_persistence(path: str, *, interval: float) -> int:
+    """Restore saved sessions and keep saving them every ``interval`` seconds."""
+
+    global _saver, _snapshot_path
+    _snapshot_path = snapshot_path(path)
+    restored = 0
+    if _snapshot_path.exists():
+        try:
+            restored = session_registry.restore(_snapshot_path)
+            logger.info("Restored %d session(s) from %s", restored, _snapshot_path)
+        except (OSError, SnapshotFormatError):
+            logger.warning("Ignoring unreadable session snapshot %s", _snapshot_path, exc_info=True)
+    if interval > 0 and _saver is None:
+        _stop_saving.clear()
+        _saver = threading.Thread(
+            target=_save_loop, args=(_snapshot_path, interval), name="session-snapshot", daemon=True
+        )
+        _saver.start()
+    return restored
+
+
+def _save_loop(path: Path, interval: float) -> None:
+    while not _stop_saving.wait(interval):
+        try:
+            session_registry.save(path)
+        except OSError:  # keep serving; the next interval retries
+            logger.exception("Saving the session snapshot failed")
+
+
+def stop_session_persistence() -> None:
+    """Stop the periodic saver and write a final snapshot."""
+
+    global _saver, _snapshot_path
+    _stop_saving.set()
+    if _saver is not None:
+        _saver.join(timeout=5)
+        _saver = None
+    if _snapshot_path is not None:
+        try:
+            session_registry.save(_snapshot_path)
+        except OSError:
+            logger.exception("Saving the session snapshot failed")
+        _snapshot_path = None
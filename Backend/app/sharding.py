@@ -0,0 +1,241 @@
+"""Range sharding of the ``employees`` table across several databases.
+
+With ``SHARDS`` set, employees are spread over several databases. Each
+shard owns a range of ``emp_no``, from its configured first number up to
+the next shard's. Numbers below the first range belong to the first
+shard::
+
+    SHARDS="1=mysql+pymysql://u:p@db1/employees;500000=mysql+pymysql://u:p@db2/employees"
+
+Point reads and updates open a session on the owning shard only. A listing
+page asks every shard, in parallel, for its first ``offset + limit`` rows in
+page order and k-way merges the results, so deep offsets cost more than on
+one database; offsets past ``SHARD_MAX_OFFSET`` are refused. Totals and
+headcounts are summed over the shards.
+
+Each shard has its own circuit breaker, tripped by that shard's connection
+failures and closed by probing that shard. A fan-out fails fast with
+``503`` while any shard's breaker is open; point reads and writes only
+consult the owning shard's.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import logging
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from . import counts, crud
+from .config import settings
+from .circuit import CircuitBreaker
+from .db import (
+    SessionLocal,
+    check_breaker,
+    create_database_engine,
+    install_breaker,
+    new_breaker,
+    probe_engine,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ShardConfigError(ValueError):
+    """Raised when ``SHARDS`` cannot be parsed."""
+
+
+@dataclass(frozen=True)
+class Shard:
+    name: str
+    first_emp_no: int
+    url: str
+
+
+def parse_shards(spec: str) -> list[Shard]:
+    """Parse ``"<first emp_no>=<url>;..."`` into shards ordered by range."""
+
+    ranges = []
+    for item in spec.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, url = item.partition("=")
+        try:
+            ranges.append((int(first), url.strip()))
+        except ValueError as exc:
+            raise ShardConfigError(f"Invalid shard {item!r}; expected <first emp_no>=<url>") from exc
+    ranges.sort()
+    if not ranges:
+        raise ShardConfigError("SHARDS names no shards")
+    if len({first for first, _ in ranges}) != len(ranges):
+        raise ShardConfigError("Two shards start at the same emp_no")
+    return [Shard(f"shard{index}", first, url) for index, (first, url) in enumerate(ranges)]
+
+
+class ShardSet:
+    """Engines for every shard plus routing and fan-out helpers."""
+
+    def __init__(
+        self,
+        shards: list[Shard],
+        engines: Optional[list[Engine]] = None,
+        *,
+        max_offset: int = 10_000,
+    ) -> None:
+        self.shards = shards
+        self.max_offset = max_offset
+        self.engines = engines or [create_database_engine(shard.url) for shard in shards]
+        self.breakers: list[CircuitBreaker] = []
+        for shard, engine in zip(shards, self.engines):
+            breaker = new_breaker(partial(probe_engine, engine), name=f"{shard.name} database")
+            install_breaker(engine, breaker)
+            self.breakers.append(breaker)
+        self._starts = [shard.first_emp_no for shard in shards]
+        # One thread per pooled connection on every shard, so concurrent
+        # fan-outs wait for connections, not for each other's threads.
+        connections = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(shards) * max(1, connections), thread_name_prefix="shard"
+        )
+        # Merge last names the way the databases order them.
+        mysql = self.engines[0].dialect.name == "mysql"
+        self._fold: Callable[[str], str] = str.lower if mysql else str
+
+    def index_for(self, emp_no: int) -> int:
+        return max(0, bisect_right(self._starts, emp_no) - 1)
+
+    def breaker_for(self, emp_no: int) -> CircuitBreaker:
+        return self.breakers[self.index_for(emp_no)]
+
+    def session_for(self, emp_no: int) -> Session:
+        """Open a session on the shard that owns ``emp_no``."""
+
+        return SessionLocal(bind=self.engines[self.index_for(emp_no)])
+
+    def map(self, call: Callable[[Session], T]) -> list[T]:
+        """Run ``call`` with a session on every shard in parallel, results in shard order.
+
+        Raises ``503`` up front while any shard's breaker is open.
+        """
+
+        for breaker in self.breakers:
+            check_breaker(breaker)
+
+        def run(engine: Engine) -> T:
+            with SessionLocal(bind=engine) as session:
+                return call(session)
+
+        # Each task runs in a copy of the caller's context, so the request's
+        # principal and deadline apply on every shard.
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, run, engine)
+            for engine in self.engines
+        ]
+        return [future.result() for future in futures]
+
+    def check_offset(self, offset: int) -> None:
+        """Refuse offsets whose fan-out would read too many rows from every shard."""
+
+        if offset > self.max_offset:
+            raise crud.UnsupportedQueryError(
+                f"offset is limited to {self.max_offset} with SHARDS; "
+                "narrow the list with filters instead"
+            )
+
+    def get_employees(
+        self,
+        *,
+        limit: int = 10,
+        offset: int = 0,
+        filters: Optional[crud.EmployeeFilters] = None,
+        sort: str = "emp_no",
+        columns: tuple[str, ...] = crud.LIST_COLUMNS,
+    ):
+        """Return the page :func:`crud.get_employees` would return on one database."""
+
+        filters = filters or crud.EmployeeFilters()
+        crud.plan_employee_query(filters, sort)
+        self.check_offset(offset)
+        column, descending = crud._parse_sort(sort)
+        needed = {*columns, column, "emp_no"}
+        selected = tuple(name for name in crud.COLUMNS if name in needed)
+        pages = self.map(
+            lambda session: crud.get_employees(
+                session, limit=offset + limit, offset=0, filters=filters, sort=sort, columns=selected
+            )
+        )
+        if column == "emp_no":
+            key = lambda row: row.emp_no  # noqa: E731
+        elif column == "last_name":
+            key = lambda row: (self._fold(row.last_name), row.emp_no)  # noqa: E731
+        else:
+            key = lambda row: (getattr(row, column), row.emp_no)  # noqa: E731
+        merged = heapq.merge(*pages, key=key, reverse=descending)
+        return list(islice(merged, offset, offset + limit))
+
+    def count_employees(self, filters: Optional[crud.EmployeeFilters] = None) -> int:
+        return sum(self.map(lambda session: crud.count_employees(session, filters)))
+
+    def get_total_count(
+        self, filters: Optional[crud.EmployeeFilters] = None, *, exact: bool = False
+    ):
+        """Sharded counterpart of :func:`crud.get_total_count`."""
+
+        filters = filters or crud.EmployeeFilters()
+        cache = counts.count_cache
+        if exact:
+            return cache.exact(filters, lambda: self.count_employees(filters))
+        if filters == crud.EmployeeFilters():
+            return cache.estimate(lambda: sum(self.map(crud.estimate_employee_count)))
+        return cache.cached_exact(filters)
+
+    def count_by_gender_and_hire_year(self) -> dict[tuple[str, int], int]:
+        totals: dict[tuple[str, int], int] = {}
+        for shard_counts in self.map(crud.count_by_gender_and_hire_year):
+            for key, count in shard_counts.items():
+                totals[key] = totals.get(key, 0) + count
+        return totals
+
+    def dispose(self) -> None:
+        self._executor.shutdown(wait=False)
+        for engine, breaker in zip(self.engines, self.breakers):
+            engine.dispose()
+            breaker.reset()
+
+
+_shards: Optional[ShardSet] = None
+
+
+def get_shards() -> Optional[ShardSet]:
+    """Return the configured shards, or ``None`` when one database holds everything."""
+
+    return _shards
+
+
+def init_shards(spec: str) -> ShardSet:
+    global _shards
+    if _shards is None:
+        _shards = ShardSet(parse_shards(spec), max_offset=settings.SHARD_MAX_OFFSET)
+        logger.info(
+            "Employees are sharded: %s",
+            ", ".join(f"{shard.name} from {shard.first_emp_no}" for shard in _shards.shards),
+        )
+    return _shards
+
+
+def dispose_shards() -> None:
+    global _shards
+    if _shards is not None:
+        _shards.dispose()
+        _shards = None
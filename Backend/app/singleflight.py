@@ -0,0 +1,56 @@
+"""Coalesce identical concurrent reads into a single in-flight call."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .config import settings
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one in-flight awaitable between callers using the same key.
+
+    The first caller for a key (the leader) starts the work; callers that
+    arrive while it is running await the same result instead of repeating
+    it. The work is shielded, so a leader that disconnects does not cancel
+    it for everyone else. At most ``max_keys`` calls are tracked; beyond
+    that callers simply run their own work, so the map cannot grow without
+    bound.
+    """
+
+    def __init__(self, max_keys: int = 1024) -> None:
+        self.max_keys = max_keys
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is not None:
+            self.shared += 1
+            return await asyncio.shield(call)
+        if len(self._calls) >= self.max_keys:
+            return await fn()
+
+        call = asyncio.ensure_future(fn())
+        self._calls[key] = call
+        self.started += 1
+
+        def _forget(finished: asyncio.Future) -> None:
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            if not finished.cancelled():
+                finished.exception()  # mark retrieved even if every caller left
+
+        call.add_done_callback(_forget)
+        return await asyncio.shield(call)
+
+
+employee_reads = SingleFlight(max_keys=settings.SINGLEFLIGHT_MAX_KEYS)
+"""Coalesces identical employee reads in this worker."""
@@ -0,0 +1,376 @@
+"""Optional in-memory, column-oriented copy of the ``employees`` table.
+
+With ``SNAPSHOT_ENABLED`` set, each worker loads the table at startup into
+compact parallel arrays sorted by ``emp_no``:
+
+- dates are stored as ``int32`` ordinals;
+- gender is stored as one byte per row;
+- first and last names are stored as ``uint32`` ids into a shared table of
+  distinct strings.
+
+Lookups binary-search ``emp_no``. Pages are served from precomputed row
+orders that mirror the table's indexes, with and without a leading gender.
+Range filters are resolved by binary search, so every page is a slice.
+The column data takes 21 bytes per row and the orders 20 more, plus the
+distinct names. Reads never touch the database.
+
+Committed changes published on :data:`app.events.change_hub` are applied as
+they happen, so a worker always sees its own writes. Writes made through
+other workers, bulk imports and external SQL show up at the next full
+reload, every ``SNAPSHOT_REFRESH`` seconds. Each row remembers the sequence
+of the last change applied to it (initially the feed's sequence when the
+load started), so a change that is older than the row is never applied over
+it.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import crud, events
+from .models import Employee
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotRow(NamedTuple):
+    """One employee materialized from the snapshot (duck-types :class:`Employee`)."""
+
+    emp_no: int
+    birth_date: date
+    first_name: str
+    last_name: str
+    gender: str
+    hire_date: date
+
+
+class EmployeeSnapshot:
+    """Column arrays for every employee, ordered by ``emp_no``.
+
+    ``fold`` maps a last name to the key it sorts and matches by. Pass
+    ``str.lower`` to mirror MySQL's case-insensitive collations, or ``None``
+    for binary ordering (SQLite).
+    """
+
+    def __init__(self, *, fold: Optional[Callable[[str], str]] = None) -> None:
+        self._fold = fold
+        self._lock = threading.Lock()
+        self._emp_no = array("i")
+        self._birth_date = array("i")
+        self._hire_date = array("i")
+        self._gender = bytearray()
+        self._first_name = array("I")
+        self._last_name = array("I")
+        self._strings: list[str] = []
+        self._string_keys: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        # Row positions in page order, mirroring the table's indexes: keyed by
+        # (sort column, gender byte or None). Position order is emp_no order.
+        self._orders: dict[tuple[str, Optional[int]], array] = {}
+        self.loaded_at = time.time()
+        self.load_seconds = 0.0
+        self.loaded_seq = 0
+        """Last change-feed sequence committed before the load read the table."""
+        # Position -> sequence of the last change applied to that row; rows
+        # not listed are as loaded, i.e. at ``loaded_seq``.
+        self._row_seq: dict[int, int] = {}
+
+    @classmethod
+    def load(cls, session: Session) -> "EmployeeSnapshot":
+        """Stream the table from ``session`` into a new snapshot."""
+
+        started = time.perf_counter()
+        dialect = session.get_bind().dialect.name
+        snapshot = cls(fold=str.lower if dialect == "mysql" else None)
+        stmt = (
+            select(
+                Employee.emp_no,
+                Employee.birth_date,
+                Employee.first_name,
+                Employee.last_name,
+                Employee.gender,
+                Employee.hire_date,
+            )
+            .order_by(Employee.emp_no)
+            .execution_options(yield_per=10_000)
+        )
+        # Read before the query: every change up to here is in its results.
+        snapshot.loaded_seq = events.change_hub.last_seq
+        snapshot.extend(session.execute(stmt))
+        snapshot.load_seconds = time.perf_counter() - started
+        return snapshot
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        """Append rows given in ascending ``emp_no`` order and rebuild the sort orders."""
+
+        with self._lock:
+            for emp_no, birth_date, first_name, last_name, gender, hire_date in rows:
+                self._emp_no.append(emp_no)
+                self._birth_date.append(birth_date.toordinal())
+                self._hire_date.append(hire_date.toordinal())
+                self._gender.append(ord(gender))
+                self._first_name.append(self._string_id(first_name))
+                self._last_name.append(self._string_id(last_name))
+            # Positions are already in emp_no order and sorted() is stable,
+            # so emp_no breaks ties exactly like the SQL ORDER BY.
+            positions = range(len(self._emp_no))
+            genders = set(self._gender)
+            self._orders = {}
+            for column, key in (
+                ("emp_no", None),
+                ("hire_date", self._hire_date.__getitem__),
+                ("last_name", self._last_name_key),
+            ):
+                ordered = array("I", positions if key is None else sorted(positions, key=key))
+                if key is not None:
+                    self._orders[column, None] = ordered
+                for gender in genders:
+                    self._orders[column, gender] = array(
+                        "I", (p for p in ordered if self._gender[p] == gender)
+                    )
+
+    def __len__(self) -> int:
+        return len(self._emp_no)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the snapshot, including the string table."""
+
+        arrays = (
+            self._emp_no, self._birth_date, self._hire_date, self._first_name,
+            self._last_name, *self._orders.values(),
+        )
+        total = sum(a.itemsize * len(a) for a in arrays) + len(self._gender)
+        total += sys.getsizeof(self._strings) + sys.getsizeof(self._string_ids)
+        total += sum(sys.getsizeof(s) for s in self._strings)
+        if self._fold is not None:
+            total += sys.getsizeof(self._string_keys)
+            total += sum(
+                sys.getsizeof(key)
+                for key, string in zip(self._string_keys, self._strings)
+                if key is not string
+            )
+        return total
+
+    def stats(self) -> dict:
+        rows = len(self)
+        nbytes = self.nbytes
+        return {
+            "rows": rows,
+            "bytes": nbytes,
+            "bytes_per_row": round(nbytes / rows, 1) if rows else None,
+            "distinct_names": len(self._strings),
+            "load_seconds": round(self.load_seconds, 3),
+            "age_seconds": round(time.time() - self.loaded_at, 1),
+        }
+
+    def get(self, emp_no: int) -> Optional[SnapshotRow]:
+        with self._lock:
+            position = self._position(emp_no)
+            return None if position is None else self._row(position)
+
+    def page(
+        self,
+        *,
+        limit: int = 10,
+        offset: int = 0,
+        filters: Optional[crud.EmployeeFilters] = None,
+        sort: str = "emp_no",
+    ) -> list[SnapshotRow]:
+        """Return the same page :func:`crud.get_employees` would."""
+
+        filters = filters or crud.EmployeeFilters()
+        crud.plan_employee_query(filters, sort)
+        column, descending = crud._parse_sort(sort)
+        gender = ord(filters.gender) if filters.gender is not None else None
+        with self._lock:
+            order = self._orders.get((column, gender))
+            if order is None and gender is not None:
+                return []  # nobody of that gender
+            start, stop = self._range(column, filters, order)
+            indices = range(stop - 1, start - 1, -1) if descending else range(start, stop)
+            return [
+                self._row(index if order is None else order[index])
+                for index in indices[offset:offset + limit]
+            ]
+
+    def apply(self, changes: Iterable[events.ChangeEvent], *, replay: bool = False) -> None:
+        """Apply committed changes; only name fields are published today.
+
+        Changes no newer than the row are skipped. With ``replay`` (changes
+        committed while the snapshot was loading, which the load may or may
+        not have seen), a change also applies only while the row still holds
+        its ``old`` value; otherwise the load read a later state, possibly
+        written by another worker, which the change must not overwrite.
+        """
+
+        with self._lock:
+            for change in changes:
+                position = self._position(change.emp_no)
+                if position is None or change.new is None:
+                    continue
+                if change.field not in ("last_name", "first_name"):
+                    continue
+                if change.seq <= self._row_seq.get(position, self.loaded_seq):
+                    continue
+                current = self._name(position, change.field)
+                if replay and change.old is not None and current != change.old:
+                    continue
+                if change.field == "last_name":
+                    self._set_last_name(position, change.new)
+                else:
+                    self._first_name[position] = self._string_id(change.new)
+                self._row_seq[position] = change.seq
+
+    def _string_id(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+            self._string_keys.append(self._fold(value) if self._fold else value)
+        return string_id
+
+    def _name(self, position: int, field: str) -> str:
+        names = self._last_name if field == "last_name" else self._first_name
+        return self._strings[names[position]]
+
+    def _last_name_key(self, position: int) -> str:
+        return self._string_keys[self._last_name[position]]
+
+    def _position(self, emp_no: int) -> Optional[int]:
+        position = bisect_left(self._emp_no, emp_no)
+        if position < len(self._emp_no) and self._emp_no[position] == emp_no:
+            return position
+        return None
+
+    def _row(self, position: int) -> SnapshotRow:
+        strings = self._strings
+        return SnapshotRow(
+            self._emp_no[position],
+            date.fromordinal(self._birth_date[position]),
+            strings[self._first_name[position]],
+            strings[self._last_name[position]],
+            chr(self._gender[position]),
+            date.fromordinal(self._hire_date[position]),
+        )
+
+    def _range(
+        self, column: str, filters: crud.EmployeeFilters, order: Optional[array]
+    ) -> tuple[int, int]:
+        if order is None:  # every row, in emp_no order
+            return 0, len(self._emp_no)
+        start, stop = 0, len(order)
+        if column == "hire_date":
+            key = self._hire_date.__getitem__
+            if filters.hire_date_from is not None:
+                start = bisect_left(order, filters.hire_date_from.toordinal(), key=key)
+            if filters.hire_date_to is not None:
+                stop = bisect_right(order, filters.hire_date_to.toordinal(), key=key)
+        elif column == "last_name" and filters.last_name_prefix:
+            key = self._last_name_key
+            prefix = self._fold(filters.last_name_prefix) if self._fold else filters.last_name_prefix
+            start = bisect_left(order, prefix, key=key)
+            stop = bisect_left(order, crud._prefix_upper_bound(prefix), key=key)
+        return start, stop
+
+    def _set_last_name(self, position: int, last_name: str) -> None:
+        def sort_key(member: int) -> tuple[str, int]:
+            return self._last_name_key(member), self._emp_no[member]
+
+        orders = [self._orders["last_name", None], self._orders["last_name", self._gender[position]]]
+        for order in orders:
+            del order[bisect_left(order, sort_key(position), key=sort_key)]
+        self._last_name[position] = self._string_id(last_name)
+        for order in orders:
+            order.insert(bisect_left(order, sort_key(position), key=sort_key), position)
+
+
+_snapshot: Optional[EmployeeSnapshot] = None
+_reload_lock = threading.Lock()
+_swap_lock = threading.Lock()  # orders swaps against change delivery
+_changes_during_reload: Optional[list[events.ChangeEvent]] = None
+_refresher: Optional[threading.Thread] = None
+_stop_refresh = threading.Event()
+
+
+def get_snapshot() -> Optional[EmployeeSnapshot]:
+    """Return the loaded snapshot, or ``None`` when reads go to the database."""
+
+    return _snapshot
+
+
+def _apply_changes(changes: list[events.ChangeEvent]) -> None:
+    with _swap_lock:
+        if _snapshot is not None:
+            _snapshot.apply(changes)
+        if _changes_during_reload is not None:
+            _changes_during_reload.extend(changes)
+
+
+def reload_snapshot(session: Session) -> EmployeeSnapshot:
+    """Load a fresh snapshot and swap it in, keeping changes committed meanwhile."""
+
+    global _snapshot, _changes_during_reload
+    with _reload_lock:
+        with _swap_lock:
+            _changes_during_reload = []
+        try:
+            snapshot = EmployeeSnapshot.load(session)
+            # The load may or may not have seen these; apply() sorts out
+            # which ones are still news for each row.
+            with _swap_lock:
+                snapshot.apply(_changes_during_reload, replay=True)
+                _snapshot = snapshot
+        finally:
+            with _swap_lock:
+                _changes_during_reload = None
+    logger.info(
+        "Loaded employee snapshot: %d rows, %.1f bytes/row, %.2fs",
+        len(snapshot), snapshot.nbytes / max(len(snapshot), 1), snapshot.load_seconds,
+    )
+    return snapshot
+
+
+def start_snapshot(session_factory: Callable[[], Session], *, refresh: float) -> EmployeeSnapshot:
+    """Load the snapshot, follow committed changes and reload every ``refresh`` seconds."""
+
+    global _refresher
+    events.change_hub.add_listener(_apply_changes)
+    with session_factory() as session:
+        snapshot = reload_snapshot(session)
+    if refresh > 0 and _refresher is None:
+        _stop_refresh.clear()
+        _refresher = threading.Thread(
+            target=_refresh_loop, args=(session_factory, refresh), name="snapshot-refresh", daemon=True
+        )
+        _refresher.start()
+    return snapshot
+
+
+def _refresh_loop(session_factory: Callable[[], Session], refresh: float) -> None:
+    while not _stop_refresh.wait(refresh):
+        try:
+            with session_factory() as session:
+                reload_snapshot(session)
+        except Exception:  # keep serving the previous snapshot
+            logger.exception("Employee snapshot reload failed")
+
+
+def stop_snapshot() -> None:
+    global _snapshot, _refresher
+    events.change_hub.remove_listener(_apply_changes)
+    _stop_refresh.set()
+    if _refresher is not None:
+        _refresher.join(timeout=5)
+        _refresher = None
+    _snapshot = None
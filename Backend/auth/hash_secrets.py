@@ -1,17 +1,36 @@
-"""Convert a plaintext user list into bcrypt hashed secrets."""
+"""Convert a plaintext user list into bcrypt hashed secrets.
+
+The output format follows the output file name: ``.json`` (the default) or
+a SQLite credentials database for ``.db``/``.sqlite``/``.sqlite3``, which the
+API looks up one user at a time. With ``--from-json`` the input is an
+existing JSON secrets file, copied without re-hashing, e.g.::
+
+    python auth/hash_secrets.py --from-json secrets/secrets.json secrets/secrets.db
+"""
 
 from __future__ import annotations
 
 import argparse
 import json
+import sqlite3
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import bcrypt
 
 DEFAULT_INPUT = Path("secrets/users.txt")
 DEFAULT_OUTPUT = Path("secrets/secrets.json")
 DEFAULT_ROUNDS = 12
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    access TEXT NOT NULL CHECK (access IN ('rd', 'wr'))
+) WITHOUT ROWID;
+"""
 
 
 AccessEntry = Tuple[str, str]
@@ -68,19 +87,56 @@ def build_payload(users: Dict[str, AccessEntry], rounds: int) -> Dict[str, Any]:
     }
 
 
-def main() -> None:
+def write_sqlite(path: Path, payload: Dict[str, Any]) -> None:
+    """Write ``payload`` into the SQLite credentials database at ``path``.
+
+    The users are replaced in a single transaction, so running workers see
+    either the old or the new directory and pick it up without a restart.
+    """
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SQLITE_SCHEMA)
+        with connection:
+            connection.execute("DELETE FROM users")
+            connection.executemany(
+                "INSERT INTO users (username, hash, access) VALUES (?, ?, ?)",
+                (
+                    (username, entry["hash"], entry["access"])
+                    for username, entry in payload["users"].items()
+                ),
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("algorithm", payload["algorithm"]), ("rounds", str(payload.get("rounds", "")))],
+            )
+    finally:
+        connection.close()
+
+
+def write_secrets(path: Path, payload: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() in SQLITE_SUFFIXES:
+        write_sqlite(path, payload)
+    else:
+        path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "input",
         nargs="?",
         default=str(DEFAULT_INPUT),
-        help="Path to the plaintext users file (default: secrets/users.txt)",
+        help="Path to the plaintext users file, or the JSON secrets file with "
+        "--from-json (default: secrets/users.txt)",
     )
     parser.add_argument(
         "output",
         nargs="?",
         default=str(DEFAULT_OUTPUT),
-        help="Where to write the JSON secrets file (default: secrets/secrets.json)",
+        help="Where to write the secrets; .db/.sqlite/.sqlite3 writes SQLite "
+        "(default: secrets/secrets.json)",
     )
     parser.add_argument(
         "--rounds",
@@ -88,17 +144,23 @@ def main() -> None:
         default=DEFAULT_ROUNDS,
         help="Cost factor for bcrypt hashing (default: 12)",
     )
-    args = parser.parse_args()
-
-    input_path = Path(args.input)
-    output_path = Path(args.output)
-
-    users = parse_users_file(input_path)
-    payload = build_payload(users, args.rounds)
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
-    print(f"Wrote {len(users)} user(s) to {output_path}")
+    parser.add_argument(
+        "--from-json",
+        action="store_true",
+        help="Read input as a JSON secrets file and copy its hashed users without re-hashing",
+    )
+    args = parser.parse_args(argv)
+
+    input_path, output_path = Path(args.input), Path(args.output)
+    if args.from_json:
+        if input_path.resolve() == output_path.resolve():
+            parser.error("--from-json needs an output other than its input")
+        payload = json.loads(input_path.read_text(encoding="utf-8"))
+    else:
+        payload = build_payload(parse_users_file(Path(args.input)), args.rounds)
+
+    write_secrets(output_path, payload)
+    print(f"Wrote {len(payload['users'])} user(s) to {output_path}")
 
 
 if __name__ == "__main__":
@@ -1,28 +1,114 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 
+from app.compression import (
+    CompressionMiddleware,
+    PrecompressedStaticFiles,
+    precompress_directory,
+)
+from app.audit import start_audit_log, stop_audit_log
+from app.auth.security import warm_up_secrets
+from app.deadlines import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    deadline_exceeded_handler,
+    parse_rules as parse_deadline_rules,
+)
 from app.config import settings
-from app.routers import employees, sessions
+from app.db import SessionLocal, dispose_engine, init_engine, prewarm_pool
+from app.idempotency import IdempotencyMiddleware, idempotency_store
+from app.profiling import loop_monitor
+from app.rate_limit import RateLimitMiddleware, rate_limiter
+from app.routers import admin, batch, employees, health, sessions
+from app import session_manager
+from app.session_manager import start_session_persistence, stop_session_persistence
+from app.sharding import dispose_shards, init_shards
+from app.snapshot import start_snapshot, stop_snapshot
 
 from pathlib import Path
 
-app = FastAPI(title="Employees API", version="1.0")
-
 # Resolve static dir relative to this file, not the working directory
 STATIC_DIR = (Path(__file__).resolve().parent / "static")
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Heavy resources are created here rather than at import time; uvicorn
+    # only reports the worker as started once this warmup has finished.
+    if settings.PRECOMPRESS_STATIC and STATIC_DIR.exists():
+        # Compress once here so static requests never compress on the fly.
+        precompress_directory(STATIC_DIR, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+    warm_up_secrets()
+    if settings.SESSION_SNAPSHOT_FILE and not session_manager.session_registry.shared:
+        # Users logged in before the restart keep their sessions.
+        start_session_persistence(
+            settings.SESSION_SNAPSHOT_FILE, interval=settings.SESSION_SNAPSHOT_INTERVAL
+        )
+    if settings.SHARDS:
+        # No shared engine: every query goes to a shard.
+        for engine in init_shards(settings.SHARDS).engines:
+            prewarm_pool(settings.DB_POOL_PREWARM, engine)
+    else:
+        init_engine()
+        prewarm_pool(settings.DB_POOL_PREWARM)
+    start_audit_log()
+    if settings.SNAPSHOT_ENABLED and settings.SHARDS:
+        logger.warning("SNAPSHOT_ENABLED is ignored while SHARDS is set")
+    elif settings.SNAPSHOT_ENABLED:
+        start_snapshot(SessionLocal, refresh=settings.SNAPSHOT_REFRESH)
+    if settings.LOOP_LAG_THRESHOLD > 0:
+        loop_monitor.start()
+    try:
+        yield
+    finally:
+        if settings.LOOP_LAG_THRESHOLD > 0:
+            await loop_monitor.stop()
+        stop_snapshot()
+        stop_session_persistence()
+        stop_audit_log()
+        dispose_shards()
+        dispose_engine()
+
+
+app = FastAPI(title="Employees API", version="1.0", lifespan=lifespan)
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+
 if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    app.mount("/static", PrecompressedStaticFiles(directory=str(STATIC_DIR)), name="static")
 # else: skip mounting in test/CI envs without the folder
 
+if settings.IDEMPOTENCY_ENABLED:
+    # Innermost, so replayed responses still get CORS headers and compression.
+    app.add_middleware(
+        IdempotencyMiddleware,
+        store=idempotency_store,
+        max_request_body=settings.IDEMPOTENCY_MAX_REQUEST_BODY,
+        skip_paths=("/employees/import",),  # streamed; never buffer it
+    )
+if settings.RATE_LIMIT_ENABLED:
+    # Added before CORS so it sits inside it: 429 responses stay readable by browsers.
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Exact", "ETag", "Idempotent-Replayed"],
+)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+# Outermost, so the budget covers time spent in every other middleware.
+app.add_middleware(
+    DeadlineMiddleware,
+    default=settings.REQUEST_DEADLINE,
+    rules=parse_deadline_rules(settings.REQUEST_DEADLINE_RULES),
+    maximum=settings.REQUEST_DEADLINE_MAX,
 )
 
 """
@@ -47,7 +133,13 @@ async def root():
             "/employees?limit=10&offset=0",
             "/employees/{emp_no}",
             "/employees/{emp_no}/last-name",
+            "/employees/{emp_no}/history",
+            "/employees/changes?emp_no=...",
+            "/employees/import",
+            "/employees/stats",
+            "/batch",
             "/sessions/start",
+            "/health/ready",
         ],
     }
 
@@ -55,6 +147,9 @@ async def root():
 # Mount routers
 app.include_router(employees.router, prefix="/employees", tags=["employees"])
 app.include_router(sessions.router, prefix="/sessions", tags=["sessions"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(batch.router, prefix="/batch", tags=["batch"])
 
 
 if __name__ == "__main__":
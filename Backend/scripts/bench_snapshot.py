@@ -0,0 +1,149 @@
+"""Compare database reads with the in-memory employee snapshot.
+
+Seeds a file-backed SQLite database with synthetic employees (shaped like
+the MySQL sample database: about 300k rows with a few thousand distinct
+names), loads :class:`app.snapshot.EmployeeSnapshot` from it, and reports
+memory per row and the latency of lookups and pages both ways. SQLite runs
+in-process, so the database numbers are a lower bound for MySQL over a
+network.
+
+Usage (from the ``Backend`` directory)::
+
+    python scripts/bench_snapshot.py --rows 300000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import crud  # noqa: E402
+from app.db import Base  # noqa: E402
+from app.models import Employee  # noqa: E402
+from app.snapshot import EmployeeSnapshot  # noqa: E402
+
+
+def seed(engine, rows: int) -> None:
+    rng = random.Random(42)
+    first_names = [f"First{i}" for i in range(1275)]
+    last_names = [f"Last{i}" for i in range(1637)]
+    batch = []
+    with engine.begin() as connection:
+        for emp_no in range(10001, 10001 + rows):
+            batch.append({
+                "emp_no": emp_no,
+                "birth_date": date(1952, 1, 1) + timedelta(days=rng.randrange(4700)),
+                "first_name": rng.choice(first_names),
+                "last_name": rng.choice(last_names),
+                "gender": rng.choice("MF"),
+                "hire_date": date(1985, 1, 1) + timedelta(days=rng.randrange(5000)),
+            })
+            if len(batch) == 10_000:
+                connection.execute(insert(Employee.__table__), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(Employee.__table__), batch)
+
+
+def per_op(iterations: int, call: Callable[[int], object]) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        call(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory employee snapshot")
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="Cross-check memory with tracemalloc"
+    )
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{directory}/bench.db")
+        Base.metadata.create_all(engine)
+        seed(engine, args.rows)
+        factory = sessionmaker(bind=engine)
+
+        with factory() as session:
+            snapshot = EmployeeSnapshot.load(session)
+        stats = snapshot.stats()
+        print(
+            f"snapshot: {stats['rows']:,} rows loaded in {stats['load_seconds']:.2f}s, "
+            f"{stats['bytes_per_row']} bytes/row ({stats['bytes'] / 2**20:.1f} MiB)"
+        )
+        if args.trace_memory:
+            tracemalloc.start()  # slows the load down several times
+            with factory() as session:
+                second = EmployeeSnapshot.load(session)
+            traced, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del second
+            print(f"traced allocations of a second load: {traced / stats['rows']:.1f} bytes/row")
+
+        rng = random.Random(1)
+        emp_nos = [rng.randrange(10001, 10001 + args.rows) for _ in range(args.iterations)]
+        offsets = [rng.randrange(0, 1000) for _ in range(args.iterations)]
+        workloads = {
+            "get by emp_no": (
+                lambda s, i: crud.get_employee(s, emp_nos[i]),
+                lambda i: snapshot.get(emp_nos[i]),
+            ),
+            "page sort=emp_no": (
+                lambda s, i: crud.get_employees(s, limit=20, offset=offsets[i]),
+                lambda i: snapshot.page(limit=20, offset=offsets[i]),
+            ),
+            "page gender=F sort=-hire_date": (
+                lambda s, i: crud.get_employees(
+                    s, limit=20, offset=offsets[i], filters=crud.EmployeeFilters(gender="F"),
+                    sort="-hire_date",
+                ),
+                lambda i: snapshot.page(
+                    limit=20, offset=offsets[i], filters=crud.EmployeeFilters(gender="F"),
+                    sort="-hire_date",
+                ),
+            ),
+            "page last_name prefix": (
+                lambda s, i: crud.get_employees(
+                    s, limit=20, filters=crud.EmployeeFilters(last_name_prefix="Last12"),
+                    sort="last_name",
+                ),
+                lambda i: snapshot.page(
+                    limit=20, filters=crud.EmployeeFilters(last_name_prefix="Last12"),
+                    sort="last_name",
+                ),
+            ),
+        }
+
+        print(f"{'operation':<32}{'database us':>14}{'snapshot us':>14}{'speedup':>10}")
+        for name, (from_database, from_snapshot) in workloads.items():
+            def database_request(i: int, query=from_database) -> None:
+                # One session per call, like one request.
+                with factory() as session:
+                    query(session, i)
+
+            database = per_op(args.iterations, database_request)
+            memory = per_op(args.iterations, from_snapshot)
+            print(f"{name:<32}{database:>14.1f}{memory:>14.1f}{database / memory:>9.0f}x")
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,612 @@
+"""Load generator for the Employees API.
+
+Runs one or more workload profiles against the real application and
+prints throughput and latency per operation. By default it seeds a
+file-backed SQLite database and starts the API itself (one uvicorn process
+under ``cProfile``, or ``--workers N`` through ``app.server``). Point
+``--database-url`` at a local MySQL/MariaDB instead to include the real
+driver and connection pool. Use ``--url`` to load an API you started
+yourself.
+
+Usage (from the ``Backend`` directory)::
+
+    python scripts/loadtest.py --profile all --duration 20 --concurrency 32
+    python scripts/loadtest.py --profile writes --database-url mysql+pymysql://root:pw@127.0.0.1:3307/loadtest
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --user admin:secret --profile listing
+
+Each scenario writes ``<scenario>.prof`` (when profiling) and a combined
+``report.json`` to ``--output``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import pstats
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+FIRST_EMP_NO = 10001
+LAST_NAMES = ("Facello", "Simmel", "Bamford", "Koblick", "Maliniak", "Preusig", "Zielinski", "Kalloufi")
+FIRST_NAMES = ("Georgi", "Bezalel", "Parto", "Chirstian", "Kyoichi", "Anneke", "Tzvetan", "Saniya")
+PASSWORD = "loadtest"
+
+
+# -- workload --------------------------------------------------------------
+@dataclass(frozen=True)
+class Profile:
+    """A weighted mix of operations, optionally issued in on/off bursts."""
+
+    name: str
+    description: str
+    mix: dict[str, float]
+    burst: Optional[tuple[float, float]] = None  # (seconds on, seconds off)
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in (
+        Profile("listing", "read-heavy paginated listing", {"list_page": 1.0}),
+        Profile("lookups", "point lookups by emp_no", {"get_employee": 1.0}),
+        Profile("writes", "last-name updates in bursts", {"update_last_name": 1.0}, burst=(2.0, 1.0)),
+        Profile("sessions", "session start/end churn", {"session_churn": 1.0}),
+        Profile(
+            "mixed",
+            "typical blend of all operations",
+            {"list_page": 0.5, "get_employee": 0.35, "update_last_name": 0.1, "session_churn": 0.05},
+        ),
+    )
+}
+
+
+@dataclass
+class VirtualUser:
+    username: str
+    password: str
+    rng: random.Random
+    session_id: Optional[str] = None
+
+    @property
+    def auth(self) -> tuple[str, str]:
+        return (self.username, self.password)
+
+
+@dataclass
+class OperationStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    transport_errors: int = 0
+
+
+class Recorder:
+    """Collect latencies and outcomes per operation."""
+
+    def __init__(self) -> None:
+        self.operations: dict[str, OperationStats] = {}
+
+    def record(self, operation: str, latency: float, status: Optional[int]) -> None:
+        stats = self.operations.setdefault(operation, OperationStats())
+        stats.latencies.append(latency)
+        if status is None:
+            stats.transport_errors += 1
+        else:
+            stats.statuses[status] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for operation, stats in sorted(self.operations.items()):
+            latencies = sorted(stats.latencies)
+            ok = sum(count for status, count in stats.statuses.items() if status < 400)
+            result[operation] = {
+                "requests": len(latencies),
+                "ok": ok,
+                "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+                "statuses": {str(status): count for status, count in sorted(stats.statuses.items())},
+                "transport_errors": stats.transport_errors,
+                "latency_ms": {
+                    "mean": round(1000 * sum(latencies) / len(latencies), 2) if latencies else None,
+                    "p50": _ms(percentile(latencies, 50)),
+                    "p90": _ms(percentile(latencies, 90)),
+                    "p99": _ms(percentile(latencies, 99)),
+                    "max": _ms(latencies[-1] if latencies else None),
+                },
+            }
+        return result
+
+
+def percentile(sorted_values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+async def _ensure_session(client: httpx.AsyncClient, user: VirtualUser) -> Optional[int]:
+    if user.session_id is not None:
+        return None
+    response = await client.post("/sessions/start", auth=user.auth)
+    if response.status_code == 200:
+        user.session_id = response.json()["session_id"]
+        return None
+    return response.status_code
+
+
+async def op_list_page(client: httpx.AsyncClient, user: VirtualUser, employees: int) -> int:
+    rng = user.rng
+    params: dict[str, object] = {"limit": rng.choice((10, 25, 50)), "offset": rng.randrange(0, 500)}
+    variant = rng.random()
+    if variant < 0.3:
+        params["gender"] = rng.choice("MF")
+    elif variant < 0.5:
+        params["sort"] = rng.choice(("hire_date", "-hire_date", "last_name"))
+    elif variant < 0.6:
+        # Prefix filters are ranges on last_name, which must then be the sort key.
+        params["last_name_prefix"] = rng.choice(LAST_NAMES)[:3]
+        params["sort"] = "last_name"
+    if rng.random() < 0.2:
+        params["include_total"] = "true"
+    response = await client.get("/employees", params=params, auth=user.auth)
+    return response.status_code
+
+
+async def op_get_employee(client: httpx.AsyncClient, user: VirtualUser, employees: int) -> int:
+    failed = await _ensure_session(client, user)
+    if failed is not None:
+        return failed
+    emp_no = FIRST_EMP_NO + user.rng.randrange(employees)
+    response = await client.get(
+        f"/employees/{emp_no}", auth=user.auth, headers={"X-Session-Id": user.session_id}
+    )
+    if response.status_code == 401:
+        user.session_id = None
+    return response.status_code
+
+
+async def op_update_last_name(client: httpx.AsyncClient, user: VirtualUser, employees: int) -> int:
+    failed = await _ensure_session(client, user)
+    if failed is not None:
+        return failed
+    # A small hot set makes writers collide the way real edits do.
+    emp_no = FIRST_EMP_NO + user.rng.randrange(min(employees, 50))
+    response = await client.put(
+        f"/employees/{emp_no}/last-name",
+        json={"last_name": user.rng.choice(LAST_NAMES)},
+        auth=user.auth,
+        headers={"X-Session-Id": user.session_id, "Idempotency-Key": uuid.uuid4().hex},
+    )
+    if response.status_code == 401:
+        user.session_id = None
+    return response.status_code
+
+
+async def op_session_churn(client: httpx.AsyncClient, user: VirtualUser, employees: int) -> int:
+    response = await client.post("/sessions/start", auth=user.auth)
+    if response.status_code != 200:
+        return response.status_code
+    session_id = response.json()["session_id"]
+    response = await client.post(
+        "/sessions/end", auth=user.auth, headers={"X-Session-Id": session_id}
+    )
+    user.session_id = None
+    return response.status_code
+
+
+OPERATIONS: dict[str, Callable[[httpx.AsyncClient, VirtualUser, int], Awaitable[int]]] = {
+    "list_page": op_list_page,
+    "get_employee": op_get_employee,
+    "update_last_name": op_update_last_name,
+    "session_churn": op_session_churn,
+}
+
+
+async def _timed(
+    operation: str,
+    client: httpx.AsyncClient,
+    user: VirtualUser,
+    employees: int,
+    recorder: Recorder,
+    started: float,
+) -> None:
+    try:
+        status = await OPERATIONS[operation](client, user, employees)
+    except httpx.HTTPError:
+        status = None
+    recorder.record(operation, time.perf_counter() - started, status)
+
+
+def _pick(profile: Profile, rng: random.Random) -> str:
+    names = list(profile.mix)
+    return rng.choices(names, weights=[profile.mix[name] for name in names])[0]
+
+
+def _in_burst(profile: Profile, elapsed: float) -> bool:
+    if profile.burst is None:
+        return True
+    on, off = profile.burst
+    return elapsed % (on + off) < on
+
+
+async def run_workload(
+    base_url: str,
+    profile: Profile,
+    users: list[VirtualUser],
+    *,
+    duration: float,
+    employees: int,
+    rate: Optional[float] = None,
+    timeout: float = 30.0,
+) -> dict:
+    """Drive ``profile`` against ``base_url`` and return its summary.
+
+    Closed loop by default: every virtual user issues its next request as
+    soon as the previous one finishes. With ``rate`` requests are scheduled
+    at fixed intervals instead and latency is measured from the scheduled
+    time, so a slow server cannot hide its queueing delay.
+    """
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=len(users), max_keepalive_connections=len(users))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        begin = time.perf_counter()
+        deadline = begin + duration
+
+        if rate is None:
+
+            async def closed_loop(user: VirtualUser) -> None:
+                while (now := time.perf_counter()) < deadline:
+                    if not _in_burst(profile, now - begin):
+                        await asyncio.sleep(0.05)
+                        continue
+                    await _timed(_pick(profile, user.rng), client, user, employees, recorder, now)
+
+            await asyncio.gather(*(closed_loop(user) for user in users))
+        else:
+            idle: asyncio.Queue[VirtualUser] = asyncio.Queue()
+            for user in users:
+                idle.put_nowait(user)
+            tasks = set()
+
+            async def issue(scheduled: float) -> None:
+                user = await idle.get()
+                try:
+                    await _timed(_pick(profile, user.rng), client, user, employees, recorder, scheduled)
+                finally:
+                    idle.put_nowait(user)
+
+            scheduled = begin
+            while scheduled < deadline:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if _in_burst(profile, scheduled - begin):
+                    task = asyncio.ensure_future(issue(scheduled))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                scheduled += 1.0 / rate
+            if tasks:
+                await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - begin
+
+    operations = recorder.summary(elapsed)
+    total = sum(op["requests"] for op in operations.values())
+    return {
+        "profile": profile.name,
+        "description": profile.description,
+        "mode": "closed" if rate is None else f"open@{rate}rps",
+        "concurrency": len(users),
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "operations": operations,
+    }
+
+
+# -- environment -----------------------------------------------------------
+def seed_database(database_url: str, employees: int, *, seed: int = 42) -> int:
+    """Create the schema and insert ``employees`` synthetic rows if the table is empty."""
+
+    from sqlalchemy import create_engine, func, insert, select
+
+    from app.db import Base
+    from app.models import Employee
+
+    engine = create_engine(database_url, future=True)
+    try:
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            existing = connection.execute(select(func.count()).select_from(Employee)).scalar_one()
+            if existing:
+                return existing
+            rng = random.Random(seed)
+            rows = [
+                {
+                    "emp_no": FIRST_EMP_NO + index,
+                    "birth_date": date(1952, 1, 1) + timedelta(days=rng.randrange(4000)),
+                    "first_name": rng.choice(FIRST_NAMES),
+                    "last_name": rng.choice(LAST_NAMES),
+                    "gender": rng.choice("MF"),
+                    "hire_date": date(1985, 1, 1) + timedelta(days=rng.randrange(5000)),
+                }
+                for index in range(employees)
+            ]
+            for start in range(0, len(rows), 5000):
+                connection.execute(insert(Employee), rows[start:start + 5000])
+        return employees
+    finally:
+        engine.dispose()
+
+
+def write_secrets(path: Path, usernames: list[str], rounds: int) -> None:
+    """Write a secrets file granting every user write access, reusing it when unchanged."""
+
+    import bcrypt
+
+    if path.exists():
+        existing = json.loads(path.read_text(encoding="utf-8"))
+        if existing.get("rounds") == rounds and set(existing.get("users", {})) == set(usernames):
+            return
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+    payload = {
+        "algorithm": "bcrypt",
+        "rounds": rounds,
+        "users": {username: {"hash": hashed, "access": "wr"} for username in usernames},
+    }
+    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerProcess:
+    """Run the API in a child process configured for load testing."""
+
+    def __init__(
+        self,
+        *,
+        database_url: str,
+        secrets_file: Path,
+        workdir: Path,
+        workers: int = 1,
+        profile_path: Optional[Path] = None,
+        extra_env: Optional[dict[str, str]] = None,
+    ) -> None:
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.profile_path = profile_path
+        self.env = {
+            **os.environ,
+            "PYTHONPATH": str(BACKEND_DIR),
+            "DATABASE_URL": database_url,
+            "SECRETS_FILE": str(secrets_file),
+            "AUDIT_LOG_DIR": str(workdir / "audit"),
+            "RATE_LIMIT_ENABLED": "0",
+            "PRECOMPRESS_STATIC": "0",
+            **(extra_env or {}),
+        }
+        if profile_path is not None:
+            # The profiler only sees the process it runs in, so profiling uses one worker.
+            self.command = [
+                sys.executable, str(Path(__file__).resolve()),
+                "--serve-profiled", str(self.port), "--profile-out", str(profile_path),
+            ]
+        else:
+            self.command = [
+                sys.executable, "-m", "app.server", "--port", str(self.port),
+                "--workers", str(workers), "--log-level", "warning",
+            ]
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "ServerProcess":
+        self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"API exited with status {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/", timeout=1.0).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("API did not start within 60 seconds")
+
+    def __exit__(self, *_exc) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        # SIGINT lets uvicorn shut down cleanly so cProfile writes its file.
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+def serve_profiled(port: int, output: Path) -> None:
+    """Run the API in this process with every thread under ``cProfile``.
+
+    A plain ``python -m cProfile`` only profiles the main thread and would
+    miss all work done in the threadpool (database calls, password checks).
+    Here each thread enables its own profiler when it starts; they are
+    merged into ``output`` when uvicorn shuts down.
+    """
+
+    import cProfile
+    import threading
+
+    import uvicorn
+
+    profiles: list[cProfile.Profile] = []
+    lock = threading.Lock()
+
+    def profile_new_thread(*_args) -> None:
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()  # replaces this hook for the calling thread
+
+    main_profile = cProfile.Profile()
+    threading.setprofile(profile_new_thread)
+    main_profile.enable()
+    try:
+        uvicorn.run("main:app", host="127.0.0.1", port=port, log_level="warning")
+    finally:
+        main_profile.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(main_profile)
+        with lock:
+            for profile in profiles:
+                profile.disable()
+                stats.add(profile)
+        stats.dump_stats(str(output))
+
+
+def profile_summary(path: Path, limit: int = 25) -> str:
+    """Return the top ``limit`` functions by own and by cumulative time."""
+
+    import io
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(str(path), stream=buffer)
+    stats.sort_stats("tottime").print_stats(limit)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return buffer.getvalue()
+
+
+def print_report(result: dict) -> None:
+    print(
+        f"\n== {result['profile']} ({result['description']}, {result['mode']}, "
+        f"{result['concurrency']} users): {result['requests']} requests, "
+        f"{result['throughput_rps']} req/s"
+    )
+    print(f"{'operation':<18}{'req/s':>9}{'ok':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+    for name, op in result["operations"].items():
+        latency = op["latency_ms"]
+        print(
+            f"{name:<18}{op['throughput_rps']:>9}{op['ok']:>8}{latency['p50']!s:>10}"
+            f"{latency['p90']!s:>10}{latency['p99']!s:>10}{latency['max']!s:>10}  "
+            f"{op['statuses']}" + (f" transport errors: {op['transport_errors']}" if op["transport_errors"] else "")
+        )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the Employees API")
+    parser.add_argument("--profile", default="mixed", help=f"one of {', '.join(PROFILES)} or 'all'")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop requests per second")
+    parser.add_argument("--employees", type=int, default=10_000, help="rows to seed")
+    parser.add_argument("--output", type=Path, default=Path("loadtest-results"))
+    parser.add_argument("--url", default=None, help="load an already running API instead")
+    parser.add_argument("--user", action="append", default=[], help="username:password for --url")
+    parser.add_argument("--database-url", default=None, help="SQLAlchemy URL (default: SQLite file)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--no-profile", action="store_true", help="skip cProfile")
+    parser.add_argument(
+        "--bcrypt-rounds", type=int, default=12,
+        help="cost of the generated password hashes (production uses 12)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--serve-profiled", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--profile-out", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_profiled:
+        serve_profiled(args.serve_profiled, args.profile_out)
+        return 0
+
+    names = list(PROFILES) if args.profile == "all" else [args.profile]
+    unknown = [name for name in names if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profile(s): {', '.join(unknown)}")
+    args.output.mkdir(parents=True, exist_ok=True)
+    workdir = args.output.resolve()
+
+    if args.url:
+        if not args.user:
+            parser.error("--url needs at least one --user username:password")
+        credentials = [entry.split(":", 1) for entry in args.user]
+        usernames = [username for username, _ in credentials]
+        passwords = dict(credentials)
+    else:
+        database_url = args.database_url or f"sqlite:///{workdir / 'employees.db'}"
+        seeded = seed_database(database_url, args.employees, seed=args.seed)
+        print(f"Database ready with {seeded} employees ({database_url.split('@')[-1]})")
+        usernames = [f"loadtest{index:03d}" for index in range(args.concurrency)]
+        passwords = {username: PASSWORD for username in usernames}
+        secrets_file = workdir / "secrets.json"
+        write_secrets(secrets_file, usernames, args.bcrypt_rounds)
+
+    results = []
+    for name in names:
+        profile = PROFILES[name]
+        rng = random.Random(f"{args.seed}:{name}")
+        users = [
+            VirtualUser(
+                usernames[index % len(usernames)],
+                passwords[usernames[index % len(usernames)]],
+                random.Random(rng.random()),
+            )
+            for index in range(args.concurrency)
+        ]
+        run = lambda url: asyncio.run(  # noqa: E731
+            run_workload(url, profile, users, duration=args.duration,
+                         employees=args.employees, rate=args.rate)
+        )
+        if args.url:
+            result = run(args.url)
+        else:
+            profile_path = None if args.no_profile else workdir / f"{name}.prof"
+            with ServerProcess(
+                database_url=database_url,
+                secrets_file=secrets_file,
+                workdir=workdir,
+                workers=args.workers,
+                profile_path=profile_path,
+            ) as server:
+                result = run(server.url)
+            if profile_path is not None and profile_path.exists():
+                result["cpu_profile"] = str(profile_path)
+                (workdir / f"{name}.profile.txt").write_text(
+                    profile_summary(profile_path), encoding="utf-8"
+                )
+        print_report(result)
+        results.append(result)
+
+    report_path = workdir / "report.json"
+    report_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nReport written to {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
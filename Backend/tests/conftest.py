@@ -28,6 +28,7 @@ from sqlalchemy.orm import sessionmaker
 from app import deps
 from app.auth.security import AccessLevel, Principal, reload_secrets_cache
 from app.config import settings
+from app.counts import CountCache
 from app.db import AccessControlledSession, Base
 from app.models import Employee
 from app.session_manager import SessionRegistry
@@ -102,6 +103,51 @@ def isolate_session_registry(monkeypatch):
     yield registry
 
 
+@pytest.fixture(autouse=True)
+def isolate_count_cache(monkeypatch):
+    cache = CountCache(ttl=60, estimate_refresh=300)
+    monkeypatch.setattr("app.counts.count_cache", cache)
+    monkeypatch.setattr("app.crud.count_cache", cache)
+    yield cache
+
+
+@pytest.fixture(autouse=True)
+def isolate_page_cache(monkeypatch):
+    from app.page_cache import PageCache
+
+    cache = PageCache(max_entries=64, max_age=5)
+    monkeypatch.setattr("app.page_cache.list_pages", cache)
+    monkeypatch.setattr("app.crud.list_pages", cache)
+    yield cache
+
+
+@pytest.fixture(autouse=True)
+def isolate_headcounts(monkeypatch):
+    from app.aggregates import HeadcountAggregate
+
+    headcounts = HeadcountAggregate(rebuild_interval=3600)
+    monkeypatch.setattr("app.aggregates.headcounts", headcounts)
+    yield headcounts
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    from app.rate_limit import rate_limiter
+
+    rate_limiter.reset()
+    yield rate_limiter
+    rate_limiter.reset()
+
+
+@pytest.fixture(autouse=True)
+def reset_idempotency_store():
+    from app.idempotency import idempotency_store
+
+    idempotency_store.clear()
+    yield idempotency_store
+    idempotency_store.clear()
+
+
 @pytest.fixture
 def set_active_principal(monkeypatch):
     def _setter(access_level: AccessLevel | None):
@@ -157,6 +203,7 @@ def api_client(session_factory, temp_secrets_file, isolate_session_registry):
             session.close()
 
     app.dependency_overrides[deps.get_db] = override_get_db
+    app.dependency_overrides[deps.get_session_factory] = lambda: session_factory
 
     client = TestClient(app)
     yield client
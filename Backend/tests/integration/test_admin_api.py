@@ -0,0 +1,46 @@
+from fastapi import status
+
+from app.config import settings
+
+
+def _session(api_client, creds):
+    session_id = api_client.post("/sessions/start", auth=creds).json()["session_id"]
+    return {"X-Session-Id": session_id}
+
+
+def test_profiler_is_admin_only_and_opt_in(api_client, golden_employee, monkeypatch):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    analyst_creds = ("analyst", golden_employee["users"]["analyst"]["password"])
+
+    admin_headers = _session(api_client, admin_creds)
+    disabled = api_client.get("/admin/profile?seconds=0.1", auth=admin_creds, headers=admin_headers)
+    assert disabled.status_code == status.HTTP_404_NOT_FOUND
+
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", True)
+    forbidden = api_client.get(
+        "/admin/profile?seconds=0.1", auth=analyst_creds, headers=_session(api_client, analyst_creds)
+    )
+    assert forbidden.status_code == status.HTTP_403_FORBIDDEN
+
+    too_long = api_client.get("/admin/profile?seconds=3600", auth=admin_creds, headers=admin_headers)
+    assert too_long.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = api_client.get(
+        "/admin/profile?seconds=0.2&interval_ms=2&idle=true", auth=admin_creds, headers=admin_headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    stack, count = response.text.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+
+def test_statement_cache_stats(api_client, golden_employee, sqlite_engine, monkeypatch):
+    from app.routers import admin
+
+    monkeypatch.setattr(admin, "get_engine", lambda: sqlite_engine)
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    response = api_client.get(
+        "/admin/statement-cache", auth=admin_creds, headers=_session(api_client, admin_creds)
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert {"hits", "misses", "hit_ratio", "entries", "capacity"} <= response.json().keys()
@@ -0,0 +1,104 @@
+from fastapi import status
+
+
+def _start(api_client, golden_employee, user):
+    creds = (user, golden_employee["users"][user]["password"])
+    session_id = api_client.post("/sessions/start", auth=creds).json()["session_id"]
+    return {"auth": creds, "headers": {"X-Session-Id": session_id}}
+
+
+def test_batch_runs_operations_in_order(api_client, golden_employee):
+    admin = _start(api_client, golden_employee, "admin")
+
+    response = api_client.post(
+        "/batch",
+        json={
+            "operations": [
+                {"op": "get_employee", "emp_no": 10001},
+                {"op": "update_last_name", "emp_no": 10001, "last_name": "Batched"},
+                {"op": "update_last_name", "emp_no": 99999, "last_name": "Nobody"},
+                {"op": "get_employee", "emp_no": 10001, "fields": "last_name,gender"},
+                {"op": "list_employees", "limit": 2, "sort": "-emp_no"},
+                {"op": "list_employees", "sort": "first_name"},
+            ]
+        },
+        **admin,
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["committed"] is True
+    statuses = [result["status"] for result in body["results"]]
+    assert statuses == [200, 200, 404, 200, 200, 400]
+    results = [result["body"] for result in body["results"]]
+    assert results[0]["last_name"] == "Facello"
+    assert results[1]["last_name"] == "Batched"
+    assert results[1]["version"] != results[0]["version"]
+    assert results[3] == {"last_name": "Batched", "gender": "M"}
+    assert [row["emp_no"] for row in results[4]] == [10003, 10002]
+
+
+def test_atomic_batch_rolls_back_when_an_operation_fails(api_client, golden_employee):
+    admin = _start(api_client, golden_employee, "admin")
+
+    response = api_client.post(
+        "/batch",
+        json={
+            "atomic": True,
+            "operations": [
+                {"op": "update_last_name", "emp_no": 10001, "last_name": "Together"},
+                {"op": "get_employee", "emp_no": 10001, "fields": "last_name"},
+                {"op": "update_last_name", "emp_no": 10002, "last_name": "Late", "if_match": "stale"},
+                {"op": "update_last_name", "emp_no": 10003, "last_name": "Skipped"},
+            ],
+        },
+        **admin,
+    )
+
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [200, 200, 409, 424]
+    assert body["results"][1]["body"] == {"last_name": "Together"}  # read its own write
+    current = api_client.get("/employees/10001", **admin).json()
+    assert current["last_name"] == "Facello"
+
+    response = api_client.post(
+        "/batch",
+        json={
+            "atomic": True,
+            "operations": [
+                {"op": "update_last_name", "emp_no": 10001, "last_name": "Together"},
+                {"op": "update_last_name", "emp_no": 10002, "last_name": "Together"},
+            ],
+        },
+        **admin,
+    )
+    assert response.json()["committed"] is True
+    for emp_no in (10001, 10002):
+        assert api_client.get(f"/employees/{emp_no}", **admin).json()["last_name"] == "Together"
+
+
+def test_batch_enforces_access_levels_and_sessions(api_client, golden_employee):
+    analyst = _start(api_client, golden_employee, "analyst")
+    operations = [
+        {"op": "update_last_name", "emp_no": 10001, "last_name": "Nope"},
+        {"op": "get_employee", "emp_no": 10001},
+    ]
+
+    response = api_client.post("/batch", json={"operations": operations}, **analyst)
+    assert [result["status"] for result in response.json()["results"]] == [403, 200]
+    assert response.json()["results"][1]["body"]["last_name"] == "Facello"
+
+    atomic = api_client.post(
+        "/batch", json={"atomic": True, "operations": operations[1:]}, **analyst
+    )
+    assert atomic.json()["committed"] is True
+
+    no_session = api_client.post(
+        "/batch", json={"operations": operations}, auth=analyst["auth"]
+    )
+    assert no_session.status_code == status.HTTP_400_BAD_REQUEST
+    unknown = api_client.post(
+        "/batch", json={"operations": [{"op": "drop_table"}]}, **analyst
+    )
+    assert unknown.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -1,3 +1,6 @@
+import asyncio
+import time
+
 from fastapi import status
 
 
@@ -61,3 +64,471 @@ def test_employee_workflow(api_client, golden_employee):
         auth=analyst_creds,
         headers={"X-Session-Id": analyst_session_id},
     )
+
+
+def test_list_employees_filters_and_rejects_unindexed_sorts(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+
+    response = api_client.get(
+        "/employees",
+        params={"hire_date_from": "1986-01-01", "sort": "hire_date"},
+        auth=admin_creds,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [emp["emp_no"] for emp in response.json()] == [10001, 10003]
+
+    response = api_client.get("/employees", params={"sort": "first_name"}, auth=admin_creds)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_list_employees_total_count_headers(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+
+    response = api_client.get("/employees", params={"limit": 1}, auth=admin_creds)
+    assert "X-Total-Count" not in response.headers
+
+    response = api_client.get(
+        "/employees", params={"limit": 1, "include_total": "true"}, auth=admin_creds
+    )
+    assert response.headers["X-Total-Count"] == "3"
+    assert response.headers["X-Total-Count-Exact"] == "false"
+
+    params = {"gender": "M", "include_total": "true"}
+    response = api_client.get("/employees", params=params, auth=admin_creds)
+    assert "X-Total-Count" not in response.headers
+
+    response = api_client.get(
+        "/employees", params={**params, "total_mode": "exact"}, auth=admin_creds
+    )
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.headers["X-Total-Count-Exact"] == "true"
+
+    response = api_client.get("/employees", params=params, auth=admin_creds)
+    assert response.headers["X-Total-Count"] == "2"
+
+
+def test_list_pages_are_cacheable_and_revalidated(
+    api_client, golden_employee, isolate_page_cache, monkeypatch
+):
+    from app.singleflight import employee_reads
+
+    flight_keys = []
+    share = employee_reads.do
+
+    async def record(key, fn):
+        flight_keys.append(key)
+        return await share(key, fn)
+
+    monkeypatch.setattr(employee_reads, "do", record)
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+
+    first = api_client.get("/employees", auth=admin_creds)
+    assert first.headers["Cache-Control"] == "public, s-maxage=5, max-age=5"
+    assert "Authorization" in first.headers["Vary"]
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    # Lists carry no version; fields=...,version asks for it explicitly.
+    assert first.json()[0] == {"emp_no": 10001, "first_name": "Georgi", "last_name": "Facello"}
+
+    again = api_client.get("/employees", auth=admin_creds, headers={"If-None-Match": etag})
+    assert again.status_code == status.HTTP_304_NOT_MODIFIED
+    assert again.headers["ETag"] == etag
+    assert isolate_page_cache.stats()["hits"] == 1
+
+    counted = api_client.get("/employees", auth=admin_creds, params={"include_total": True})
+    assert counted.headers["ETag"] != etag
+
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    api_client.put(
+        "/employees/10001/last-name", json={"last_name": "Cached"},
+        auth=admin_creds, headers={"X-Session-Id": session_id},
+    )
+    changed = api_client.get("/employees", auth=admin_creds, headers={"If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.json()[0]["last_name"] == "Cached"
+    assert changed.headers["ETag"] != etag
+    # A query in flight before the write is never joined after it.
+    assert flight_keys[0] != flight_keys[-1] and flight_keys[0][:-1] == flight_keys[-1][:-1]
+
+
+def test_cached_pages_are_served_while_the_breaker_is_open(
+    api_client, golden_employee, isolate_page_cache, monkeypatch
+):
+    from app import deps
+
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    assert api_client.get("/employees", auth=admin_creds).status_code == status.HTTP_200_OK
+    monkeypatch.setattr(deps.db_breaker, "probe", lambda: None)
+    monkeypatch.setattr(deps.db_breaker, "probe_interval", 60)
+    for _ in range(deps.db_breaker.failure_threshold):
+        deps.db_breaker.record_failure()
+    try:
+        assert api_client.get("/employees", auth=admin_creds).status_code == status.HTTP_200_OK
+        uncached = api_client.get("/employees?limit=3", auth=admin_creds)
+        assert uncached.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    finally:
+        deps.db_breaker.reset()
+
+
+def test_last_name_changes_are_audited(api_client, golden_employee, tmp_path, monkeypatch):
+    from app import audit
+
+    log = audit.AuditLog(tmp_path, flush_interval=0.01)
+    log.start()
+    monkeypatch.setattr(audit, "_audit_log", log)
+    try:
+        admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+        session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+        headers = {"X-Session-Id": session_id}
+
+        response = api_client.put(
+            "/employees/10002/last-name", json={"last_name": "Audited"},
+            auth=admin_creds, headers=headers,
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        history = []
+        for _ in range(200):
+            history = api_client.get(
+                "/employees/10002/history", auth=admin_creds, headers=headers
+            ).json()
+            if history:
+                break
+            time.sleep(0.01)
+        assert history[0]["principal"] == "admin"
+        assert (history[0]["old"], history[0]["new"]) == ("Simmel", "Audited")
+    finally:
+        log.close()
+
+
+async def test_last_name_update_is_pushed_to_subscribers(api_client, golden_employee):
+    from app import events
+
+    subscription = events.change_hub.subscribe(frozenset({10003}))
+    try:
+        admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+
+        def update():
+            session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+            return api_client.put(
+                "/employees/10003/last-name", json={"last_name": "Pushed"},
+                auth=admin_creds, headers={"X-Session-Id": session_id},
+            )
+
+        response = await asyncio.get_running_loop().run_in_executor(None, update)
+        assert response.status_code == status.HTTP_200_OK
+
+        change = await asyncio.wait_for(subscription.events(1.0).__anext__(), 2.0)
+        assert (change.emp_no, change.old, change.new) == (10003, "Bamford", "Pushed")
+        assert change.principal == "admin"
+    finally:
+        events.change_hub.unsubscribe(subscription)
+
+
+def test_change_stream_rejects_too_many_employees(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    query = "&".join(f"emp_no={n}" for n in range(10001, 10102))
+    response = api_client.get(
+        f"/employees/changes?{query}", auth=admin_creds, headers={"X-Session-Id": session_id}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_reads_after_a_write_do_not_join_an_older_flight(
+    api_client, golden_employee, isolate_page_cache, monkeypatch
+):
+    import threading
+
+    from app.routers import employees as employees_router
+
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    headers = {"X-Session-Id": session_id}
+    entered, release = threading.Event(), threading.Event()
+    load = employees_router._load_employee
+
+    def slow_first_load(db, emp_no):
+        employee = load(db, emp_no)
+        if not entered.is_set():
+            entered.set()
+            release.wait(5)
+        return employee
+
+    monkeypatch.setattr(employees_router, "_load_employee", slow_first_load)
+    responses = {}
+
+    def get(name):
+        responses[name] = api_client.get("/employees/10002", auth=admin_creds, headers=headers)
+
+    before = threading.Thread(target=get, args=("before",))
+    before.start()
+    try:
+        assert entered.wait(5)
+        put = api_client.put(
+            "/employees/10002/last-name", json={"last_name": "Newer"},
+            auth=admin_creds, headers=headers,
+        )
+        assert put.status_code == status.HTTP_200_OK
+        after = threading.Thread(target=get, args=("after",))
+        after.start()
+        after.join(5)
+        # It ran its own query rather than waiting for the older one.
+        assert not after.is_alive()
+        assert responses["after"].json()["last_name"] == "Newer"
+        assert responses["after"].json()["version"] == put.json()["version"]
+    finally:
+        release.set()
+        before.join(5)
+    assert responses["before"].json()["last_name"] == "Simmel"
+
+
+def test_stale_if_match_is_rejected_with_conflict(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    headers = {"X-Session-Id": session_id}
+
+    loaded = api_client.get("/employees/10001", auth=admin_creds, headers=headers)
+    etag = loaded.headers["ETag"]
+    assert etag == f'"{loaded.json()["version"]}"'
+
+    first = api_client.put(
+        "/employees/10001/last-name", json={"last_name": "First"},
+        auth=admin_creds, headers={**headers, "If-Match": etag},
+    )
+    assert first.status_code == status.HTTP_200_OK
+    assert first.headers["ETag"] != etag
+
+    stale = api_client.put(
+        "/employees/10001/last-name", json={"last_name": "Second"},
+        auth=admin_creds, headers={**headers, "If-Match": etag},
+    )
+    assert stale.status_code == status.HTTP_409_CONFLICT
+    assert stale.json()["detail"]["current"]["last_name"] == "First"
+    assert stale.headers["ETag"] == first.headers["ETag"]
+
+
+def test_retried_writes_with_idempotency_key_are_replayed(api_client, golden_employee, monkeypatch):
+    from app import crud
+
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    start = [
+        api_client.post("/sessions/start", auth=admin_creds, headers={"Idempotency-Key": "login-1"})
+        for _ in range(2)
+    ]
+    assert start[0].json() == start[1].json()
+    assert start[1].json()["replaced"] is False
+    assert start[1].headers["Idempotent-Replayed"] == "true"
+    session_id = start[0].json()["session_id"]
+
+    calls = []
+    original = crud.update_employee_last_name
+    monkeypatch.setattr(
+        crud, "update_employee_last_name", lambda *a, **kw: calls.append(a) or original(*a, **kw)
+    )
+    headers = {"X-Session-Id": session_id, "Idempotency-Key": "rename-1"}
+    updates = [
+        api_client.put(
+            "/employees/10001/last-name", json={"last_name": "Once"},
+            auth=admin_creds, headers=headers,
+        )
+        for _ in range(2)
+    ]
+    assert [u.status_code for u in updates] == [200, 200]
+    assert updates[0].json() == updates[1].json()
+    assert len(calls) == 1
+
+
+def test_bulk_import_streams_the_request_body(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    headers = {"X-Session-Id": session_id, "Content-Type": "text/csv"}
+
+    def body():
+        yield b"emp_no,birth_date,first_name,last_name,gender,hire_date\n"
+        for emp_no in range(20001, 20251):
+            yield f"{emp_no},1970-01-01,Bulk,Row{emp_no - 20000},M,1999-01-01\n".encode()
+
+    response = api_client.post(
+        "/employees/import?chunk_size=100", content=body(), auth=admin_creds, headers=headers
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["written"] == 250
+    assert response.json()["chunks"] == 3
+
+    conflict = api_client.post(
+        "/employees/import", content=body(), auth=admin_creds, headers=headers
+    )
+    assert conflict.status_code == status.HTTP_409_CONFLICT
+    assert conflict.json()["detail"]["written"] == 0
+
+    employee = api_client.get("/employees/20250", auth=admin_creds, headers=headers)
+    assert employee.json()["last_name"] == "Row250"
+
+
+def test_sparse_fieldsets(api_client, golden_employee):
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    page = api_client.get(
+        "/employees", params={"fields": "hire_date,emp_no", "limit": 2, "include_total": True},
+        auth=admin_creds
+    )
+    assert page.status_code == status.HTTP_200_OK
+    assert [sorted(item) for item in page.json()] == [["emp_no", "hire_date"]] * 2
+    assert "X-Total-Count" in page.headers
+
+    bogus = api_client.get("/employees", params={"fields": "emp_no,salary"}, auth=admin_creds)
+    assert bogus.status_code == status.HTTP_400_BAD_REQUEST
+
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    single = api_client.get(
+        "/employees/10001",
+        params={"fields": "version,emp_no"},
+        auth=admin_creds,
+        headers={"X-Session-Id": session_id},
+    )
+    assert single.status_code == status.HTTP_200_OK
+    assert sorted(single.json()) == ["emp_no", "version"]
+    assert single.headers["ETag"] == f'"{single.json()["version"]}"'
+
+
+def test_slow_queries_are_cut_off_at_the_request_deadline(
+    api_client, golden_employee, sqlite_engine, monkeypatch
+):
+    import time
+
+    from sqlalchemy import text
+
+    from app import crud, db
+
+    db._install_deadlines(sqlite_engine)
+    slow = text(
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) "
+        "SELECT count(*) FROM c"
+    )
+    get_employee = crud.get_employee
+
+    def slow_get_employee(session, emp_no):
+        session.execute(slow)
+        return get_employee(session, emp_no)
+
+    monkeypatch.setattr(crud, "get_employee", slow_get_employee)
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    headers = {"X-Session-Id": session_id}
+
+    started = time.perf_counter()
+    response = api_client.get(
+        "/employees/10001", auth=admin_creds, headers={**headers, "X-Request-Timeout": "1"}
+    )
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert time.perf_counter() - started < 4
+
+    # The connection went back to the pool and serves the next request.
+    monkeypatch.setattr(crud, "get_employee", get_employee)
+    response = api_client.get("/employees/10001", auth=admin_creds, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_stats_are_materialized_and_follow_imports(api_client, golden_employee, sqlite_engine):
+    from sqlalchemy import text
+
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    stats = api_client.get("/employees/stats", auth=admin_creds).json()
+    assert (stats["total"], stats["by_gender"]) == (3, {"F": 1, "M": 2})
+
+    # Writes outside the API are not seen until a recompute...
+    with sqlite_engine.begin() as connection:
+        connection.execute(text("DELETE FROM employees WHERE emp_no = 10003"))
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    imported = api_client.post(
+        "/employees/import",
+        content=b"emp_no,birth_date,first_name,last_name,gender,hire_date\n"
+        b"20001,1970-01-01,Ada,Lovelace,F,2001-02-03\n",
+        auth=admin_creds,
+        headers={"X-Session-Id": session_id},
+    )
+    assert imported.json()["written"] == 1
+    # ...while imported rows are counted without one.
+    stats = api_client.get("/employees/stats", auth=admin_creds).json()
+    assert (stats["total"], stats["by_gender"]) == (4, {"F": 2, "M": 2})
+    assert {"hire_year": 2001, "gender": "F", "headcount": 1} in stats["by_hire_year"]
+
+    stats = api_client.get("/employees/stats?refresh=true", auth=admin_creds).json()
+    assert (stats["total"], stats["by_gender"]) == (3, {"F": 2, "M": 1})
+
+
+def test_requests_are_routed_across_shards(api_client, golden_employee, tmp_path, monkeypatch):
+    from datetime import date
+
+    from app import sharding
+    from app.db import Base, create_database_engine
+    from app.models import Employee
+
+    shards = sharding.parse_shards(f"1=sqlite:///{tmp_path}/a.db;10002=sqlite:///{tmp_path}/b.db")
+    engines = [create_database_engine(shard.url) for shard in shards]
+    shard_set = sharding.ShardSet(shards, engines)
+    for engine in engines:
+        Base.metadata.create_all(engine)
+    for emp_no, last_name in ((10001, "Alpha"), (10002, "Beta"), (10003, "Aardvark")):
+        with shard_set.session_for(emp_no) as session:
+            session.add(Employee(
+                emp_no=emp_no, birth_date=date(1960, 1, 1), first_name="Shard",
+                last_name=last_name, gender="M", hire_date=date(1990, 1, 1),
+            ))
+            session.commit()
+    monkeypatch.setattr(sharding, "_shards", shard_set)
+    try:
+        admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+        page = api_client.get(
+            "/employees", params={"sort": "last_name", "include_total": True, "total_mode": "exact"},
+            auth=admin_creds,
+        )
+        assert [e["last_name"] for e in page.json()] == ["Aardvark", "Alpha", "Beta"]
+        assert page.headers["X-Total-Count"] == "3"
+
+        headers = {"X-Session-Id": api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]}
+        updated = api_client.put(
+            "/employees/10003/last-name", json={"last_name": "Zebra"}, auth=admin_creds, headers=headers
+        )
+        assert updated.status_code == status.HTTP_200_OK
+        assert api_client.get("/employees/10003", auth=admin_creds, headers=headers).json()[
+            "last_name"
+        ] == "Zebra"
+        with engines[0].connect() as connection:
+            assert connection.exec_driver_sql("SELECT count(*) FROM employees").scalar() == 1
+
+        rejected = api_client.post("/employees/import", content=b"", auth=admin_creds, headers=headers)
+        assert rejected.status_code == status.HTTP_400_BAD_REQUEST
+    finally:
+        shard_set.dispose()
+
+
+def test_reads_are_served_from_the_snapshot(
+    api_client, golden_employee, session_factory, sqlite_engine
+):
+    from sqlalchemy import text
+
+    from app import snapshot
+
+    snapshot.start_snapshot(session_factory, refresh=0)
+    try:
+        admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+        session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+        headers = {"X-Session-Id": session_id}
+        with sqlite_engine.begin() as connection:
+            connection.execute(text("DELETE FROM employees WHERE emp_no = 10003"))
+
+        response = api_client.get("/employees/10003", auth=admin_creds, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] == f'"{response.json()["version"]}"'
+
+        api_client.put(
+            "/employees/10001/last-name", json={"last_name": "Zzyzx"},
+            auth=admin_creds, headers=headers,
+        )
+        page = api_client.get(
+            "/employees", params={"sort": "-last_name", "limit": 1}, auth=admin_creds
+        )
+        assert [(e["emp_no"], e["last_name"]) for e in page.json()] == [(10001, "Zzyzx")]
+    finally:
+        snapshot.stop_snapshot()
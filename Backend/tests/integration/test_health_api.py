@@ -0,0 +1,26 @@
+from fastapi import status
+
+
+def test_ready_reflects_engine_and_breaker_state(api_client, sqlite_engine, monkeypatch):
+    from app import db
+
+    not_started = api_client.get("/health/ready")
+    assert not_started.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert not_started.json()["pool"] is None
+
+    monkeypatch.setattr(db, "_engine", sqlite_engine)
+    ready = api_client.get("/health/ready")
+    assert ready.status_code == status.HTTP_200_OK
+    assert ready.json()["status"] == "ready"
+    assert ready.json()["breaker"]["state"] == "closed"
+
+    monkeypatch.setattr(db.db_breaker, "probe", lambda: None)
+    monkeypatch.setattr(db.db_breaker, "probe_interval", 60)
+    for _ in range(db.db_breaker.failure_threshold):
+        db.db_breaker.record_failure()
+    try:
+        tripped = api_client.get("/health/ready")
+        assert tripped.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert tripped.json()["breaker"]["state"] == "open"
+    finally:
+        db.db_breaker.reset()
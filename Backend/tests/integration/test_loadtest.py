@@ -0,0 +1,59 @@
+import asyncio
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="starts a server process")
+
+SCRIPT = Path(__file__).resolve().parents[2] / "scripts" / "loadtest.py"
+
+
+@pytest.fixture(scope="module")
+def loadtest():
+    spec = importlib.util.spec_from_file_location("loadtest", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["loadtest"] = module  # dataclasses look their module up here
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_percentile_uses_nearest_rank(loadtest):
+    values = [float(v) for v in range(1, 101)]
+    assert loadtest.percentile(values, 50) == 50.0
+    assert loadtest.percentile(values, 99) == 99.0
+    assert loadtest.percentile([], 50) is None
+
+
+def test_mixed_profile_runs_against_a_profiled_server(loadtest, tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'employees.db'}"
+    assert loadtest.seed_database(database_url, 200) == 200
+    secrets_file = tmp_path / "secrets.json"
+    usernames = ["lt0", "lt1", "lt2"]
+    loadtest.write_secrets(secrets_file, usernames, rounds=4)
+    users = [
+        loadtest.VirtualUser(name, loadtest.PASSWORD, loadtest.random.Random(i))
+        for i, name in enumerate(usernames)
+    ]
+    profile_path = tmp_path / "mixed.prof"
+
+    with loadtest.ServerProcess(
+        database_url=database_url,
+        secrets_file=secrets_file,
+        workdir=tmp_path,
+        profile_path=profile_path,
+    ) as server:
+        result = asyncio.run(
+            loadtest.run_workload(
+                server.url, loadtest.PROFILES["mixed"], users, duration=1.0, employees=200
+            )
+        )
+
+    assert result["requests"] > 0
+    for operation in result["operations"].values():
+        assert operation["transport_errors"] == 0
+        assert all(int(status) < 500 for status in operation["statuses"])
+    assert "session_churn" in loadtest.PROFILES["mixed"].mix
+    assert "cumulative" in loadtest.profile_summary(profile_path)
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.db import AccessControlledSession, Base
+from app.models import Employee
+
+from tests.conftest import EMPLOYEE_FIXTURES
+
+WRITERS = 8
+INCREMENTS_PER_WRITER = 15
+
+
+@pytest.fixture
+def file_session_factory(tmp_path):
+    # A file database so every writer gets its own connection and transaction.
+    engine = create_engine(
+        f"sqlite+pysqlite:///{tmp_path / 'employees.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=AccessControlledSession, expire_on_commit=False)
+    with factory() as session:
+        session.add(Employee(**{**EMPLOYEE_FIXTURES[0], "last_name": "0"}))
+        session.commit()
+    yield factory
+    engine.dispose()
+
+
+def _increment(factory, emp_no: int) -> int:
+    """Read-modify-write a counter stored in last_name; return the conflicts seen."""
+
+    conflicts = 0
+    while True:
+        with factory() as session:
+            employee = crud.get_employee(session, emp_no)
+            version = crud.employee_version(employee)
+            try:
+                crud.update_employee_last_name(
+                    session, emp_no, str(int(employee.last_name) + 1),
+                    expected_version=version,
+                )
+                return conflicts
+            except crud.VersionConflictError:
+                conflicts += 1
+
+
+def test_concurrent_writers_never_lose_updates(file_session_factory):
+    emp_no = EMPLOYEE_FIXTURES[0]["emp_no"]
+    barrier = threading.Barrier(WRITERS)
+    conflicts = []
+
+    def writer():
+        barrier.wait()
+        seen = 0
+        for _ in range(INCREMENTS_PER_WRITER):
+            seen += _increment(file_session_factory, emp_no)
+        conflicts.append(seen)
+
+    threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+
+    assert len(conflicts) == WRITERS
+    with file_session_factory() as session:
+        final = int(crud.get_employee(session, emp_no).last_name)
+    # Every increment is applied exactly once, even though writers collided.
+    assert final == WRITERS * INCREMENTS_PER_WRITER
+
+
+def test_unconditional_update_retries_after_a_concurrent_change(file_session_factory, monkeypatch):
+    emp_no = EMPLOYEE_FIXTURES[0]["emp_no"]
+    original_execute = AccessControlledSession.execute
+    interfered = []
+    competing_writes = []
+
+    def execute(self, statement, *args, **kwargs):
+        # Sneak in a competing write between the read and the first CAS update.
+        if getattr(statement, "is_update", False) and not interfered:
+            interfered.append(True)
+            competing_writes.append(True)
+            with file_session_factory() as other:
+                other.get(Employee, emp_no).first_name = f"Changed{len(competing_writes)}"
+                other.commit()
+        return original_execute(self, statement, *args, **kwargs)
+
+    monkeypatch.setattr(AccessControlledSession, "execute", execute)
+    with file_session_factory() as session:
+        employee = crud.update_employee_last_name(session, emp_no, "Retried")
+    assert (employee.first_name, employee.last_name) == ("Changed1", "Retried")
+
+    interfered.clear()
+    with file_session_factory() as session:
+        stale = crud.employee_version(crud.get_employee(session, emp_no))
+    with file_session_factory() as session:
+        with pytest.raises(crud.VersionConflictError):
+            crud.update_employee_last_name(
+                session, emp_no, "Stale", expected_version=stale, max_attempts=1
+            )
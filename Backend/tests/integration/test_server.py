@@ -0,0 +1,159 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.server import (
+    MAX_RESPAWN_DELAY,
+    Supervisor,
+    create_listen_socket,
+    default_workers,
+    respawn_delay,
+    serve,
+)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_serving(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError(f"server at {url} did not start")
+
+
+@pytest.fixture
+def launch(tmp_path):
+    processes = []
+
+    def _launch(*args: str, **extra_env: str) -> tuple[subprocess.Popen, str]:
+        port = _free_port()
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(BACKEND_DIR),
+            "DB_POOL_PREWARM": "0",
+            "PRECOMPRESS_STATIC": "0",
+            "AUDIT_ENABLED": "0",
+            "SESSION_STORE": "sqlite",
+            "SESSION_STORE_FILE": str(tmp_path / "sessions.db"),
+            **extra_env,
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.server", "--port", str(port), "--log-level", "warning", *args],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        processes.append(process)
+        url = f"http://127.0.0.1:{port}/"
+        _wait_until_serving(url)
+        return process, url
+
+    yield _launch
+
+    for process in processes:
+        if process.poll() is None:
+            # SIGTERM lets the master stop its workers; SIGKILL would orphan them.
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+def test_default_workers_is_positive():
+    assert default_workers() >= 1
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="requires SO_REUSEPORT")
+def test_reuse_port_sockets_can_share_a_port():
+    first = create_listen_socket("127.0.0.1", 0, reuse_port=True)
+    try:
+        port = first.getsockname()[1]
+        second = create_listen_socket("127.0.0.1", port, reuse_port=True)
+        second.close()
+    finally:
+        first.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="requires SO_REUSEPORT")
+def test_released_slot_stops_taking_connections():
+    supervisor = Supervisor(port=_free_port(), workers=2, reuse_port=True)
+    supervisor._sockets = [None, None]
+    first, second = supervisor._slot_socket(0), supervisor._slot_socket(1)
+    try:
+        supervisor._release_slot(1)
+        assert supervisor._sockets[1] is None and second.fileno() == -1
+        # Every new connection now lands on the live slot's queue.
+        for _ in range(8):
+            with socket.create_connection(("127.0.0.1", supervisor.port), timeout=1.0):
+                pass
+            first.accept()[0].close()
+
+        reopened = supervisor._slot_socket(1)
+        assert reopened.getsockname()[1] == supervisor.port
+    finally:
+        for slot in range(2):
+            supervisor._release_slot(slot)
+
+
+def test_workers_serve_and_stop_gracefully(launch):
+    process, url = launch("--workers", "2")
+    for _ in range(5):
+        assert httpx.get(url, timeout=5.0).json()["ok"] is True
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=20) == 0
+
+
+def test_workers_are_recycled_without_dropping_requests(launch):
+    _, url = launch("--workers", "1", "--max-requests", "3")
+    statuses = [httpx.get(url, timeout=10.0).status_code for _ in range(10)]
+    assert statuses == [200] * 10
+
+
+def test_sessions_are_valid_on_every_worker(launch, temp_secrets_file):
+    secrets = temp_secrets_file({"admin": {"password": "pw", "access": "wr"}})
+    _, url = launch("--workers", "3", SECRETS_FILE=str(secrets))
+    session_id = httpx.post(f"{url}sessions/start", auth=("admin", "pw"), timeout=10.0).json()[
+        "session_id"
+    ]
+    # The audit log is disabled, so an accepted session gets 503 rather than 401.
+    statuses = {
+        httpx.get(
+            f"{url}employees/10001/history", auth=("admin", "pw"),
+            headers={"X-Session-Id": session_id}, timeout=10.0,
+        ).status_code
+        for _ in range(12)
+    }
+    assert statuses == {503}
+
+
+def test_multiple_workers_require_shared_sessions(monkeypatch):
+    monkeypatch.setattr("app.server.sessions_are_shared", lambda: False)
+    assert serve(workers=2) == 2
+
+
+def test_quick_exits_back_off():
+    assert respawn_delay(0) == 0
+    assert respawn_delay(1) < respawn_delay(2) < respawn_delay(3)
+    assert respawn_delay(100) == MAX_RESPAWN_DELAY
@@ -0,0 +1,55 @@
+from datetime import date
+
+from app import crud
+from app.aggregates import HeadcountAggregate
+from app.auth.security import AccessLevel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_headcounts_are_built_once_and_updated_in_place(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    clock = FakeClock()
+    headcounts = HeadcountAggregate(rebuild_interval=3600, clock=clock)
+    assert headcounts.needs_build(60)
+    with session_factory() as session:
+        headcounts.build(lambda: crud.count_by_gender_and_hire_year(session))
+    assert not headcounts.needs_build(60)
+    stats = headcounts.stats()
+    assert (stats["total"], stats["by_gender"], stats["stale"]) == (3, {"F": 1, "M": 2}, False)
+    assert [(b["hire_year"], b["gender"], b["headcount"]) for b in stats["by_hire_year"]] == [
+        (1985, "F", 1),
+        (1986, "M", 2),
+    ]
+
+    headcounts.add([("F", date(1986, 1, 1)), ("F", date(1999, 5, 5))])
+    stats = headcounts.stats()
+    assert stats["total"] == 5 and stats["by_gender"] == {"F": 3, "M": 2}
+    assert not headcounts.needs_build(0)
+
+
+def test_unknown_changes_are_served_until_the_staleness_bound(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    clock = FakeClock()
+    headcounts = HeadcountAggregate(rebuild_interval=3600, clock=clock)
+    with session_factory() as session:
+        headcounts.build(lambda: crud.count_by_gender_and_hire_year(session))
+    headcounts.invalidate()
+    assert headcounts.stats()["stale"]
+    clock.now += 30
+    assert not headcounts.needs_build(60)
+    assert headcounts.needs_build(0)
+    clock.now += 30
+    assert headcounts.needs_build(60)
+    with session_factory() as session:
+        headcounts.build(lambda: crud.count_by_gender_and_hire_year(session))
+    assert not headcounts.stats()["stale"]
+
+    clock.now += 3600
+    assert headcounts.needs_build(60)  # periodic rebuild catches external writes
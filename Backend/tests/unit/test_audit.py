@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+from app.audit import AuditBackpressureError, AuditLog
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+@pytest.fixture
+def audit_log(tmp_path):
+    log = AuditLog(tmp_path, flush_interval=0.01)
+    log.start()
+    yield log
+    log.close()
+
+
+def test_history_returns_newest_first(audit_log):
+    audit_log.append(10001, "Facello", "One", "admin")
+    audit_log.append(10002, "Simmel", "Other", "admin")
+    audit_log.append(10001, "One", "Two", "dev")
+    _wait_for(lambda: len(audit_log.history(10001)) == 2)
+
+    records = audit_log.history(10001)
+    assert [(r.old, r.new, r.principal) for r in records] == [
+        ("One", "Two", "dev"),
+        ("Facello", "One", "admin"),
+    ]
+    assert audit_log.history(10001, limit=1)[0].new == "Two"
+    assert audit_log.history(99999) == []
+
+
+def test_aborted_records_are_hidden(audit_log):
+    seq = audit_log.append(10001, "Facello", "RolledBack", "admin")
+    audit_log.abort(seq)
+    audit_log.append(10001, "Facello", "Kept", "admin")
+    _wait_for(lambda: len(audit_log.history(10001)) == 1)
+    assert audit_log.history(10001)[0].new == "Kept"
+
+
+def test_segments_rotate_and_index_survives_restart(tmp_path):
+    log = AuditLog(tmp_path, flush_interval=0.01, segment_bytes=200)
+    log.start()
+    for index in range(10):
+        log.append(10001, f"old{index}", f"new{index}", "admin")
+    aborted = log.append(10001, "x", "aborted", "admin")
+    log.abort(aborted)
+    log.close()
+    assert len(list(tmp_path.glob("audit-*.log"))) > 1
+
+    reopened = AuditLog(tmp_path, flush_interval=0.01)
+    reopened.start()
+    try:
+        history = reopened.history(10001)
+        assert [record.new for record in history] == [f"new{i}" for i in reversed(range(10))]
+        seq = reopened.append(10001, "new9", "after-restart", "admin")
+        assert seq > aborted
+    finally:
+        reopened.close()
+
+
+def test_full_queue_applies_backpressure(tmp_path):
+    log = AuditLog(tmp_path, max_queue=1, enqueue_timeout=0.01)  # writer not started
+    log.append(10001, "a", "b", "admin")
+    with pytest.raises(AuditBackpressureError):
+        log.append(10001, "b", "c", "admin")
+
+
+def test_writers_sharing_a_directory_keep_distinct_records(tmp_path):
+    first = AuditLog(tmp_path, flush_interval=0.01)
+    second = AuditLog(tmp_path, flush_interval=0.01)  # as in another worker
+    first.start()
+    second.start()
+    try:
+        kept = first.append(10001, "Facello", "First", "admin")
+        rolled_back = second.append(10001, "Facello", "Second", "dev")
+        assert kept == rolled_back  # same seq, different writers
+        second.abort(rolled_back)
+        second.append(10002, "Simmel", "Other", "dev")
+
+        _wait_for(lambda: [r.new for r in second.history(10001)] == ["First"])
+        _wait_for(lambda: [r.new for r in first.history(10002)] == ["Other"])
+        _wait_for(lambda: [r.new for r in first.history(10001)] == ["First"])
+    finally:
+        first.close()
+        second.close()
+
+    reopened = AuditLog(tmp_path)
+    reopened.start()
+    try:
+        assert [r.new for r in reopened.history(10001)] == ["First"]
+    finally:
+        reopened.close()
+
+
+def test_failed_batch_is_retried_not_dropped(tmp_path, monkeypatch):
+    log = AuditLog(tmp_path, flush_interval=0.01)
+    log.start()
+    sync = log._sync
+    failures = []
+
+    def flaky_sync():
+        if not failures:
+            failures.append(True)
+            raise OSError("disk full")
+        sync()
+
+    monkeypatch.setattr(log, "_sync", flaky_sync)
+    try:
+        log.append(10001, "Facello", "Retried", "admin")
+        _wait_for(lambda: [r.new for r in log.history(10001)] == ["Retried"])
+    finally:
+        log.close()
+    assert failures
+
+    reopened = AuditLog(tmp_path)
+    reopened.start()
+    try:
+        # The copy left in the failed segment is not reported twice.
+        assert [r.new for r in reopened.history(10001)] == ["Retried"]
+    finally:
+        reopened.close()
+
+
+def test_index_keeps_the_newest_records_per_employee(tmp_path):
+    log = AuditLog(tmp_path, flush_interval=0.01, max_records_per_employee=3, max_aborted=2)
+    log.start()
+    try:
+        for index in range(5):
+            seq = log.append(10001, f"old{index}", f"new{index}", "admin")
+            log.abort(seq)
+        _wait_for(lambda: len(log._index.get(10001, ())) == 3)
+        assert len(log._aborted) <= 2
+    finally:
+        log.close()
@@ -7,6 +7,7 @@ from fastapi.security import HTTPBasicCredentials
 from app.auth.security import (
     AccessLevel,
     SecretsLoadError,
+    get_current_principal,
     get_current_user,
     reload_secrets_cache,
     _load_secrets,
@@ -61,3 +62,77 @@ def test_load_secrets_cache_is_cleared(temp_secrets_file):
     reload_secrets_cache()
     second = _load_secrets(str(path))
     assert first["alice"] != second["alice"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_secret_store_looks_up_single_users(tmp_path, monkeypatch):
+    import bcrypt
+
+    from app.config import settings
+    from auth.hash_secrets import write_secrets
+
+    hashed = bcrypt.hashpw(b"wonderland", bcrypt.gensalt(4)).decode("utf-8")
+    users = {f"svc{i:05d}": {"hash": hashed, "access": "rd"} for i in range(2000)}
+    users["alice"] = {"hash": hashed, "access": "wr"}
+    path = tmp_path / "secrets.db"
+    write_secrets(path, {"algorithm": "bcrypt", "users": users})
+    monkeypatch.setattr(settings, "SECRETS_FILE", str(path))
+    reload_secrets_cache()
+    try:
+        principal = await get_current_principal(
+            HTTPBasicCredentials(username="alice", password="wonderland")
+        )
+        assert principal.access is AccessLevel.WR
+        with pytest.raises(HTTPException) as exc:
+            await get_current_principal(HTTPBasicCredentials(username="bob", password="x"))
+        assert exc.value.status_code == 401
+
+        # Rewriting the store takes effect without reloading the cache.
+        users["alice"]["access"] = "rd"
+        write_secrets(path, {"algorithm": "bcrypt", "users": users})
+        principal = await get_current_principal(
+            HTTPBasicCredentials(username="alice", password="wonderland")
+        )
+        assert principal.access is AccessLevel.RD
+    finally:
+        reload_secrets_cache()
+
+
+def test_sqlite_secret_store_rejects_other_files(tmp_path):
+    from app.auth.security import SqliteSecretStore
+
+    with pytest.raises(SecretsLoadError):
+        SqliteSecretStore(str(tmp_path / "missing.db"))
+    not_a_store = tmp_path / "other.db"
+    not_a_store.write_bytes(b"plain text")
+    with pytest.raises(SecretsLoadError):
+        SqliteSecretStore(str(not_a_store))
+
+
+def test_documented_json_to_sqlite_conversion(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    import bcrypt
+
+    from app.auth.security import SqliteSecretStore
+
+    script = Path(__file__).resolve().parents[2] / "auth" / "hash_secrets.py"
+    hashed = bcrypt.hashpw(b"wonderland", bcrypt.gensalt(4)).decode("utf-8")
+    source = tmp_path / "secrets" / "secrets.json"
+    source.parent.mkdir()
+    users = {"alice": {"hash": hashed, "access": "wr"}}
+    original = json.dumps({"algorithm": "bcrypt", "users": users})
+    source.write_text(original, encoding="utf-8")
+
+    subprocess.run(
+        [sys.executable, str(script), "--from-json", "secrets/secrets.json", "secrets/secrets.db"],
+        cwd=tmp_path,
+        check=True,
+        capture_output=True,
+    )
+    assert source.read_text(encoding="utf-8") == original
+    assert SqliteSecretStore(str(tmp_path / "secrets" / "secrets.db")).get("alice") == (
+        hashed, AccessLevel.WR,
+    )
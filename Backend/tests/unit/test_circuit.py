@@ -0,0 +1,52 @@
+import threading
+
+from app.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_breaker_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=3, probe_interval=60, probe=lambda: None)
+    try:
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()  # resets the streak
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == CLOSED and breaker.allow()
+
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+    finally:
+        breaker.reset()
+    assert breaker.state == CLOSED
+
+
+def test_background_probe_closes_the_breaker_once_it_succeeds():
+    healthy = threading.Event()
+    probed = threading.Event()
+    attempts = []
+
+    def probe():
+        attempts.append(breaker.state)
+        probed.set()
+        if not healthy.is_set():
+            raise ConnectionError("still down")
+
+    breaker = CircuitBreaker(failure_threshold=1, probe_interval=0.01, probe=probe)
+    try:
+        breaker.record_failure()
+        assert probed.wait(5)
+        assert breaker.state in (OPEN, HALF_OPEN)
+        assert not breaker.allow()
+
+        healthy.set()
+        for _ in range(500):
+            if breaker.state == CLOSED:
+                break
+            threading.Event().wait(0.01)
+        assert breaker.state == CLOSED and breaker.allow()
+        assert set(attempts) == {HALF_OPEN}
+        assert breaker.stats()["trips"] == 1
+    finally:
+        breaker.reset()
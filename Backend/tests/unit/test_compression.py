@@ -0,0 +1,126 @@
+import gzip
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import (
+    CompressionMiddleware,
+    PrecompressedStaticFiles,
+    negotiate_encoding,
+    precompress_directory,
+)
+
+
+def _build_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse("x" * 5000)
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for index in range(3):
+                yield f"chunk-{index}\n" * 10
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/events")
+    async def events():
+        async def frames():
+            for index in range(3):
+                yield f"data: {'x' * 300}-{index}\n\n"
+
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    @app.get("/tagged")
+    async def tagged(request: Request):
+        if request.headers.get("if-none-match") == '"abc"':
+            return Response(status_code=304, headers={"ETag": '"abc"'})
+        return PlainTextResponse("x" * 5000, headers={"ETag": '"abc"'})
+
+    return app
+
+
+def test_negotiate_encoding_respects_quality_values():
+    assert negotiate_encoding("gzip, deflate", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0.5, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("gzip;q=0", ["gzip"]) is None
+    assert negotiate_encoding("*", ["br", "gzip"]) == "br"
+    assert negotiate_encoding("", ["gzip"]) is None
+
+
+def test_large_responses_are_gzipped_and_small_ones_are_not():
+    client = TestClient(_build_app())
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == "x" * 5000
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "tiny"
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_streaming_responses_are_compressed_incrementally():
+    client = TestClient(_build_app())
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    expected = "".join(f"chunk-{index}\n" * 10 for index in range(3))
+    assert gzip.decompress(raw).decode() == expected
+
+
+def test_event_streams_are_not_compressed():
+    client = TestClient(_build_app())
+    with client.stream("GET", "/events", headers={"Accept-Encoding": "gzip"}) as response:
+        assert "content-encoding" not in response.headers
+        assert b"".join(response.iter_raw()).startswith(b"data: ")
+
+
+def test_compressed_bodies_get_their_own_etag():
+    client = TestClient(_build_app())
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+    response = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["etag"] == '"abc-gzip"'
+
+    revalidated = client.get(
+        "/tagged", headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == '"abc-gzip"'
+
+
+def test_precompressed_static_files_are_served_without_recompressing(tmp_path):
+    asset = tmp_path / "app.js"
+    asset.write_text("console.log('hello');\n" * 100, encoding="utf-8")
+    assert precompress_directory(tmp_path, minimum_size=100) >= 1
+    assert (tmp_path / "app.js.gz").exists()
+    assert precompress_directory(tmp_path, minimum_size=100) == 0
+
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=str(tmp_path)), name="static")
+    client = TestClient(app)
+
+    response = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "javascript" in response.headers["content-type"]
+    assert response.text == asset.read_text(encoding="utf-8")
+
+    response = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == asset.read_text(encoding="utf-8")
@@ -0,0 +1,58 @@
+from app.counts import CountCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_exact_counts_are_cached_until_ttl_expires():
+    clock = FakeClock()
+    cache = CountCache(ttl=10, estimate_refresh=100, clock=clock)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return 42
+
+    assert cache.exact("all", loader).value == 42
+    assert cache.exact("all", loader).exact is True
+    assert len(calls) == 1
+
+    clock.now = 11
+    cache.exact("all", loader)
+    assert len(calls) == 2
+
+
+def test_invalidate_drops_exact_counts_but_keeps_estimate():
+    cache = CountCache(ttl=10, estimate_refresh=100, clock=FakeClock())
+    cache.exact("all", lambda: 3)
+    estimate = cache.estimate(lambda: 1000)
+
+    cache.invalidate()
+
+    assert cache.cached_exact("all") is None
+    assert cache.estimate(lambda: 0) == estimate
+    assert estimate.exact is False
+
+
+def test_write_during_count_is_not_cached():
+    cache = CountCache(ttl=10, estimate_refresh=100, clock=FakeClock())
+
+    def racing_loader():
+        cache.invalidate()
+        return 7
+
+    assert cache.exact("all", racing_loader).value == 7
+    assert cache.cached_exact("all") is None
+
+
+def test_exact_counts_are_bounded():
+    cache = CountCache(ttl=10, estimate_refresh=100, max_entries=2, clock=FakeClock())
+    for key in ("a", "b", "c"):
+        cache.exact(key, lambda: 1)
+    assert cache.cached_exact("a") is None
+    assert cache.cached_exact("c") is not None
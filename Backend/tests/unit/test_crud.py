@@ -1,3 +1,7 @@
+from datetime import date
+
+import pytest
+
 from app import crud
 from app.auth.security import AccessLevel
 from app.models import Employee
@@ -55,3 +59,166 @@ def test_update_employee_last_name_missing_employee(session_factory, set_active_
         assert crud.update_employee_last_name(session, 99999, "Updated") is None
     finally:
         session.close()
+
+
+
+def test_deferred_last_name_updates_share_one_transaction(
+    session_factory, set_active_principal, tmp_path, monkeypatch
+):
+    from app import audit
+
+    log = audit.AuditLog(tmp_path, flush_interval=0.01)
+    log.start()
+    monkeypatch.setattr(audit, "_audit_log", log)
+    set_active_principal(AccessLevel.WR)
+    session = session_factory()
+    try:
+        updated = crud.update_employee_last_name(session, 10001, "Deferred", commit=False)
+        assert updated.last_name == "Deferred"
+        assert crud.get_employee(session, 10001).last_name == "Deferred"
+        crud.rollback_changes(session)
+        assert session.get(Employee, 10001, populate_existing=True).last_name == "Facello"
+
+        crud.update_employee_last_name(session, 10001, "Deferred", commit=False)
+        crud.update_employee_last_name(session, 10002, "Deferred", commit=False)
+        crud.commit_changes(session)
+        log.close()  # flushes the writer
+        # The rolled-back update's record is aborted; one committed record each.
+        for emp_no in (10001, 10002):
+            assert [record.new for record in log.history(emp_no)] == ["Deferred"]
+    finally:
+        session.close()
+        log.close()
+    check = session_factory()
+    try:
+        assert {check.get(Employee, n).last_name for n in (10001, 10002)} == {"Deferred"}
+    finally:
+        check.close()
+
+
+SUPPORTED_QUERIES = [
+    (crud.EmployeeFilters(), "emp_no", "PRIMARY"),
+    (crud.EmployeeFilters(), "-emp_no", "PRIMARY"),
+    (crud.EmployeeFilters(gender="F"), "emp_no", "ix_employees_gender"),
+    (crud.EmployeeFilters(hire_date_from=date(1986, 1, 1)), "hire_date", "ix_employees_hire_date"),
+    (
+        crud.EmployeeFilters(gender="M", hire_date_to=date(1986, 7, 1)),
+        "-hire_date",
+        "ix_employees_gender_hire_date",
+    ),
+    (crud.EmployeeFilters(last_name_prefix="Fa"), "last_name", "ix_employees_last_name"),
+    (
+        crud.EmployeeFilters(gender="M", last_name_prefix="B"),
+        "last_name",
+        "ix_employees_gender_last_name",
+    ),
+]
+
+
+@pytest.mark.parametrize("filters, sort, expected_index", SUPPORTED_QUERIES)
+def test_supported_queries_map_to_declared_indexes(filters, sort, expected_index):
+    declared = {index.name for index in Employee.__table__.indexes} | {crud.PRIMARY_KEY_INDEX}
+    assert crud.plan_employee_query(filters, sort) == expected_index
+    assert expected_index in declared
+
+
+@pytest.mark.parametrize("filters, sort, _index", SUPPORTED_QUERIES)
+def test_supported_queries_never_sort_in_a_temp_btree(
+    sqlite_engine, filters, sort, _index
+):
+    stmt = crud._page_statement(crud._filter_shape(filters), sort).params(
+        **crud._filter_params(filters), limit=10, offset=0
+    )
+    compiled = stmt.compile(sqlite_engine, compile_kwargs={"literal_binds": True})
+    with sqlite_engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+    details = " ".join(row[-1] for row in plan)
+    assert "TEMP B-TREE" not in details
+
+
+@pytest.mark.parametrize(
+    "filters, sort",
+    [
+        (crud.EmployeeFilters(), "first_name"),
+        (crud.EmployeeFilters(hire_date_from=date(1986, 1, 1)), "emp_no"),
+        (crud.EmployeeFilters(hire_date_from=date(1986, 1, 1), last_name_prefix="F"), "hire_date"),
+    ],
+)
+def test_unsupported_queries_are_rejected(filters, sort):
+    with pytest.raises(crud.UnsupportedQueryError):
+        crud.plan_employee_query(filters, sort)
+
+
+def test_get_employees_filters_and_sorts(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    session = session_factory()
+    try:
+        rows = crud.get_employees(
+            session, filters=crud.EmployeeFilters(gender="M"), sort="emp_no"
+        )
+        assert [row.emp_no for row in rows] == [10001, 10003]
+
+        rows = crud.get_employees(session, sort="-hire_date")
+        assert [row.emp_no for row in rows] == [10003, 10001, 10002]
+
+        rows = crud.get_employees(
+            session,
+            filters=crud.EmployeeFilters(last_name_prefix="Fa"),
+            sort="last_name",
+        )
+        assert [row.last_name for row in rows] == ["Facello"]
+    finally:
+        session.close()
+
+
+def test_statements_are_reused_and_hit_the_compiled_cache(
+    sqlite_engine, session_factory, set_active_principal
+):
+    from sqlalchemy import event
+
+    from app import db
+
+    set_active_principal(AccessLevel.WR)
+    stats = db.StatementCacheStats()
+    monkey_listener = lambda *args: stats.record(args[4].cache_hit)  # noqa: E731
+    event.listen(sqlite_engine, "after_cursor_execute", monkey_listener)
+    session = session_factory()
+    try:
+        for limit, offset, gender in ((10, 0, "M"), (5, 1, "F"), (2, 0, "M")):
+            crud.get_employees(
+                session, limit=limit, offset=offset, filters=crud.EmployeeFilters(gender=gender)
+            )
+        assert (stats.misses, stats.hits) == (1, 2)
+
+        crud.update_employee_last_name(session, 10001, "One")
+        stats.reset()
+        crud.update_employee_last_name(session, 10001, "Two")
+        # Every statement of a repeated update comes from the compiled cache.
+        assert stats.misses == 0
+        assert stats.snapshot()["hit_ratio"] == 1.0
+    finally:
+        session.close()
+        event.remove(sqlite_engine, "after_cursor_execute", monkey_listener)
+
+
+def test_parse_fields_canonicalizes_and_rejects_unknown_fields():
+    assert crud.parse_fields(" hire_date,emp_no,hire_date ") == ("emp_no", "hire_date")
+    assert crud.field_columns(("emp_no", "version")) == (
+        "emp_no", "birth_date", "first_name", "last_name", "gender", "hire_date",
+    )
+    with pytest.raises(crud.UnknownFieldError, match="salary"):
+        crud.parse_fields("emp_no,salary")
+    with pytest.raises(crud.UnknownFieldError):
+        crud.parse_fields(" , ")
+
+
+def test_get_employees_selects_only_requested_columns(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    session = session_factory()
+    try:
+        rows = crud.get_employees(session, limit=2, columns=("emp_no", "hire_date"))
+        assert [tuple(row._fields) for row in rows] == [("emp_no", "hire_date")] * 2
+        assert rows[0].hire_date == date(1986, 6, 26)
+        assert crud.get_employee_columns(session, 10002, ("gender",)).gender == "F"
+    finally:
+        session.close()
@@ -0,0 +1,114 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import db, deadlines
+
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) "
+    "SELECT count(*) FROM c"
+)
+
+
+@pytest.fixture
+def deadline():
+    tokens = []
+
+    def _start(seconds):
+        tokens.append(deadlines.set_deadline(seconds))
+
+    yield _start
+    for token in reversed(tokens):
+        deadlines.reset_deadline(token)
+
+
+def test_budget_uses_longest_prefix_and_caps_client_header():
+    middleware = deadlines.DeadlineMiddleware(
+        None,
+        default=10,
+        rules=deadlines.parse_rules("/employees=5,/employees/changes=0"),
+        maximum=30,
+    )
+    assert middleware.budget("/sessions/start", None) == 10
+    assert middleware.budget("/employees/10001", None) == 5
+    assert middleware.budget("/employees/changes", None) == 0
+    assert middleware.budget("/employees", "0.25") == 0.25
+    assert middleware.budget("/employees", "600") == 30
+    assert middleware.budget("/employees", "soon") == 5
+
+
+def test_bound_and_check_follow_the_current_deadline(deadline):
+    assert deadlines.remaining() is None
+    assert deadlines.bound(3.0) == 3.0
+    deadline(0.5)
+    assert 0 < deadlines.bound(3.0) <= 0.5
+    deadline(1e-6)
+    time.sleep(0.001)
+    with pytest.raises(deadlines.DeadlineExceeded):
+        deadlines.check()
+
+
+def test_sqlite_statement_is_interrupted_at_the_deadline(sqlite_engine, deadline):
+    db._install_deadlines(sqlite_engine)
+    deadline(0.2)
+    started = time.perf_counter()
+    with sqlite_engine.connect() as connection:
+        with pytest.raises(deadlines.DeadlineExceeded):
+            connection.execute(SLOW_QUERY)
+    assert time.perf_counter() - started < 2
+
+
+def test_pool_checkout_wait_ends_at_the_deadline(deadline):
+    engine = create_engine(
+        "sqlite://", poolclass=db.DeadlineQueuePool, pool_size=1, max_overflow=0, pool_timeout=30
+    )
+    held = engine.connect()
+    try:
+        deadline(0.1)
+        started = time.perf_counter()
+        with pytest.raises(deadlines.DeadlineExceeded):
+            engine.connect()
+        assert time.perf_counter() - started < 2
+        assert engine.pool._timeout < 0.1
+    finally:
+        held.close()
+        engine.dispose()
+
+
+def _mysql_connection(is_mariadb=False):
+    return SimpleNamespace(dialect=SimpleNamespace(is_mariadb=is_mariadb))
+
+
+def test_mysql_selects_carry_the_remaining_time_as_a_hint(deadline):
+    conn = _mysql_connection()
+    statement, _ = db._apply_mysql_deadline(conn, None, "SELECT 1", {}, None, False)
+    assert statement == "SELECT 1"
+    deadline(2)
+    statement, _ = db._apply_mysql_deadline(conn, None, "SELECT 1", {}, None, False)
+    assert statement.startswith("SELECT /*+ MAX_EXECUTION_TIME(")
+    assert 1900 <= int(statement.split("(")[1].split(")")[0]) <= 2000
+    statement, _ = db._apply_mysql_deadline(conn, None, "UPDATE employees SET x = 1", {}, None, False)
+    assert statement == "UPDATE employees SET x = 1"
+
+
+def test_mariadb_selects_run_under_a_statement_time_limit(deadline):
+    conn = _mysql_connection(is_mariadb=True)
+    deadline(2)
+    statement, _ = db._apply_mysql_deadline(conn, None, "SELECT 1", {}, None, False)
+    prefix, _, rest = statement.partition(" FOR ")
+    assert prefix.startswith("SET STATEMENT max_statement_time=")
+    assert 1.9 <= float(prefix.split("=")[1]) <= 2.0
+    assert rest == "SELECT 1"
+    statement, _ = db._apply_mysql_deadline(conn, None, "UPDATE employees SET x = 1", {}, None, False)
+    assert statement == "UPDATE employees SET x = 1"
+
+
+@pytest.mark.parametrize("code", [3024, 1969])
+def test_server_statement_timeouts_become_deadline_errors(deadline, code):
+    deadline(2)
+    context = SimpleNamespace(original_exception=Exception(code, "interrupted"))
+    assert isinstance(db._translate_deadline_error(context), deadlines.DeadlineExceeded)
+    context = SimpleNamespace(original_exception=Exception(1205, "lock wait timeout"))
+    assert db._translate_deadline_error(context) is None
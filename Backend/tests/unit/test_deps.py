@@ -30,3 +30,44 @@ async def test_require_active_session_invalid_session(monkeypatch):
         await require_active_session(principal, session_id="wrong")
     assert exc.value.status_code == 401
     assert "Session is not active" in exc.value.detail
+
+
+def test_get_db_fails_fast_while_the_breaker_is_open(monkeypatch):
+    from app import deps
+
+    principal = Principal(username="user", access=AccessLevel.RD)
+    monkeypatch.setattr(deps.db_breaker, "probe", lambda: None)
+    monkeypatch.setattr(deps.db_breaker, "probe_interval", 60)
+    for _ in range(deps.db_breaker.failure_threshold):
+        deps.db_breaker.record_failure()
+    try:
+        with pytest.raises(HTTPException) as exc:
+            next(deps.get_db(principal))
+        assert exc.value.status_code == 503
+        assert "Retry-After" in exc.value.headers
+    finally:
+        deps.db_breaker.reset()
+
+
+def test_opened_sessions_hold_their_own_admission_slot(monkeypatch):
+    from app import deps
+    from app.rate_limit import AdmissionController
+
+    controller = AdmissionController(max_inflight=1, wait_timeout=0.0)
+    monkeypatch.setattr(deps, "db_admission", controller)
+    closed = []
+
+    class FakeSession:
+        def close(self):
+            closed.append(self)
+
+    open_session = deps.get_session_opener(None, factory=FakeSession)
+    with open_session() as session:
+        # The slot belongs to this session, not to the request that opened it.
+        with pytest.raises(HTTPException) as exc:
+            with open_session():
+                pass
+        assert exc.value.status_code == 503
+    assert closed == [session]
+    with open_session():
+        pass
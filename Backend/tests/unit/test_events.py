@@ -0,0 +1,132 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import events
+from app.events import ChangeHub, record_change
+from app.models import Employee
+from app.routers.employees import _change_stream
+
+
+def _change(emp_no, new="Name"):
+    return {"emp_no": emp_no, "field": "last_name", "old": "Old", "new": new, "principal": "admin"}
+
+
+async def _collect(subscription, count, heartbeat=1.0):
+    received = []
+    async for change in subscription.events(heartbeat):
+        if change is not None:
+            received.append(change)
+        if len(received) == count:
+            break
+    return received
+
+
+async def test_subscribers_only_receive_their_employees():
+    hub = ChangeHub()
+    watcher = hub.subscribe(frozenset({10001}))
+    everyone = hub.subscribe()
+    hub.publish([_change(10002), _change(10001, "Watched")])
+
+    assert [c.new for c in await _collect(watcher, 1)] == ["Watched"]
+    assert [c.emp_no for c in await _collect(everyone, 2)] == [10002, 10001]
+
+
+async def test_resume_replays_missed_changes_in_order():
+    hub = ChangeHub(history=10)
+    first, second, third = hub.publish([_change(1, "a"), _change(1, "b"), _change(1, "c")])
+
+    resumed = hub.subscribe(frozenset({1}), after=first.id)
+    assert not resumed.missed
+    hub.publish([_change(1, "d")])
+    assert [c.new for c in await _collect(resumed, 3)] == ["b", "c", "d"]
+
+
+async def test_resume_beyond_history_is_reported_as_missed():
+    hub = ChangeHub(history=2, epoch="boot1")
+    hub.publish([_change(1, "a"), _change(1, "b"), _change(1, "c")])
+
+    assert hub.subscribe(after="boot1-0").missed
+    assert not hub.subscribe(after="boot1-1").missed
+    assert hub.subscribe(after="boot1-99").missed
+    assert hub.subscribe(after="garbage").missed
+
+
+async def test_ids_from_another_epoch_are_a_gap():
+    # Another worker (or this one before a restart) numbers from 1 as well.
+    other = ChangeHub(epoch="worker-b")
+    hub = ChangeHub(epoch="worker-a")
+    foreign = other.publish([_change(1, "elsewhere")])[0]
+    hub.publish([_change(1, "a"), _change(1, "b")])
+
+    assert foreign.id == "worker-b-1"
+    resumed = hub.subscribe(after=foreign.id)
+    assert resumed.missed and resumed.start_id == "worker-a-2"
+    assert not hub.subscribe(after="worker-a-1").missed
+
+
+async def test_slow_subscriber_is_cut_off_without_blocking_publishers():
+    hub = ChangeHub(buffer_size=2)
+    slow = hub.subscribe()
+    hub.publish([_change(1, str(i)) for i in range(5)])
+    await asyncio.sleep(0)
+
+    assert slow.lagged
+    assert [c.new for c in await _collect(slow, 5)] == ["0", "1"]
+
+
+async def test_publish_from_another_thread_wakes_the_subscriber():
+    hub = ChangeHub()
+    subscription = hub.subscribe()
+    threading.Thread(target=hub.publish, args=([_change(7)],)).start()
+    received = await asyncio.wait_for(_collect(subscription, 1), 2.0)
+    assert received[0].emp_no == 7
+
+
+async def test_subscriber_limit():
+    hub = ChangeHub(max_subscribers=1)
+    hub.subscribe()
+    with pytest.raises(events.SubscriberLimitError):
+        hub.subscribe()
+
+
+async def test_changes_are_published_on_commit_only(session_factory, monkeypatch):
+    hub = ChangeHub()
+    monkeypatch.setattr(events, "change_hub", hub)
+    subscription = hub.subscribe()
+
+    session: Session = session_factory()
+    employee = session.get(Employee, 10001)
+    employee.last_name = "RolledBack"
+    record_change(session, emp_no=10001, field="last_name", old="Facello", new="RolledBack")
+    session.rollback()
+
+    employee = session.get(Employee, 10001)
+    employee.last_name = "Committed"
+    record_change(session, emp_no=10001, field="last_name", old="Facello", new="Committed")
+    session.commit()
+    session.close()
+
+    received = await _collect(subscription, 1)
+    assert received[0].new == "Committed"
+    assert hub.last_seq == 1
+
+
+async def test_stream_formats_events_and_resets(monkeypatch):
+    hub = ChangeHub(history=1, epoch="e")
+    monkeypatch.setattr(events, "change_hub", hub)
+    hub.publish([_change(1, "a"), _change(1, "b")])
+    subscription = hub.subscribe(after="e-0")
+
+    stream = _change_stream(subscription, heartbeat=0.01)
+    assert await stream.__anext__() == "retry: 2000\n\n"
+    assert await stream.__anext__() == 'id: e-2\nevent: reset\ndata: {"id": "e-2", "seq": 2}\n\n'
+    hub.publish([_change(1, "c")])
+    chunk = await stream.__anext__()
+    assert chunk.startswith("id: e-3\nevent: change\ndata: ")
+    assert '"new":"c"' in chunk
+    assert await stream.__anext__() == ": keep-alive\n\n"
+    await stream.aclose()
+    assert len(hub) == 0
@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.idempotency import (
+    IdempotencyKeyReusedError,
+    IdempotencyMiddleware,
+    IdempotencyStore,
+    StoredResponse,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+RESPONSE = StoredResponse(200, [(b"content-type", b"application/json")], b"{}")
+
+
+async def test_store_replays_completed_responses_until_they_expire():
+    clock = FakeClock()
+    store = IdempotencyStore(ttl=10, clock=clock)
+
+    assert await store.acquire("k", "body") is None
+    store.complete("k", RESPONSE)
+    assert await store.acquire("k", "body") is RESPONSE
+    with pytest.raises(IdempotencyKeyReusedError):
+        await store.acquire("k", "other body")
+
+    clock.now = 11
+    assert await store.acquire("k", "other body") is None
+
+
+async def test_unstored_outcome_lets_a_waiter_take_over():
+    store = IdempotencyStore(ttl=10)
+    assert await store.acquire("k", "body") is None
+    waiter = asyncio.ensure_future(store.acquire("k", "body"))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    store.complete("k", None)  # e.g. the first attempt failed with a 5xx
+    assert await asyncio.wait_for(waiter, 1) is None
+
+
+async def test_eviction_keeps_in_flight_keys():
+    store = IdempotencyStore(ttl=10, max_entries=2)
+    assert await store.acquire("in-flight", "x") is None
+    for key in ("a", "b", "c"):
+        assert await store.acquire(key, "x") is None
+        store.complete(key, RESPONSE)
+    assert len(store) == 2
+    assert await store.acquire("c", "x") is RESPONSE
+    waiter = asyncio.ensure_future(store.acquire("in-flight", "x"))
+    await asyncio.sleep(0)
+    assert not waiter.done()  # still owned, not evicted
+    store.complete("in-flight", RESPONSE)
+    assert await waiter is RESPONSE
+
+
+def _counting_app(store, status_code=200, **middleware):
+    app = FastAPI()
+    calls = []
+
+    @app.post("/things")
+    async def create(request: Request):
+        calls.append(await request.json())
+        await asyncio.sleep(0.05)
+        if status_code != 200:
+            from fastapi import HTTPException
+
+            raise HTTPException(status_code=status_code)
+        return {"call": len(calls)}
+
+    @app.post("/stream")
+    async def stream(request: Request):
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"size": size}
+
+    app.add_middleware(IdempotencyMiddleware, store=store, **middleware)
+    return app, calls
+
+
+async def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_concurrent_duplicates_run_the_handler_once():
+    app, calls = _counting_app(IdempotencyStore(ttl=60))
+    headers = {"Idempotency-Key": "abc", "Authorization": "Basic dXNlcjpwdw=="}
+    async with await _client(app) as client:
+        responses = await asyncio.gather(
+            *(client.post("/things", json={"n": 1}, headers=headers) for _ in range(5))
+        )
+        other_user = await client.post(
+            "/things", json={"n": 1}, headers={**headers, "Authorization": "Basic b3RoZXI6cHc="}
+        )
+        reused = await client.post("/things", json={"n": 2}, headers=headers)
+
+    assert len(calls) == 2  # the five duplicates plus the other user's request
+    assert {r.json()["call"] for r in responses} == {1}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+    assert other_user.json()["call"] == 2
+    assert reused.status_code == 422
+
+
+async def test_server_errors_are_not_stored():
+    app, calls = _counting_app(IdempotencyStore(ttl=60), status_code=503)
+    async with await _client(app) as client:
+        for _ in range(2):
+            response = await client.post("/things", json={}, headers={"Idempotency-Key": "k"})
+            assert response.status_code == 503
+    assert len(calls) == 2
+
+
+async def test_invalid_key_is_rejected():
+    app, calls = _counting_app(IdempotencyStore(ttl=60))
+    async with await _client(app) as client:
+        response = await client.post("/things", json={}, headers={"Idempotency-Key": "x" * 256})
+    assert response.status_code == 400
+    assert calls == []
+
+
+async def test_oversized_bodies_are_refused_unless_the_path_is_skipped():
+    app, calls = _counting_app(
+        IdempotencyStore(ttl=60), max_request_body=100, skip_paths=("/stream",)
+    )
+
+    async def chunks():
+        for _ in range(10):
+            yield b"x" * 50
+
+    headers = {"Idempotency-Key": "k"}
+    async with await _client(app) as client:
+        declared = await client.post("/things", json={"n": "x" * 200}, headers=headers)
+        streamed = await client.post("/things", content=chunks(), headers=headers)
+        skipped = await client.post("/stream", content=chunks(), headers=headers)
+    assert declared.status_code == streamed.status_code == 413
+    assert calls == []
+    assert skipped.json() == {"size": 500}
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app import importer
+from app.auth.security import AccessLevel
+from app.models import Employee
+
+HEADER = "emp_no,birth_date,first_name,last_name,gender,hire_date\n"
+
+
+def _csv(*rows: str) -> list[str]:
+    return [HEADER, *(row + "\n" for row in rows)]
+
+
+def test_iter_lines_reassembles_lines_split_across_chunks():
+    chunks = [b"\xef\xbb\xbfa,b\nc", "é\r\n".encode("utf-8")[:1], "é\r\n".encode("utf-8")[1:], b"d"]
+    assert list(importer.iter_lines(chunks)) == ["a,b\n", "cé\r\n", "d"]
+
+
+def test_csv_import_inserts_in_chunks_and_reports_invalid_rows(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.WR)
+    lines = _csv(
+        "20001,1970-01-01,Ada,Lovelace,F,1999-01-01",
+        "20002,1970-01-01,Alan,Turing,X,1999-01-01",
+        "20003,not-a-date,Grace,Hopper,F,1999-01-01",
+        "20004,1970-01-01,Edsger,Dijkstra,M,1999-01-01",
+        "20005,1970-01-01,Barbara,Liskov,F,1999-01-01",
+    )
+    seen = []
+    session = session_factory()
+    try:
+        report = importer.import_employees(
+            session, lines, chunk_size=2, progress=lambda r: seen.append(r.written)
+        )
+        assert (report.rows, report.written, report.rejected, report.chunks) == (5, 3, 2, 3)
+        assert [error.line for error in report.errors] == [3, 4]
+        assert report.errors[0].message.startswith("gender:")
+        assert seen == [1, 2, 3]
+        assert report.last_committed_line == 6
+        assert session.get(Employee, 20005).last_name == "Liskov"
+    finally:
+        session.close()
+
+
+def test_insert_stops_at_duplicate_chunk_and_upsert_overwrites(session_factory, set_active_principal):
+    set_active_principal(AccessLevel.WR)
+    lines = [
+        json.dumps({"emp_no": 20001, "birth_date": "1970-01-01", "first_name": "Ada",
+                    "last_name": "Lovelace", "gender": "F", "hire_date": "1999-01-01"}) + "\n",
+        "{not json\n",
+        json.dumps({"emp_no": 10001, "birth_date": "1953-09-02", "first_name": "Georgi",
+                    "last_name": "Imported", "gender": "M", "hire_date": "1986-06-26"}) + "\n",
+    ]
+    session = session_factory()
+    try:
+        report = importer.import_employees(session, lines, fmt="ndjson", chunk_size=2)
+        assert report.error is not None and report.error.startswith("Lines 3-3")
+        assert (report.written, report.rejected, report.last_committed_line) == (1, 1, 2)
+        assert report.errors[0].message.startswith("invalid JSON")
+
+        report = importer.import_employees(session, lines, fmt="ndjson", mode="upsert")
+        assert report.error is None and report.written == 2
+        session.expire_all()
+        assert session.get(Employee, 10001).last_name == "Imported"
+    finally:
+        session.close()
+
+
+def test_import_rejects_bad_header_and_read_only_users(session_factory, set_active_principal):
+    session = session_factory()
+    try:
+        set_active_principal(AccessLevel.WR)
+        with pytest.raises(importer.EmployeeImportError, match="hire_date"):
+            importer.import_employees(session, ["emp_no,birth_date,first_name,last_name,gender\n"])
+
+        set_active_principal(AccessLevel.RD)
+        with pytest.raises(HTTPException):
+            importer.import_employees(session, _csv("20001,1970-01-01,Ada,Lovelace,F,1999-01-01"))
+    finally:
+        session.close()
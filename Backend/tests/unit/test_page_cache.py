@@ -0,0 +1,52 @@
+from app.page_cache import PageCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_pages_are_cached_until_they_expire():
+    clock = FakeClock()
+    cache = PageCache(max_entries=8, max_age=5, clock=clock)
+
+    assert cache.get("first") is None
+    page = cache.put("first", cache.version, b"[1]")
+    assert cache.get("first") is page
+    assert page.digest == cache.put("other", cache.version, b"[1]").digest
+
+    clock.now = 5
+    assert cache.get("first") is None
+    assert cache.stats() == {"version": 0, "entries": 1, "hits": 1, "misses": 2}
+
+
+def test_a_write_drops_pages_and_keeps_out_pages_rendered_before_it():
+    cache = PageCache(max_entries=8, max_age=5)
+    cache.put("first", cache.version, b"[1]")
+
+    version = cache.version
+    assert cache.bump() == version + 1
+    assert cache.get("first") is None
+
+    cache.put("first", version, b"[1]")  # read before the write
+    assert cache.get("first") is None
+
+
+def test_least_recently_used_pages_are_evicted():
+    cache = PageCache(max_entries=2, max_age=5)
+    for key in ("a", "b"):
+        cache.put(key, 0, key.encode())
+    cache.get("a")
+    cache.put("c", 0, b"c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_zero_max_age_disables_caching():
+    cache = PageCache(max_entries=8, max_age=0)
+    assert cache.put("first", 0, b"[1]").body == b"[1]"
+    assert cache.get("first") is None
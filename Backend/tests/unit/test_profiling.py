@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import threading
+import time
+
+from app.profiling import LoopLagMonitor, StackSampler
+
+
+def _spin_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_collapses_busy_thread_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_until, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        sampler = StackSampler(interval=0.002).run(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert sampler.samples > 10
+    lines = sampler.collapsed().splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and "_spin_until (tests/unit/test_profiling.py)" in busy[0]
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_sampler_skips_idle_threads_unless_asked():
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, name="idle-waiter")
+    waiter.start()
+    try:
+        quiet = StackSampler(interval=0.002).run(0.05)
+        verbose = StackSampler(interval=0.002, include_idle=True).run(0.05)
+    finally:
+        stop.set()
+        waiter.join()
+
+    assert not any(stack.startswith("idle-waiter;") for stack in quiet.stacks)
+    assert any(stack.startswith("idle-waiter;") for stack in verbose.stacks)
+
+
+def _block_the_loop() -> None:
+    time.sleep(0.3)
+
+
+async def test_loop_monitor_logs_the_blocking_stack(caplog):
+    monitor = LoopLagMonitor(threshold=0.1, interval=0.02)
+    caplog.set_level(logging.WARNING, logger="app.profiling")
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        _block_the_loop()
+        await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    assert monitor.stalls >= 1
+    assert monitor.max_lag >= 0.2
+    assert any("_block_the_loop" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,164 @@
+import base64
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import deps
+from app.auth.security import Principal, get_current_principal
+from app.rate_limit import (
+    AdmissionController,
+    InMemoryBucketStore,
+    RateLimit,
+    RateLimiter,
+    RateLimitMiddleware,
+    SessionRegistryBucketStore,
+    parse_rules,
+    take_token,
+)
+from app.session_manager import SessionRegistry, SqliteSessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _basic(username: str, password: str = "pw") -> str:
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+
+def test_take_token_refills_over_time():
+    limit = RateLimit(rate=2.0, burst=2)
+    state, wait = take_token(None, limit, 0.0)
+    state, wait = take_token(state, limit, 0.0)
+    assert wait == 0
+    state, wait = take_token(state, limit, 0.0)
+    assert wait == pytest.approx(0.5)
+    _, wait = take_token(state, limit, 0.5)
+    assert wait == 0
+
+
+def test_parse_rules_orders_longest_prefix_first():
+    rules = parse_rules("/employees=20:40, /employees/import=1:2")
+    assert [rule.prefix for rule in rules] == ["/employees/import", "/employees"]
+    assert rules[0].limit == RateLimit(rate=1.0, burst=2)
+
+
+def test_limiter_keys_by_user_and_ip_per_route():
+    clock = FakeClock()
+    limiter = RateLimiter(
+        parse_rules("/sessions/start=1:1,/employees=1:2"), InMemoryBucketStore(), clock=clock
+    )
+    assert limiter.check("/sessions/start", "10.0.0.1") == 0
+    assert limiter.check("/sessions/start", "10.0.0.1") > 0
+    assert limiter.check_user("/sessions/start", "alice") == 0
+    assert limiter.check_user("/sessions/start", "alice") > 0
+    assert limiter.check("/sessions/start", "10.0.0.2") == 0
+    # Separate routes have separate buckets; unlisted routes are unlimited.
+    assert limiter.check("/employees", "10.0.0.1") == 0
+    assert limiter.check_user("/employees", "alice") == 0
+    assert limiter.check("/", "10.0.0.1") == 0
+    clock.now += 1
+    assert limiter.check("/sessions/start", "10.0.0.1") == 0
+    assert limiter.check_user("/sessions/start", "alice") == 0
+
+
+def test_in_memory_store_is_bounded():
+    store = InMemoryBucketStore(max_keys=2)
+    limit = RateLimit(rate=0.0, burst=1)
+    for key in ("a", "b", "c"):
+        assert store.consume(key, limit, 0.0) == 0
+    # "a" was evicted and comes back as a full bucket.
+    assert store.consume("a", limit, 0.0) == 0
+    assert store.consume("c", limit, 0.0) > 0
+
+
+def test_registry_store_keeps_buckets_in_the_session_registry():
+    registry = SessionRegistry()
+    store = SessionRegistryBucketStore(lambda: registry)
+    limit = RateLimit(rate=0.0, burst=1)
+    assert store.consume("k", limit, 0.0) == 0
+    assert store.consume("k", limit, 0.0) > 0
+    store.reset()
+    assert store.consume("k", limit, 0.0) == 0
+
+
+def test_sqlite_registry_store_shares_buckets_between_workers(tmp_path, monkeypatch):
+    path = str(tmp_path / "sessions.db")
+    # Two registries on one file stand in for two worker processes.
+    first, second = SqliteSessionRegistry(path), SqliteSessionRegistry(path, max_shared_entries=2)
+    limit = RateLimit(rate=0.0, burst=2)
+    assert SessionRegistryBucketStore(lambda: first).consume("k", limit, 0.0) == 0
+    assert SessionRegistryBucketStore(lambda: second).consume("k", limit, 0.0) == 0
+    assert SessionRegistryBucketStore(lambda: first).consume("k", limit, 0.0) > 0
+
+    monkeypatch.setattr(SqliteSessionRegistry, "_PRUNE_EVERY", 1)
+    store = SessionRegistryBucketStore(lambda: second)
+    for key in ("a", "b", "c"):
+        store.consume(key, limit, 0.0)
+    # Only the two most recently used keys are kept; "k" was the oldest.
+    assert store.consume("k", limit, 0.0) == 0
+    store.reset()
+    assert SessionRegistryBucketStore(lambda: first).consume("c", limit, 0.0) == 0
+
+
+def test_middleware_sheds_with_429_and_retry_after():
+    app = FastAPI()
+    limiter = RateLimiter(parse_rules("/limited=0.1:1"), InMemoryBucketStore())
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+    @app.get("/limited")
+    async def limited():
+        return {"ok": True}
+
+    client = TestClient(app)
+    headers = {"Authorization": _basic("alice")}
+    assert client.get("/limited", headers=headers).status_code == 200
+    response = client.get("/limited", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+async def test_user_bucket_is_charged_only_after_authentication(temp_secrets_file):
+    temp_secrets_file({"alice": {"password": "secret", "access": "rd"}})
+    app = FastAPI()
+    limiter = RateLimiter(parse_rules("/limited=0:2"), InMemoryBucketStore())
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+    @app.get("/limited")
+    async def limited(principal: Principal = Depends(get_current_principal)):
+        return {"user": principal.username}
+
+    addresses = iter(f"10.0.0.{n}" for n in range(1, 100))
+
+    async def get(password):
+        # A fresh address each time, so only the user bucket can run out.
+        transport = httpx.ASGITransport(app=app, client=(next(addresses), 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/limited", auth=("alice", password))
+
+    # Wrong passwords are refused without touching alice's bucket...
+    for _ in range(3):
+        assert (await get("guess")).status_code == 401
+    assert (await get("secret")).status_code == 200
+    assert (await get("secret")).status_code == 200
+    # ...which runs out only through her own authenticated requests.
+    response = await get("secret")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3600"
+
+
+def test_get_db_sheds_when_admission_is_exhausted(monkeypatch):
+    controller = AdmissionController(max_inflight=1, wait_timeout=0.0)
+    monkeypatch.setattr(deps, "db_admission", controller)
+    assert controller.acquire()
+    with pytest.raises(HTTPException) as exc:
+        next(deps.get_db(None))
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "1"
+    controller.release()
@@ -1,4 +1,7 @@
-from app.session_manager import SessionRegistry
+import pytest
+
+from app import session_manager
+from app.session_manager import SessionRegistry, SnapshotFormatError, SqliteSessionRegistry
 
 
 def test_session_lifecycle():
@@ -22,3 +25,113 @@ def test_session_lifecycle():
 def test_validate_unknown_user_returns_false():
     registry = SessionRegistry()
     assert registry.validate("ghost", "anything") is False
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_sessions_expire_after_ttl():
+    clock = FakeClock()
+    registry = SessionRegistry(ttl=60, clock=clock)
+    session_id, _ = registry.start_session("alice")
+
+    clock.now += 59
+    assert registry.validate("alice", session_id) is True
+    clock.now += 1
+    assert registry.validate("alice", session_id) is False
+    _, replaced = registry.start_session("alice")
+    assert replaced is False
+
+
+def test_snapshot_round_trip_skips_expired_sessions(tmp_path):
+    clock = FakeClock()
+    path = tmp_path / "sessions.bin"
+    registry = SessionRegistry(ttl=60, clock=clock)
+    alice, _ = registry.start_session("alice")
+    clock.now += 30
+    bob, _ = registry.start_session("bjørn")
+    forever = SessionRegistry()
+    carol, _ = forever.start_session("carol")
+
+    assert registry.save(path) == 2
+    assert registry.save(path) is None  # unchanged since the last save
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    clock.now += 31  # alice has expired, bjørn has not
+    restored = SessionRegistry(ttl=60, clock=clock)
+    assert restored.restore(path) == 1
+    assert restored.validate("alice", alice) is False
+    assert restored.validate("bjørn", bob) is True
+    assert restored.get("bjørn").expires_at == 1_090.0
+
+    forever.save(path)
+    clock.now += 10_000
+    assert restored.restore(path) == 1
+    assert restored.validate("carol", carol) is True
+
+
+def test_restore_keeps_sessions_started_since_startup(tmp_path):
+    path = tmp_path / "sessions.bin"
+    old = SessionRegistry()
+    old.start_session("alice")
+    old.save(path)
+
+    registry = SessionRegistry()
+    current, _ = registry.start_session("alice")
+    registry.restore(path)
+    assert registry.validate("alice", current) is True
+
+
+def test_restore_rejects_corrupt_snapshots(tmp_path):
+    path = tmp_path / "sessions.bin"
+    registry = SessionRegistry()
+    registry.start_session("alice")
+    registry.save(path)
+
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(SnapshotFormatError):
+        SessionRegistry().restore(path)
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(SnapshotFormatError):
+        SessionRegistry().restore(path)
+
+
+def test_persistence_restores_and_saves_at_shutdown(tmp_path, monkeypatch, caplog):
+    registry = SessionRegistry()
+    monkeypatch.setattr(session_manager, "session_registry", registry)
+    monkeypatch.setenv("WORKER_SLOT", "2")
+    path = tmp_path / "sessions.bin"
+    (tmp_path / "sessions-2.bin").write_bytes(b"garbage")
+
+    assert session_manager.start_session_persistence(str(path), interval=0) == 0
+    assert "Ignoring unreadable session snapshot" in caplog.text
+    session_id, _ = registry.start_session("alice")
+    session_manager.stop_session_persistence()
+
+    restarted = SessionRegistry()
+    monkeypatch.setattr(session_manager, "session_registry", restarted)
+    assert session_manager.start_session_persistence(str(path), interval=0) == 1
+    assert restarted.validate("alice", session_id) is True
+    session_manager.stop_session_persistence()
+
+
+def test_sqlite_sessions_are_shared_between_registries(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "sessions.db")
+    first = SqliteSessionRegistry(path, ttl=60, clock=clock)
+    second = SqliteSessionRegistry(path, ttl=60, clock=clock)  # as in another worker
+
+    session_id, replaced = first.start_session("alice")
+    assert replaced is False
+    assert second.validate("alice", session_id) is True
+    assert second.start_session("alice")[1] is True
+    assert first.validate("alice", session_id) is False
+
+    clock.now += 60
+    assert first.get("alice") is None
+    assert second.end_session("alice") is False
@@ -0,0 +1,144 @@
+from datetime import date
+
+import pytest
+
+from app import crud, sharding
+from app.auth.security import AccessLevel
+from app.db import Base, SessionLocal, create_database_engine
+from app.models import Employee
+
+NAMES = ["Facello", "bamford", "Simmel", "Koblick", "Maliniak", "Preusig", "Zielinski"]
+
+
+def _employees(count=60):
+    return [
+        Employee(
+            emp_no=10001 + i,
+            birth_date=date(1960, 1, 1),
+            first_name=f"First{i}",
+            last_name=NAMES[(i * 5) % len(NAMES)],
+            gender="MF"[(i * 7) % 3 % 2],
+            hire_date=date(1985 + (i * 3) % 7, 1 + i % 12, 1),
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def shard_set(tmp_path):
+    shards = sharding.parse_shards(
+        ";".join(f"{first}=sqlite:///{tmp_path / name}.db"
+                 for first, name in ((10041, "c"), (1, "a"), (10021, "b")))
+    )
+    engines = [create_database_engine(shard.url) for shard in shards]
+    for engine in engines:
+        Base.metadata.create_all(engine)
+    shard_set = sharding.ShardSet(shards, engines)
+    for employee in _employees():
+        with shard_set.session_for(employee.emp_no) as session:
+            session.add(employee)
+            session.commit()
+    yield shard_set
+    shard_set.dispose()
+
+
+@pytest.fixture
+def single_db(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'single.db'}")
+    Base.metadata.create_all(engine)
+    with SessionLocal(bind=engine) as session:
+        for employee in _employees():
+            session.add(employee)
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def test_parse_shards_orders_ranges_and_rejects_bad_specs():
+    shards = sharding.parse_shards("500=sqlite:///b.db; 1=sqlite:///a.db")
+    assert [(s.name, s.first_emp_no, s.url) for s in shards] == [
+        ("shard0", 1, "sqlite:///a.db"),
+        ("shard1", 500, "sqlite:///b.db"),
+    ]
+    for spec in ("", "x=sqlite://", "1=sqlite:///a.db;1=sqlite:///b.db"):
+        with pytest.raises(sharding.ShardConfigError):
+            sharding.parse_shards(spec)
+
+
+def test_point_lookups_route_to_the_owning_shard(shard_set, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    assert [shard_set.index_for(n) for n in (5, 10001, 10020, 10021, 10041, 99999)] == [
+        0, 0, 0, 1, 2, 2,
+    ]
+    for engine, (first, last) in zip(shard_set.engines, ((10001, 10020), (10021, 10040), (10041, 10060))):
+        with SessionLocal(bind=engine) as session:
+            assert [row.emp_no for row in crud.get_employees(session, limit=100)] == list(
+                range(first, last + 1)
+            )
+    with shard_set.session_for(10050) as session:
+        assert crud.get_employee(session, 10050).first_name == "First49"
+
+
+@pytest.mark.parametrize(
+    "filters, sort",
+    [
+        (crud.EmployeeFilters(), "emp_no"),
+        (crud.EmployeeFilters(), "-emp_no"),
+        (crud.EmployeeFilters(gender="F"), "emp_no"),
+        (crud.EmployeeFilters(hire_date_from=date(1987, 1, 1)), "hire_date"),
+        (crud.EmployeeFilters(gender="M"), "-hire_date"),
+        (crud.EmployeeFilters(), "last_name"),
+        (crud.EmployeeFilters(gender="F", last_name_prefix="S"), "-last_name"),
+    ],
+)
+def test_merged_pages_match_a_single_database(shard_set, single_db, set_active_principal, filters, sort):
+    set_active_principal(AccessLevel.RD)
+    with SessionLocal(bind=single_db) as session:
+        for limit, offset in ((10, 0), (7, 13), (100, 0), (5, 58)):
+            expected = crud.get_employees(session, limit=limit, offset=offset, filters=filters, sort=sort)
+            merged = shard_set.get_employees(limit=limit, offset=offset, filters=filters, sort=sort)
+            assert [row.emp_no for row in merged] == [row.emp_no for row in expected]
+        assert shard_set.count_employees(filters) == crud.count_employees(session, filters)
+        assert shard_set.count_by_gender_and_hire_year() == crud.count_by_gender_and_hire_year(session)
+
+
+def test_deep_offsets_are_refused(
+    shard_set, set_active_principal, monkeypatch, api_client, golden_employee
+):
+    set_active_principal(AccessLevel.RD)
+    shard_set.max_offset = 50
+    page = shard_set.get_employees(limit=5, offset=50)
+    assert [row.emp_no for row in page] == list(range(10051, 10056))
+    with pytest.raises(crud.UnsupportedQueryError):
+        shard_set.get_employees(limit=5, offset=51)
+
+    monkeypatch.setattr(sharding, "_shards", shard_set)
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    response = api_client.get("/employees?offset=51", auth=admin_creds)
+    assert response.status_code == 400
+    assert "offset is limited to 50" in response.json()["detail"]
+
+
+def test_each_shard_has_its_own_breaker(shard_set, monkeypatch, api_client, golden_employee):
+    from app import db
+
+    monkeypatch.setattr(sharding, "_shards", shard_set)
+    admin_creds = ("admin", golden_employee["users"]["admin"]["password"])
+    session_id = api_client.post("/sessions/start", auth=admin_creds).json()["session_id"]
+    headers = {"X-Session-Id": session_id}
+    assert api_client.get("/health/ready").json()["status"] == "ready"
+
+    breaker = shard_set.breaker_for(10001)
+    monkeypatch.setattr(breaker, "probe", lambda: None)
+    monkeypatch.setattr(breaker, "probe_interval", 60)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert db.db_breaker.state == "closed"
+    # Other shards keep serving their employees; fan-outs and readiness fail.
+    assert api_client.get("/employees/10050", auth=admin_creds, headers=headers).status_code == 200
+    assert api_client.get("/employees/10001", auth=admin_creds, headers=headers).status_code == 503
+    assert api_client.get("/employees?limit=3", auth=admin_creds).status_code == 503
+    ready = api_client.get("/health/ready")
+    assert ready.status_code == 503
+    assert ready.json()["shards"]["shard0"]["breaker"]["state"] == "open"
+    assert ready.json()["shards"]["shard1"]["breaker"]["state"] == "closed"
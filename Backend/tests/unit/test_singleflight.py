@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"emp_no": 10001}
+
+    waiters = [asyncio.create_task(flight.do(("get", 10001), load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.shared == 4
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+    seen = []
+
+    async def load(value):
+        seen.append(value)
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(
+        flight.do("a", lambda: load("a")), flight.do("b", lambda: load("b"))
+    )
+    assert results == ["a", "b"]
+    assert sorted(seen) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_the_key_is_released():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fail():
+        await release.wait()
+        raise LookupError("missing")
+
+    waiters = [asyncio.create_task(flight.do("k", fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, LookupError) for result in results)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return 42
+
+    leader = asyncio.create_task(flight.do("k", load))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("k", load))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+    assert await follower == 42
+
+
+@pytest.mark.asyncio
+async def test_map_is_bounded():
+    flight = SingleFlight(max_keys=1)
+    release = asyncio.Event()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    first = asyncio.create_task(flight.do("a", load))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flight.do("b", load))
+    await asyncio.sleep(0)
+    assert len(flight) == 1
+    release.set()
+    await asyncio.gather(first, second)
+    assert calls == 2
@@ -0,0 +1,146 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, snapshot
+from app.auth.security import AccessLevel
+from app.events import ChangeEvent
+from app.models import Employee
+
+LAST_NAMES = ["Facello", "Simmel", "Bamford", "Koblick", "Maliniak", "Preusig", "Zielinski"]
+
+
+@pytest.fixture
+def populated(sqlite_engine, session_factory):
+    rng = random.Random(7)
+    with sessionmaker(bind=sqlite_engine)() as session:
+        for emp_no in range(20001, 20301):
+            session.add(
+                Employee(
+                    emp_no=emp_no,
+                    birth_date=date(1960, 1, 1) + timedelta(days=rng.randrange(3000)),
+                    first_name=rng.choice(["Georgi", "Bezalel", "Parto"]),
+                    last_name=rng.choice(LAST_NAMES),
+                    gender=rng.choice("MF"),
+                    hire_date=date(1985, 1, 1) + timedelta(days=rng.randrange(400)),
+                )
+            )
+        session.commit()
+    return session_factory
+
+
+QUERIES = [
+    ({}, "emp_no"),
+    ({}, "-emp_no"),
+    ({"gender": "F"}, "emp_no"),
+    ({"gender": "M"}, "-hire_date"),
+    ({"hire_date_from": date(1985, 3, 1), "hire_date_to": date(1985, 9, 30)}, "hire_date"),
+    ({"gender": "F", "hire_date_from": date(1985, 6, 1)}, "-hire_date"),
+    ({}, "last_name"),
+    ({"last_name_prefix": "Ma"}, "-last_name"),
+    ({"gender": "M", "last_name_prefix": "S"}, "last_name"),
+]
+
+
+@pytest.mark.parametrize("filters, sort", QUERIES)
+def test_pages_match_the_database(populated, set_active_principal, filters, sort):
+    set_active_principal(AccessLevel.RD)
+    with populated() as session:
+        employee_snapshot = snapshot.EmployeeSnapshot.load(session)
+        filters = crud.EmployeeFilters(**filters)
+        for offset in (0, 7, 95):
+            expected = crud.get_employees(session, limit=25, offset=offset, filters=filters, sort=sort)
+            actual = employee_snapshot.page(limit=25, offset=offset, filters=filters, sort=sort)
+            assert [r.emp_no for r in actual] == [r.emp_no for r in expected]
+
+
+def test_get_matches_the_database_including_version(populated, set_active_principal):
+    set_active_principal(AccessLevel.RD)
+    with populated() as session:
+        employee_snapshot = snapshot.EmployeeSnapshot.load(session)
+        assert len(employee_snapshot) == 303
+        assert employee_snapshot.get(99999) is None
+        row = employee_snapshot.get(10002)
+        employee = crud.get_employee(session, 10002)
+        assert (row.first_name, row.last_name, row.hire_date) == (
+            employee.first_name, employee.last_name, employee.hire_date
+        )
+        assert crud.employee_version(row) == crud.employee_version(employee)
+        assert employee_snapshot.stats()["bytes_per_row"] < 100
+
+
+def test_committed_renames_are_applied_and_reordered(populated, set_active_principal):
+    set_active_principal(AccessLevel.WR)
+    snapshot.start_snapshot(populated, refresh=0)
+    try:
+        with populated() as session:
+            crud.update_employee_last_name(session, 20150, "Aaronson")
+            employee_snapshot = snapshot.get_snapshot()
+            assert employee_snapshot.get(20150).last_name == "Aaronson"
+            for sort in ("last_name", "-last_name"):
+                expected = crud.get_employees(session, limit=400, sort=sort)
+                actual = employee_snapshot.page(limit=400, sort=sort)
+                assert [r.emp_no for r in actual] == [r.emp_no for r in expected]
+    finally:
+        snapshot.stop_snapshot()
+    assert snapshot.get_snapshot() is None
+
+
+def test_folded_names_sort_and_match_case_insensitively():
+    employee_snapshot = snapshot.EmployeeSnapshot(fold=str.lower)
+    born, hired = date(1960, 1, 1), date(1990, 1, 1)
+    employee_snapshot.extend(
+        (emp_no, born, "A", last_name, "M", hired)
+        for emp_no, last_name in [(1, "McFarlin"), (2, "Mcclurg"), (3, "mcbride"), (4, "Nooteboom")]
+    )
+    rows = employee_snapshot.page(filters=crud.EmployeeFilters(last_name_prefix="MC"), sort="last_name")
+    assert [r.last_name for r in rows] == ["mcbride", "Mcclurg", "McFarlin"]
+
+    employee_snapshot.apply([ChangeEvent(1, 0.0, 4, "last_name", "Nooteboom", "MCA", None)])
+    rows = employee_snapshot.page(filters=crud.EmployeeFilters(last_name_prefix="mc"), sort="last_name")
+    assert [r.emp_no for r in rows] == [4, 3, 2, 1]
+
+
+def test_reload_replays_only_changes_newer_than_the_loaded_rows(
+    populated, set_active_principal, monkeypatch
+):
+    from app import events
+
+    hub = events.ChangeHub()
+    monkeypatch.setattr(events, "change_hub", hub)
+    set_active_principal(AccessLevel.WR)
+    snapshot.start_snapshot(populated, refresh=0)
+    try:
+        with populated() as session:
+            crud.update_employee_last_name(session, 20001, "Before")
+        loaded = snapshot.EmployeeSnapshot.load
+
+        def load_with_concurrent_writes(session):
+            # Committed between reading the feed position and reading the
+            # row: a local rename, which is replayed, then a write the feed
+            # never hears about (another worker), which the load sees.
+            seq = hub.last_seq
+            with populated() as other:
+                crud.update_employee_last_name(other, 20001, "Local")
+                other.get(Employee, 20001).last_name = "OtherWorker"
+                other.commit()
+            loaded_snapshot = loaded(session)
+            loaded_snapshot.loaded_seq = seq
+            return loaded_snapshot
+
+        monkeypatch.setattr(snapshot.EmployeeSnapshot, "load", load_with_concurrent_writes)
+        with populated() as session:
+            employee_snapshot = snapshot.reload_snapshot(session)
+        # The replayed rename is older than what the load read.
+        assert employee_snapshot.get(20001).last_name == "OtherWorker"
+        # An earlier change than the row's never applies; a later one does.
+        stale = ChangeEvent(1, 0.0, 20001, "last_name", "Facello", "Stale", None)
+        employee_snapshot.apply([stale])
+        assert employee_snapshot.get(20001).last_name == "OtherWorker"
+        with populated() as session:
+            crud.update_employee_last_name(session, 20001, "After")
+        assert employee_snapshot.get(20001).last_name == "After"
+    finally:
+        snapshot.stop_snapshot()
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import db
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# Modules whose import is deferred to the application lifespan or first use.
+DEFERRED_MODULES = ("pymysql", "sqlalchemy.dialects.mysql", "bcrypt")
+
+
+def _import_times(module: str) -> dict[str, int]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONPATH": str(BACKEND_DIR)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def test_importing_main_stays_within_budget():
+    budget_us = int(os.getenv("IMPORT_TIME_BUDGET_US", "3000000"))
+    times = _import_times("main")
+    assert "main" in times
+    for module in DEFERRED_MODULES:
+        assert module not in times, f"{module} should not be imported by 'import main'"
+    assert times["main"] <= budget_us, (
+        f"import main took {times['main']}us, budget is {budget_us}us"
+    )
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    db.dispose_engine()
+    engine = db.init_engine(f"sqlite+pysqlite:///{tmp_path / 'pool.db'}")
+    yield engine
+    db.dispose_engine()
+
+
+def test_prewarm_pool_fills_the_pool(file_engine):
+    assert db.get_engine() is file_engine
+    assert db.prewarm_pool(3) == 3
+    assert file_engine.pool.checkedin() == 3
+    assert file_engine.pool.checkedout() == 0
+
+
+def test_dispose_engine_allows_a_fresh_engine(file_engine, tmp_path):
+    db.dispose_engine()
+    replacement = db.init_engine(f"sqlite+pysqlite:///{tmp_path / 'other.db'}")
+    assert replacement is not file_engine
+    assert db.SessionLocal.kw["bind"] is replacement